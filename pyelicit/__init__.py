@@ -12,6 +12,19 @@ if sys.version_info.major == 3 and sys.version_info.minor >= 10:
     setattr(collections, "MutableMapping", collections.abc.MutableMapping)
     setattr(collections, "Mapping", collections.abc.Mapping)
 
-from . import elicit
-from . import api
-from . import command_line
+import importlib
+
+# Submodules are imported on first use, so `import pyelicit` doesn't pay for pyswagger, pandas or yaml
+SUBMODULES = ['elicit', 'api', 'command_line', 'async_elicit', 'columnar', 'decoding', 'sync', 'study_builder',
+              'testing', 'export', 'downloads', 'prepared', 'participants', 'pool', 'pagination',
+              'mirror']
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + SUBMODULES)
@@ -1,4 +1,12 @@
 from .elicit_creds import *
 from .elicit_api import *
+from .spec_cache import *
+from .elicit_client import *
+from .token_cache import *
+from .metrics import *
+from .response_cache import *
+from .operations import *
+from .scheduler import *
 
-__all__ = ['elicit_creds', 'elicit_api']
+__all__ = ['elicit_creds', 'elicit_api', 'spec_cache', 'elicit_client', 'token_cache', 'metrics', 'response_cache',
+           'operations', 'scheduler']
@@ -1,15 +1,16 @@
-from pyswagger import App, Security
-from pyswagger.contrib.client.requests import Client
+from pyswagger import Security
+from pyswagger.utils import final
 import ssl
-import tempfile
 from . import elicit_creds
+from .spec_cache import SpecCache
+from .elicit_client import ElicitClient
+from .operations import BoundOperation, CompiledOperation, compile_operations
+from .token_cache import Token, TokenCache
 from contextlib import contextmanager
 import urllib.error
 import urllib.request
-import requests
-import os
+import threading
 from urllib.parse import urlparse
-from pathlib import Path
 
 @contextmanager
 def user_agent_context(user_agent):
@@ -32,16 +33,26 @@ def dont_check_ssl():
 
 class ElicitApi:
     PRODUCTION_URL = 'https://elicit-experiment.com/'
+    SWAGGER_PATH = '/apidocs/v1/swagger.json'
 
     def __init__(self,
                  creds=elicit_creds.ElicitCreds(),
                  api_url=PRODUCTION_URL,
-                 send_opt=dict(verify=True)):
+                 send_opt=dict(verify=True),
+                 spec_cache=None,
+                 http_opt=None,
+                 token_cache=None,
+                 metrics=None,
+                 response_cache=None,
+                 app=None,
+                 adapter=None,
+                 limiter=None):
 
         print("Initialize Elicit client library for %s" % api_url)
-        print("Initialize Elicit client library for {} {}".format(creds.user, creds.password))
-        print("Initialize Elicit client library for {} {}".format(creds.public_client_id, creds.public_client_secret))
-        print("Request options: {}\n".format(send_opt))
+        # secrets are masked, as every pooled session prints these
+        print("Initialize Elicit client library for {} {}".format(creds.user, '********'))
+        print("Initialize Elicit client library for {} {}".format(creds.public_client_id, '********'))
+        print("Request options: {} {}\n".format(send_opt, http_opt))
 
         if (not send_opt['verify']) and api_url.startswith("https"):
             print('WARNING: not checking SSL')
@@ -49,30 +60,33 @@ class ElicitApi:
 
         self.api_url = api_url
         with user_agent_context('Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:132.0) Gecko/20100101 Firefox/132.0'):
-            self.swagger_url = self.api_url + '/apidocs/v1/swagger.json'
+            self.swagger_url = self.api_url + self.SWAGGER_PATH
 
         try:
-            # Load self.swagger_url json file to local filesystem
-            print(f"Downloading swagger definition from {self.swagger_url}")
-            response = requests.get(self.swagger_url)
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_file:
-                temp_file.write(response.content)
-                swagger_json_local_path = temp_file.name
-                print(f"Saved swagger.json to temporary file {swagger_json_local_path}")
-
-            # Creating a URL string pointing to the temporary file
-            swagger_json_url = Path(swagger_json_local_path).as_uri()
-
-            print(f"Connecting to Elicit API Swagger definition #{swagger_json_url} downloaded from {self.swagger_url}")
-            self.app = App.create(swagger_json_url)  # now valid on all OS
+            # Load the swagger definition, reusing the on-disk copy (and its resolved App) when it is unchanged,
+            # unless the App is shared by an ElicitPool
+            self.spec_cache = spec_cache or SpecCache()
+            self.app = app if app is not None else self.spec_cache.load_app(self.swagger_url)
             print(f"Loaded API definition {self.swagger_url}")
             self.auth = Security(self.app)
+            # operation callables with their parameters resolved once per App
+            self.operations = {op_id: BoundOperation(operation, self)
+                               for op_id, operation in compile_operations(self.app).items()}
             self.creds = creds
+            self.token = None
+            self.token_cache = token_cache or TokenCache()
+            self.token_lock = threading.RLock()
 
             # init swagger client
-            self.client = Client(self.auth,
-                                 send_opt=send_opt)  # HACK to work around self-signed SSL certs used in development
+            self.metrics = metrics
+            self.client = ElicitClient(self.auth,
+                                       send_opt=send_opt,  # HACK to work around self-signed SSL certs used in development
+                                       http_opt=http_opt,
+                                       metrics=metrics,
+                                       response_cache=response_cache,
+                                       adapter=adapter,
+                                       limiter=limiter)
+            self.client.on_unauthorized = self.reauthenticate
 
             self.api_host = urlparse(self.api_url).netloc
 
@@ -89,29 +103,119 @@ class ElicitApi:
 
     def login(self):
         """
-        Login to Elicit using credentials specified in init
+        Login to Elicit using credentials specified in init, reusing a cached token for the same
+        (api_url, user, client_id, password) until it nears expiry, and refreshing it when the server issued a refresh token.
         :return: client with auth header added.
         """
-        auth_request = dict(client_id=self.creds.public_client_id,
-                            client_secret=self.creds.public_client_secret,
-                            grant_type='password',
-                            email=self.creds.user,
-                            password=self.creds.password)
-        print(auth_request)
+        with self.token_lock:
+            token = self.token_cache.get(self.token_key())
+            if token is None:
+                token = self.refresh_token()
+            if token is None:
+                token = self.request_token()
+            self.use_token(token)
+
+        return self.client
+
+    def token_key(self):
+        return TokenCache.key(self.api_url, self.creds.user, self.creds.public_client_id, self.creds.password)
+
+    def request_token(self, auth_request=None):
+        """
+        Request a new token, with the password grant unless another auth_request is given, and cache it
+        """
+        if auth_request is None:
+            auth_request = dict(client_id=self.creds.public_client_id,
+                                client_secret=self.creds.public_client_secret,
+                                grant_type='password',
+                                email=self.creds.user,
+                                password=self.creds.password)
+            print(dict(auth_request, password='********', client_secret='********'))
         resp = self.client.request(self.app.op['getAuthToken'](auth_request=auth_request))
 
         print(resp.status)
         assert resp.status == 200
 
-        self.auth = resp.data
-        self.auth_header = 'Bearer ' + self.auth.access_token
-        self.client._Client__s.headers['Authorization'] = self.auth_header
+        token = Token.from_response(resp.data)
+        self.token_cache.put(self.token_key(), token)
+        return token
 
-        return self.client
+    def refresh_token(self):
+        """
+        Exchange the cached refresh token for a new token, or return None if there is none or the server refuses
+        """
+        token = self.token_cache.get_refreshable(self.token_key())
+        if token is None:
+            return None
+
+        auth_request = dict(client_id=self.creds.public_client_id,
+                            client_secret=self.creds.public_client_secret,
+                            grant_type='refresh_token',
+                            refresh_token=token.refresh_token)
+        try:
+            return self.request_token(auth_request)
+        except Exception as e:
+            print("Cannot refresh token, logging in again: %r" % e)
+            return None
+
+    def use_token(self, token):
+        self.token = token
+        self.auth = token
+        self.client.session.headers['Authorization'] = 'Bearer ' + token.access_token
+
+    def reauthenticate(self):
+        """
+        Drop the current token after the server rejected it and log in again
+        :return: the new auth header
+        """
+        with self.token_lock:
+            self.token_cache.invalidate(self.token_key())
+            self.use_token(self.request_token())
+        return self.auth_header
+
+    @property
+    def auth_header(self):
+        """
+        Authorization header for the current token, transparently logging in again when it nears expiry
+        """
+        if self.needs_login():
+            self.login()
+        return 'Bearer ' + self.token.access_token
+
+    def needs_login(self):
+        """
+        Whether there is no token yet or the current one nears expiry
+        """
+        token = self.token
+        return token is None or token.expires_within(self.token_cache.refresh_margin)
 
     def __getitem__(self, op):
-        return lambda **args: self.app.op[op](**(self.bind_auth(args)))
+        """
+        Callable making the (req, resp) pair of operation op, with the current auth header bound
+        """
+        operation = self.operations.get(op)
+        if operation is None:
+            # e.g. a tag-scoped name
+            operation = BoundOperation(CompiledOperation(self.app.op[op]), self)
+        return operation
+
+    def has_parameter(self, op, name):
+        """
+        Whether the swagger definition declares parameter `name` for operation `op`
+        """
+        operation = self.operations.get(op)
+        if operation is not None:
+            return name in operation.operation.names
+        return any(final(parameter).name == name for parameter in self.app.op[op].parameters)
+
+    def parameter_maximum(self, op, name):
+        """
+        The `maximum` the swagger definition sets for parameter `name` of operation `op`, None if it sets none
+        """
+        for parameter in map(final, self.app.op[op].parameters):
+            if parameter.name == name:
+                return parameter.maximum
+        return None
 
     def bind_auth(self, args):
-        args.update(authorization=self.auth_header)
-        return args
+        return dict(args, authorization=self.auth_header)
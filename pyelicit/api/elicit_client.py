@@ -0,0 +1,171 @@
+from pyswagger.contrib.client.requests import Client
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from http import HTTPStatus
+import contextlib
+import threading
+import time
+from .metrics import operation_name, page_number
+from .scheduler import response_header, parse_retry_after, DEFAULT_RETRY_AFTER
+
+
+class ThrottleRetry(Retry):
+    """
+    urllib3 Retry leaving 429 responses to ElicitClient, which waits for them without holding a connection or the
+    limiter, and tells a scheduler to hold back the other requests too
+    """
+    RETRY_AFTER_STATUS_CODES = frozenset(Retry.RETRY_AFTER_STATUS_CODES - {HTTPStatus.TOO_MANY_REQUESTS})
+
+
+class ElicitClient(Client):
+    """
+    pyswagger requests Client whose session keeps a sized pool of keep-alive connections per host and retries
+    idempotent requests that fail with a connection error or a transient 5xx, backing off exponentially with jitter.
+    Requests answered 429 Too Many Requests are sent again after their Retry-After.
+    """
+    RETRY_STATUSES = (502, 503, 504)
+
+    DEFAULT_HTTP_OPT = dict(pool_size=10,
+                            max_retries=3,
+                            backoff_factor=0.5,
+                            backoff_jitter=0.5)
+
+    def __init__(self, auth=None, send_opt=None, http_opt=None, metrics=None, response_cache=None, adapter=None,
+                 limiter=None):
+        """
+        Initialize
+        :param auth: pyswagger Security applied to each request
+        :param send_opt: Options for requests' Session.send, e.g. verify and timeout
+        :param http_opt: Connection pool and retry options, see DEFAULT_HTTP_OPT
+        :param metrics: Optional metrics.Metrics recording every request
+        :param response_cache: Optional response_cache.ResponseCache answering repeated GETs
+        :param adapter: HTTPAdapter to share with other clients, see create_adapter (default: one of its own)
+        :param limiter: Optional context manager held while a request is in flight, e.g. a BoundedSemaphore or a
+                        scheduler.RequestScheduler
+        :return: returns nothing
+        """
+        super(ElicitClient, self).__init__(auth, send_opt=send_opt)
+
+        self.http_opt = self.merge_http_opt(http_opt)
+        if adapter is None:
+            adapter = self.create_adapter(self.http_opt)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+
+        # called on a 401 for an authorized request; returns a fresh auth header to retry once with
+        self.on_unauthorized = None
+
+        self.metrics = metrics
+        self.response_cache = response_cache
+        self.limiter = limiter if limiter is not None else contextlib.nullcontext()
+        self.last_response = threading.local()
+        self.session.hooks['response'].append(self.remember_response)
+
+    def request(self, req_and_resp, opt=None, headers=None):
+        if self.response_cache is not None:
+            return self.response_cache.request(self.measured_send, req_and_resp, opt, headers)
+        return self.measured_send(req_and_resp, opt, headers)
+
+    def measured_send(self, req_and_resp, opt=None, headers=None):
+        if self.metrics is None:
+            return self.send(req_and_resp, opt, headers)
+
+        start = time.perf_counter()
+        self.last_response.retries = 0
+        resp = None
+        try:
+            resp = self.send(req_and_resp, opt, headers)
+            return resp
+        finally:
+            req = req_and_resp[0]
+            raw = getattr(resp, 'raw', None)
+            self.metrics.record(operation_name(req),
+                                getattr(resp, 'status', None),
+                                time.perf_counter() - start,
+                                len(raw) if isinstance(raw, (bytes, str)) else 0,
+                                page=page_number(req),
+                                retries=self.last_response.retries)
+
+    def send(self, req_and_resp, opt=None, headers=None):
+        resp = self.limited_request(req_and_resp, opt, headers)
+
+        if resp.status == HTTPStatus.UNAUTHORIZED and self.on_unauthorized is not None:
+            req, _ = req_and_resp
+            auth_params = [name for name in req._p['header'] if name.lower() == 'authorization']
+            if auth_params:
+                # outside the limiter: logging in again is a request of its own
+                auth_header = self.on_unauthorized()
+                for name in auth_params:
+                    req._p['header'][name] = auth_header
+                self.last_response.retries = getattr(self.last_response, 'retries', 0) + 1
+                resp = self.limited_request(req_and_resp, opt, headers)
+
+        return resp
+
+    def limited_request(self, req_and_resp, opt=None, headers=None):
+        """
+        Send a request holding the limiter. Throttled (429) responses are sent again, up to max_retries times, once a
+        scheduler.RequestScheduler limiter resumes, or else after their Retry-After.
+        """
+        throttled = getattr(self.limiter, 'throttled', None) or self.wait_if_throttled
+        attempts = 0
+        while True:
+            with self.limiter:
+                resp = super(ElicitClient, self).request(req_and_resp, dict(opt or {}), headers)
+            if not throttled(resp) or attempts >= self.http_opt['max_retries']:
+                return resp
+            attempts += 1
+            self.last_response.retries = getattr(self.last_response, 'retries', 0) + 1
+
+    @staticmethod
+    def wait_if_throttled(resp):
+        if resp.status != HTTPStatus.TOO_MANY_REQUESTS:
+            return False
+        retry_after = parse_retry_after(response_header(resp, 'Retry-After'))
+        time.sleep(retry_after if retry_after is not None else DEFAULT_RETRY_AFTER)
+        return True
+
+    def remember_response(self, response, *args, **kwargs):
+        """Session response hook counting the transport-level retries urllib3 made for the request"""
+        retries = getattr(response.raw, 'retries', None)
+        history = getattr(retries, 'history', None) or ()
+        self.last_response.retries = getattr(self.last_response, 'retries', 0) + len(history)
+
+    @property
+    def session(self):
+        """The underlying requests.Session shared by every request made through this client"""
+        return self._Client__s
+
+    @classmethod
+    def merge_http_opt(cls, http_opt):
+        return dict(cls.DEFAULT_HTTP_OPT, **{k: v for k, v in (http_opt or {}).items() if v is not None})
+
+    @classmethod
+    def create_adapter(cls, http_opt=None):
+        """
+        HTTPAdapter pooling keep-alive connections and retrying with the http_opt policy; mount one on several
+        clients to share its connection pool
+        """
+        http_opt = cls.merge_http_opt(http_opt)
+        return HTTPAdapter(pool_connections=http_opt['pool_size'],
+                           pool_maxsize=http_opt['pool_size'],
+                           max_retries=cls.create_retry(http_opt))
+
+    def retry_policy(self):
+        return self.create_retry(self.http_opt)
+
+    @classmethod
+    def create_retry(cls, http_opt):
+        retry_opt = dict(total=http_opt['max_retries'],
+                         backoff_factor=http_opt['backoff_factor'],
+                         status_forcelist=cls.RETRY_STATUSES,
+                         allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # idempotent methods only; never re-POST
+                         respect_retry_after_header=True,
+                         raise_on_status=False)
+        try:
+            return ThrottleRetry(backoff_jitter=http_opt['backoff_jitter'], **retry_opt)
+        except TypeError:
+            # urllib3 < 2 has no jitter support
+            return ThrottleRetry(**retry_opt)
+
@@ -0,0 +1,184 @@
+import bisect
+import collections
+import json
+import threading
+import time
+
+RequestMetric = collections.namedtuple('RequestMetric',
+                                       ['operation', 'status', 'latency', 'bytes', 'page', 'retries', 'timestamp'])
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def operation_name(req):
+    """operationId of a pyswagger request, or its method and path"""
+    op = getattr(req, '_Request__op', None)
+    return getattr(op, 'operationId', None) or "%s %s" % (req.method.upper(), req.path)
+
+
+def page_number(req):
+    """The page query parameter of a request, if any"""
+    for key, value in req.query or ():
+        if key == 'page':
+            return int(value) if str(value).isdigit() else value
+    return None
+
+
+class MetricsSink:
+    """
+    Receives one RequestMetric per request; subclass and pass to Metrics.add_sink to export elsewhere
+    """
+    def record(self, metric):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, metric):
+        self.count += 1
+        self.errors += metric.status is None or metric.status >= 400
+        self.retries += metric.retries
+        self.latency += metric.latency
+        self.max_latency = max(self.max_latency, metric.latency)
+        self.bytes += metric.bytes
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, metric.latency)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the histogram bucket holding quantile q"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (self.max_latency,), self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_latency)
+        return self.max_latency
+
+
+class HistogramSink(MetricsSink):
+    """
+    In-memory latency histogram and totals per operation
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = collections.defaultdict(OperationStats)
+
+    def record(self, metric):
+        with self.lock:
+            self.operations[metric.operation].add(metric)
+
+    def summary(self):
+        """
+        Text report of the operations, the ones taking most wall time first
+        """
+        with self.lock:
+            operations = sorted(self.operations.items(), key=lambda item: -item[1].latency)
+            total = sum(stats.latency for _, stats in operations) or 1.0
+            lines = ["%-28s %8s %7s %8s %9s %9s %9s %7s %12s" %
+                     ('operation', 'requests', 'errors', 'retries', 'total s', 'p50 s', 'p95 s', '% time', 'bytes')]
+            for operation, stats in operations:
+                lines.append("%-28s %8d %7d %8d %9.3f %9.3f %9.3f %6.1f%% %12d" %
+                             (operation, stats.count, stats.errors, stats.retries, stats.latency, stats.quantile(0.5),
+                              stats.quantile(0.95), 100.0 * stats.latency / total, stats.bytes))
+        return "\n".join(lines)
+
+
+class JsonLinesSink(MetricsSink):
+    """
+    Append each request as one JSON object per line
+    """
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a')
+
+    def record(self, metric):
+        line = json.dumps(metric._asdict())
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PrometheusSink(HistogramSink):
+    """
+    Keeps per-operation histograms and renders them in the Prometheus text exposition format
+    """
+    def __init__(self, path=None, prefix='elicit_client'):
+        """
+        Initialize
+        :param path: File rewritten with the current metrics on close (e.g. for the node_exporter textfile collector)
+        :param prefix: Metric name prefix
+        :return: returns nothing
+        """
+        super(PrometheusSink, self).__init__()
+        self.path = path
+        self.prefix = prefix
+
+    def render(self):
+        p = self.prefix
+        lines = ["# HELP %s_request_duration_seconds Elicit API request latency" % p,
+                 "# TYPE %s_request_duration_seconds histogram" % p]
+        with self.lock:
+            operations = sorted(self.operations.items())
+            for operation, stats in operations:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append('%s_request_duration_seconds_bucket{operation="%s",le="%s"} %d' %
+                                 (p, operation, bound, cumulative))
+                lines.append('%s_request_duration_seconds_bucket{operation="%s",le="+Inf"} %d' % (p, operation, stats.count))
+                lines.append('%s_request_duration_seconds_sum{operation="%s"} %f' % (p, operation, stats.latency))
+                lines.append('%s_request_duration_seconds_count{operation="%s"} %d' % (p, operation, stats.count))
+            for name, attribute, help_text in [('errors_total', 'errors', 'Requests failing with an error status'),
+                                               ('retries_total', 'retries', 'Request retries'),
+                                               ('response_bytes_total', 'bytes', 'Response body bytes')]:
+                lines.append("# HELP %s_%s %s" % (p, name, help_text))
+                lines.append("# TYPE %s_%s counter" % (p, name))
+                for operation, stats in operations:
+                    lines.append('%s_%s{operation="%s"} %d' % (p, name, operation, getattr(stats, attribute)))
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self.path is not None:
+            with open(self.path, 'w') as prometheus_file:
+                prometheus_file.write(self.render())
+
+
+class Metrics:
+    """
+    Collects a RequestMetric for every request and fans it out to the sinks. An in-memory HistogramSink is always
+    kept for the session summary.
+    """
+    def __init__(self, sinks=()):
+        self.histogram = HistogramSink()
+        self.sinks = [self.histogram] + list(sinks)
+        self.started = time.time()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def record(self, operation, status, latency, bytes, page=None, retries=0):
+        metric = RequestMetric(operation, status, latency, bytes, page, retries, time.time())
+        for sink in self.sinks:
+            sink.record(metric)
+        return metric
+
+    def summary(self):
+        return "Session of %.1fs:\n%s" % (time.time() - self.started, self.histogram.summary())
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,131 @@
+import weakref
+from pyswagger.io import Request, Response
+from pyswagger.utils import final
+
+# type: formats converted without pyswagger's primitive factory
+FAST_TYPES = {'integer': (None, 'int32', 'int64'), 'string': (None,)}
+CONSTRAINTS = ('enum', 'minimum', 'maximum', 'minLength', 'maxLength', 'pattern')
+
+
+class CompiledParameter:
+    __slots__ = ('name', 'location', 'required', 'has_default', 'default', 'convert', 'convert_primitive')
+
+    def __init__(self, parameter, convert, convert_primitive):
+        self.name = parameter.name
+        self.location = getattr(parameter, 'in')
+        self.required = parameter.required
+        self.has_default = parameter.is_set('default')
+        self.default = parameter.default
+        self.convert = convert or convert_primitive
+        self.convert_primitive = convert_primitive
+
+
+def fast_converter(parameter):
+    """
+    str() of the value for unconstrained integer and string parameters, as pyswagger would produce it; None for
+    parameters that need the primitive factory
+    """
+    if parameter.type not in FAST_TYPES or parameter.format not in FAST_TYPES[parameter.type]:
+        return None
+    if any(getattr(parameter, constraint, None) for constraint in CONSTRAINTS):
+        return None
+    if parameter.type == 'integer':
+        return lambda value: str(int(value))
+    return lambda value: value if isinstance(value, str) else str(value)
+
+
+class CompiledOperation:
+    """
+    pyswagger operation call (op(**args) -> (req, resp)) with the parameters resolved once.
+
+    Unconstrained integer and string path, query and header parameters are converted directly, the others by pyswagger's
+    primitive factory as usual. Operations with form, file or array parameters are passed to pyswagger as they are.
+    """
+    def __init__(self, op):
+        self.op = op
+        self.operation_id = op.operationId
+        self.parameters = []
+        self.names = frozenset()
+        self.auth_parameter = None
+        self.compiled = True
+
+        for parameter in map(final, op.parameters):
+            location = getattr(parameter, 'in')
+            if location in ('formData', 'file') or parameter.type in ('file', 'array'):
+                self.compiled = False
+                break
+            if location == 'header' and parameter.name.lower() == 'authorization':
+                self.auth_parameter = parameter.name
+            convert = fast_converter(parameter) if location != 'body' else None
+            self.parameters.append(CompiledParameter(parameter, convert, self.primitive_converter(parameter)))
+        self.names = frozenset(parameter.name for parameter in map(final, op.parameters))
+
+    def primitive_converter(self, parameter):
+        factory = self.op._prim_factory
+        if getattr(parameter, 'in') == 'body':
+            return lambda value: parameter._prim_(value, factory, ctx=dict(read=False))
+        return lambda value: str(parameter._prim_(value, factory, ctx=dict(read=False)))
+
+    def params(self, args, body=True):
+        """
+        pyswagger's parameter set for args; with body=False the body parameter is left out
+        """
+        unknown = args.keys() - self.names
+        if unknown:
+            raise ValueError('Unknown parameters: {0}'.format(set(unknown)))
+
+        params = dict(header={}, query=[], path={}, body={}, formData=[], file={})
+        for parameter in self.parameters:
+            location = parameter.location
+            if location == 'body' and not body:
+                continue
+            if parameter.name in args:
+                value = args[parameter.name]
+            elif parameter.has_default:
+                value = parameter.default
+            elif parameter.required:
+                raise ValueError('requires parameter: ' + parameter.name)
+            else:
+                continue
+
+            # the primitive factory handles None (as the default, if any)
+            value = parameter.convert(value) if value is not None else parameter.convert_primitive(value)
+            if location == 'query':
+                params['query'].append((parameter.name, value))
+            else:
+                params[location][parameter.name] = value
+        return params
+
+    def __call__(self, **args):
+        if not self.compiled:
+            return self.op(**args)
+        return Request(op=self.op, params=self.params(args)), Response(self.op)
+
+
+class BoundOperation:
+    """
+    CompiledOperation called with the current auth header of an ElicitApi, without changing the caller's arguments
+    """
+    __slots__ = ('operation', 'elicit_api')
+
+    def __init__(self, operation, elicit_api):
+        self.operation = operation
+        self.elicit_api = elicit_api
+
+    def __call__(self, **args):
+        if self.operation.auth_parameter is not None:
+            args[self.operation.auth_parameter] = self.elicit_api.auth_header
+        return self.operation(**args)
+
+
+_compiled = weakref.WeakKeyDictionary()
+
+
+def compile_operations(app):
+    """
+    {operationId: CompiledOperation} for every operation of app, compiled once per App
+    """
+    operations = _compiled.get(app)
+    if operations is None:
+        operations = _compiled[app] = {op.operationId: CompiledOperation(op) for op in app.op.values()}
+    return operations
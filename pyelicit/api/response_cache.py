@@ -0,0 +1,228 @@
+import collections
+import json
+import sqlite3
+import threading
+import time
+from http import HTTPStatus
+from pathlib import Path
+from .metrics import operation_name
+
+CacheEntry = collections.namedtuple('CacheEntry', ['operation', 'status', 'headers', 'raw', 'etag', 'stored_at'])
+
+
+class MemoryBackend:
+    """
+    In-process LRU store of cache entries
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete_operations(self, predicate):
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if predicate(entry.operation)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskBackend:
+    """
+    SQLite store of cache entries, shared between sessions and processes, evicting the least recently used
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        operation TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        headers TEXT NOT NULL,
+        raw BLOB,
+        etag TEXT,
+        stored_at REAL NOT NULL,
+        used_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+    """
+
+    def __init__(self, cache_dir=None, max_entries=10000):
+        """
+        Initialize
+        :param cache_dir: Directory for the cache database (default: ~/.cache/elicit/responses)
+        :param max_entries: Entries kept before the least recently used are evicted
+        :return: returns nothing
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / '.cache' / 'elicit' / 'responses'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.cache_dir / 'responses.sqlite3'), check_same_thread=False)
+        self.connection.executescript(self.SCHEMA)
+
+    def get(self, key):
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT operation, status, headers, raw, etag, stored_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+        operation, status, headers, raw, etag, stored_at = row
+        return CacheEntry(operation, status, [tuple(header) for header in json.loads(headers)], raw, etag, stored_at)
+
+    def put(self, key, entry):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, operation, status, headers, raw, etag, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, entry.operation, entry.status, json.dumps(entry.headers, default=str), entry.raw, entry.etag,
+                 entry.stored_at, time.time()))
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def delete_operations(self, predicate):
+        with self.lock, self.connection:
+            operations = [operation for (operation,) in
+                          self.connection.execute("SELECT DISTINCT operation FROM responses")
+                          if predicate(operation)]
+            self.connection.executemany("DELETE FROM responses WHERE operation = ?",
+                                        [(operation,) for operation in operations])
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def resource_name(operation):
+    """'findComponents' -> 'Components', 'addComponent' -> 'Component'"""
+    for prefix in ('find', 'get', 'add'):
+        if operation.startswith(prefix):
+            return operation[len(prefix):]
+    return operation
+
+
+def singular(resource):
+    """'Components' -> 'Component', 'Studies' -> 'Study'; singular names are returned as they are"""
+    if resource.endswith('ies'):
+        return resource[:-len('ies')] + 'y'
+    if resource.endswith('s') and not resource.endswith('ss'):
+        return resource[:-1]
+    return resource
+
+
+class ResponseCache:
+    """
+    Cache of successful GET responses, keyed by operation and normalized parameters.
+
+    Entries are served without a request for their operation's TTL. Once stale, an entry with an ETag is revalidated
+    with If-None-Match and reused on 304 Not Modified; one without is fetched again. A successful add* call drops the
+    cached responses of every operation on the same resource (addComponent drops findComponents and getComponent).
+    """
+    def __init__(self, backend=None, ttl=60, ttls=None, namespace=''):
+        """
+        Initialize
+        :param backend: MemoryBackend (the default) or DiskBackend
+        :param ttl: Seconds an entry is served without revalidation, for operations not in ttls
+        :param ttls: Per-operation TTLs, e.g. dict(findDataPoints=0); a TTL of None disables caching the operation
+        :param namespace: Keeps the entries of different servers and users apart in a shared backend
+        :return: returns nothing
+        """
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.namespace = namespace
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+
+    def count(self, outcome):
+        with self.stats_lock:
+            self.stats[outcome] += 1
+
+    def operation_ttl(self, operation):
+        return self.ttls.get(operation, self.ttl)
+
+    def key(self, operation, req):
+        params = req._p
+        return json.dumps([self.namespace, operation, params['path'], params['query']], sort_keys=True, default=str)
+
+    def request(self, send, req_and_resp, opt=None, headers=None):
+        """
+        Make a request through send(req_and_resp, opt, headers), answering or revalidating it from the cache
+        """
+        req, resp = req_and_resp
+        operation = operation_name(req)
+
+        if req.method.upper() != 'GET':
+            resp = send(req_and_resp, opt, headers)
+            if 200 <= resp.status < 300:
+                self.invalidate(operation)
+            return resp
+
+        ttl = self.operation_ttl(operation)
+        if ttl is None:
+            return send(req_and_resp, opt, headers)
+
+        key = self.key(operation, req)
+        entry = self.backend.get(key)
+        if entry is not None and time.time() - entry.stored_at < ttl:
+            self.count('hits')
+            return self.replay(entry, resp)
+
+        if entry is not None and entry.etag:
+            headers = dict(headers or {}, **{'If-None-Match': entry.etag})
+        resp = send(req_and_resp, opt, headers)
+
+        if resp.status == HTTPStatus.NOT_MODIFIED and entry is not None:
+            self.count('revalidated')
+            self.backend.put(key, entry._replace(stored_at=time.time()))
+            resp.reset()
+            return self.replay(entry, resp)
+
+        self.count('misses')
+        if resp.status == HTTPStatus.OK:
+            etag = resp.header.get('ETag')
+            self.backend.put(key, CacheEntry(operation, resp.status,
+                                             [(name, value) for name, values in resp.header.items() for value in values],
+                                             resp.raw, etag[0] if etag else None, time.time()))
+        return resp
+
+    @staticmethod
+    def replay(entry, resp):
+        return resp.apply_with(status=entry.status, header=entry.headers, raw=entry.raw)
+
+    def invalidate(self, operation):
+        """
+        Drop the cached responses of the operations on operation's resource
+        """
+        resource = singular(resource_name(operation))
+        self.backend.delete_operations(lambda cached_operation: singular(resource_name(cached_operation)) == resource)
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,205 @@
+"""
+Client-side scheduling of API requests: a token bucket rate limit, a cap on the requests in flight and fair turns
+between jobs.
+"""
+import collections
+import contextlib
+import contextvars
+import email.utils
+import threading
+import time
+
+DEFAULT_RETRY_AFTER = 1.0
+# RateLimit-Reset values above this are a Unix time rather than seconds from now
+EPOCH_THRESHOLD = 1e9
+
+current_job = contextvars.ContextVar('elicit_job', default=None)
+
+
+def response_header(resp, name):
+    """First value of a pyswagger response header, whatever the case of its name; None without one"""
+    for key, values in (getattr(resp, 'header', None) or {}).items():
+        if key.lower() == name.lower():
+            return values[0] if isinstance(values, list) else values
+    return None
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date; None if absent or invalid"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value):
+    """Seconds until a rate limit window resets, from a RateLimit-Reset header in seconds or as a Unix time"""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, reset - time.time() if reset > EPOCH_THRESHOLD else reset)
+
+
+class RequestScheduler:
+    """
+    Limiter for ElicitClient (see its limiter argument) deciding when each request may start.
+
+    A request waits for a slot (at most max_in_flight at once) and a token from a bucket refilled at rate tokens a
+    second, holding up to burst. Waiting requests are grouped by job, see job(), and the jobs take turns, so a job
+    queuing thousands of requests delays another job's next request by at most one request. A 429 response, or a
+    response saying the rate limit is used up, pauses every job until the server's Retry-After or RateLimit-Reset.
+    """
+    def __init__(self, rate=None, burst=None, max_in_flight=None, default_retry_after=DEFAULT_RETRY_AFTER):
+        """
+        Initialize
+        :param rate: Requests started per second on average (default: no rate limit)
+        :param burst: Requests that may start at once after a quiet period (default: rate, at least 1)
+        :param max_in_flight: Requests in flight at once (default: no cap)
+        :param default_retry_after: Seconds to pause after a 429 without a Retry-After header
+        :return: returns nothing
+        """
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.max_in_flight = max_in_flight
+        self.default_retry_after = default_retry_after
+
+        self.condition = threading.Condition()
+        # job -> waiting tickets; the first job with a waiting request is served next
+        self.queues = collections.OrderedDict()
+        self.in_flight = 0
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0
+
+        self.requests = 0
+        self.throttled_responses = 0
+        self.wait_seconds = 0.0
+        self.peak_queued = 0
+
+    @staticmethod
+    @contextlib.contextmanager
+    def job(name):
+        """
+        Context in which requests belong to job name, including those made by the threads find_* and bulk calls start
+        """
+        token = current_job.set(name)
+        try:
+            yield name
+        finally:
+            current_job.reset(token)
+
+    def __enter__(self):
+        self.acquire(current_job.get())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def queued(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def delay(self):
+        """
+        Seconds until the next request may start (0: now), None while the requests in flight are at the cap
+        """
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return None
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+        return 0
+
+    def acquire(self, job=None):
+        """
+        Wait for job's turn to start a request
+        """
+        ticket = object()
+        start = time.monotonic()
+        with self.condition:
+            self.queues.setdefault(job, collections.deque()).append(ticket)
+            self.peak_queued = max(self.peak_queued, self.queued())
+            while True:
+                head_queue = next(iter(self.queues.values()))
+                if head_queue[0] is ticket:
+                    delay = self.delay()
+                    if delay == 0:
+                        break
+                    self.condition.wait(delay)
+                else:
+                    self.condition.wait()
+
+            head_queue.popleft()
+            if head_queue:
+                # the job's next request waits for the other jobs' turns
+                self.queues.move_to_end(job)
+            else:
+                del self.queues[job]
+            self.in_flight += 1
+            if self.rate:
+                self.tokens -= 1
+            self.requests += 1
+            self.wait_seconds += time.monotonic() - start
+            self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def pause(self, seconds):
+        """
+        Start no request for the next seconds
+        """
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def throttled(self, resp):
+        """
+        Take in the rate limit headers of a response. True when it was a 429, to be sent again: the scheduler pauses
+        until its Retry-After first.
+        """
+        throttled = getattr(resp, 'status', None) == 429
+        pause = None
+        if throttled:
+            pause = parse_retry_after(response_header(resp, 'Retry-After'))
+            if pause is None:
+                pause = self.default_retry_after
+        else:
+            remaining = response_header(resp, 'RateLimit-Remaining') or response_header(resp, 'X-RateLimit-Remaining')
+            reset = response_header(resp, 'RateLimit-Reset') or response_header(resp, 'X-RateLimit-Reset')
+            if remaining is not None and reset is not None and remaining.strip() == '0':
+                pause = parse_reset(reset)
+
+        if pause:
+            self.pause(pause)
+        if throttled:
+            with self.condition:
+                self.throttled_responses += 1
+        return throttled
+
+    def stats(self):
+        """
+        Snapshot of the queue: requests waiting (in all and by job), in flight, the most ever waiting, requests started,
+        429s received, total seconds requests waited and seconds left of a pause
+        """
+        with self.condition:
+            return dict(queued=self.queued(),
+                        queued_by_job={job: len(queue) for job, queue in self.queues.items()},
+                        in_flight=self.in_flight,
+                        peak_queued=self.peak_queued,
+                        requests=self.requests,
+                        throttled=self.throttled_responses,
+                        wait_seconds=self.wait_seconds,
+                        paused_for=max(0.0, self.paused_until - time.monotonic()))
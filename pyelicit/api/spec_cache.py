@@ -0,0 +1,152 @@
+from pyswagger import App
+import pyswagger
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import requests
+from pathlib import Path
+
+
+class SpecCache:
+    """
+    On-disk cache of the Elicit swagger definition, keyed by API URL.
+
+    Each entry keeps the downloaded swagger.json, the ETag/Last-Modified validators the server sent with it and a
+    pickled snapshot of the resolved pyswagger App, so a warm start can skip both the download and the schema
+    resolution.
+    """
+    DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'elicit' / 'swagger'
+    SPEC_FILE = 'swagger.json'
+    META_FILE = 'meta.json'
+    SNAPSHOT_FILE = 'app.pickle'
+
+    def __init__(self, cache_dir=None, offline=False, max_age=0):
+        """
+        Initialize
+        :param cache_dir: Directory holding the cache entries (default: ~/.cache/elicit/swagger)
+        :param offline: Never touch the network; fail if the definition isn't cached
+        :param max_age: Seconds a cached definition is trusted without revalidating it against the server
+        :return: returns nothing
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else self.DEFAULT_CACHE_DIR
+        self.offline = offline
+        self.max_age = max_age
+
+    def entry_dir(self, swagger_url):
+        return self.cache_dir / hashlib.sha256(swagger_url.encode('utf-8')).hexdigest()[:16]
+
+    def load_app(self, swagger_url, session=None):
+        """
+        Return the pyswagger App for swagger_url, downloading and resolving the definition only when it changed.
+        :param swagger_url: URL of the swagger.json definition
+        :param session: Optional requests.Session to download with
+        :return: the resolved App
+        """
+        entry = self.entry_dir(swagger_url)
+        meta = self._read_meta(entry)
+        spec_path = entry / self.SPEC_FILE
+
+        if self.offline or (meta and self.max_age and time.time() - meta.get('fetched_at', 0) < self.max_age):
+            if meta is None or not spec_path.is_file():
+                raise FileNotFoundError('No cached swagger definition for {} in {}'.format(swagger_url, entry))
+            print(f"Using cached swagger definition for {swagger_url}")
+            return self._app_from_cache(entry, meta)
+
+        headers = {}
+        if meta is not None and spec_path.is_file():
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        print(f"Downloading swagger definition from {swagger_url}")
+        try:
+            response = (session or requests).get(swagger_url, headers=headers)
+        except requests.exceptions.ConnectionError:
+            if meta is None or not spec_path.is_file():
+                raise
+            print(f"WARNING: cannot reach {swagger_url}; using cached swagger definition")
+            return self._app_from_cache(entry, meta)
+
+        if response.status_code == 304:
+            print(f"Cached swagger definition for {swagger_url} is current")
+            meta['fetched_at'] = time.time()
+            self._write(entry / self.META_FILE, json.dumps(meta).encode('utf-8'))
+            return self._app_from_cache(entry, meta)
+
+        if response.status_code >= 400:
+            raise PermissionError('Cannot load swagger file {} {}.'.format(response.status_code, response.reason))
+
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        if meta is None or meta.get('sha256') != sha256 or not spec_path.is_file():
+            self._write(spec_path, response.content)
+            print(f"Saved swagger.json to {spec_path}")
+
+        meta = dict(url=swagger_url,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    sha256=sha256,
+                    fetched_at=time.time())
+        self._write(entry / self.META_FILE, json.dumps(meta).encode('utf-8'))
+
+        return self._app_from_cache(entry, meta)
+
+    def clear(self, swagger_url):
+        entry = self.entry_dir(swagger_url)
+        for name in [self.SPEC_FILE, self.META_FILE, self.SNAPSHOT_FILE]:
+            if (entry / name).exists():
+                (entry / name).unlink()
+
+    def _app_from_cache(self, entry, meta):
+        version = self._snapshot_version(meta)
+        snapshot_path = entry / self.SNAPSHOT_FILE
+
+        if snapshot_path.is_file():
+            try:
+                with open(snapshot_path, 'rb') as snapshot_file:
+                    snapshot_version, app = pickle.load(snapshot_file)
+                if snapshot_version == version:
+                    return app
+            except Exception as e:
+                print(f"WARNING: discarding unreadable swagger snapshot {snapshot_path}: {e}")
+
+        swagger_json_url = (entry / self.SPEC_FILE).as_uri()
+        print(f"Resolving Elicit API Swagger definition {swagger_json_url}")
+        app = App.create(swagger_json_url)
+
+        try:
+            self._write(snapshot_path, pickle.dumps((version, app)))
+        except Exception as e:
+            print(f"WARNING: cannot snapshot swagger definition: {e}")
+
+        return app
+
+    @staticmethod
+    def _snapshot_version(meta):
+        # A snapshot is only valid for the exact spec and the pyswagger/python that pickled it.
+        return (meta.get('sha256'), getattr(pyswagger, '__version__', None), sys.version_info[:2])
+
+    def _read_meta(self, entry):
+        try:
+            with open(entry / self.META_FILE, 'r') as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path, content):
+        # Write atomically so concurrent processes sharing the cache never see a partial file.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
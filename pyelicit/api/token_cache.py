@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+class Token:
+    """
+    OAuth access token with its (optional) refresh token and expiry time
+    """
+    def __init__(self, access_token, refresh_token=None, expires_at=None):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_response(cls, data):
+        """
+        Build a Token from the getAuthToken response (access_token, refresh_token, expires_in, created_at)
+        """
+        def field(name):
+            return getattr(data, name, None) if not isinstance(data, dict) else data.get(name)
+
+        expires_at = None
+        if field('expires_in') is not None:
+            expires_at = (field('created_at') or time.time()) + field('expires_in')
+        return cls(field('access_token'), field('refresh_token'), expires_at)
+
+    def expires_within(self, seconds):
+        return self.expires_at is not None and self.expires_at - time.time() < seconds
+
+    def to_dict(self):
+        return dict(access_token=self.access_token, refresh_token=self.refresh_token, expires_at=self.expires_at)
+
+    def __repr__(self):
+        return "Token(expires_at=%s)" % self.expires_at
+
+
+class TokenCache:
+    """
+    Cache of OAuth tokens keyed by (api_url, user, client_id), plus a digest of the password.
+
+    Tokens are shared between all ElicitApi instances in the process and, when a cache directory is given, with other
+    processes through one file per key (readable only by the owner).
+    """
+    REFRESH_MARGIN = 60
+
+    _memory = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir=None, refresh_margin=REFRESH_MARGIN):
+        """
+        Initialize
+        :param cache_dir: Directory to persist tokens in; None keeps them in memory only
+        :param refresh_margin: Seconds before expiry at which a token is no longer handed out
+        :return: returns nothing
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.refresh_margin = refresh_margin
+
+    @staticmethod
+    def key(api_url, user, client_id, password=None):
+        """
+        Cache key of a login; with the password, a token is only reused by callers that know it
+        """
+        if password is None:
+            return (api_url.rstrip('/'), user, client_id)
+        return (api_url.rstrip('/'), user, client_id, hashlib.sha256(password.encode('utf-8')).hexdigest()[:16])
+
+    def get(self, key):
+        """
+        Return the cached Token for key, or None if there is none or it is about to expire
+        """
+        with self._lock:
+            token = self._memory.get(key)
+        if token is None:
+            token = self._read(key)
+        if token is None or token.expires_within(self.refresh_margin):
+            return None
+        return token
+
+    def get_refreshable(self, key):
+        """
+        Return the cached Token for key even if it is expiring, as long as it can be refreshed
+        """
+        with self._lock:
+            token = self._memory.get(key)
+        token = token or self._read(key)
+        return token if token is not None and token.refresh_token else None
+
+    def put(self, key, token):
+        with self._lock:
+            self._memory[key] = token
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # mkstemp gives every writer, thread or process, its own file, created readable only by the owner
+            fd, temp_path = tempfile.mkstemp(dir=str(self.cache_dir), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as token_file:
+                    json.dump(token.to_dict(), token_file)
+                os.replace(temp_path, self._path(key))
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.cache_dir is not None and self._path(key).exists():
+            self._path(key).unlink()
+
+    def _path(self, key):
+        return self.cache_dir / (hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()[:16] + '.json')
+
+    def _read(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), 'r') as token_file:
+                token = Token(**json.load(token_file))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+        with self._lock:
+            self._memory[key] = token
+        return token
@@ -0,0 +1,365 @@
+import asyncio
+import collections
+import time
+import types
+from http import HTTPStatus
+from pyswagger.core import BaseClient
+from . import api
+from .elicit import (_pp, DEFAULT_PAGE_SIZE, FIND_APIS, ADD_APIS, GET_APIS, camel_to_snake, create_elicit_api,
+                     create_send_opt, encode_definition_data, page_links)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncClient(BaseClient):
+    """
+    asyncio counterpart of pyswagger's requests Client.
+
+    Requests are built from the same pyswagger operations as the synchronous client and sent over one shared
+    aiohttp connection pool; at most `concurrency` requests are in flight at once.
+    """
+
+    __schemes__ = set(['http', 'https'])
+
+    def __init__(self, auth=None, send_opt=None, concurrency=10, pool_size=10, metrics=None):
+        """
+        Initialize
+        :param auth: pyswagger Security applied to each request
+        :param send_opt: Request options; verify and timeout are honoured
+        :param concurrency: Maximum number of requests in flight
+        :param pool_size: Maximum number of pooled connections
+        :param metrics: Optional api.Metrics recording every request
+        :return: returns nothing
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncClient requires aiohttp; install pyelicit[async]')
+
+        super(AsyncClient, self).__init__(auth)
+        self.send_opt = send_opt or {}
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.headers = {}
+        self.session = None
+        self.semaphore = None
+        self.metrics = metrics
+
+        # coroutine returning a current auth header, logging in again off the event loop when the token nears expiry
+        self.authorize = None
+        # coroutine called with the auth header of a request that got a 401; returns a fresh one to retry once with
+        self.on_unauthorized = None
+
+    async def open(self):
+        if self.session is None:
+            timeout = aiohttp.ClientTimeout(total=self.send_opt.get('timeout'))
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=bool(self.send_opt.get('verify', True)))
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, req_and_resp, opt=None, headers=None):
+        resp = await self.send(req_and_resp, opt, headers)
+
+        if resp.status == HTTPStatus.UNAUTHORIZED and self.on_unauthorized is not None:
+            req, _ = req_and_resp
+            auth_params = [name for name in req._p['header'] if name.lower() == 'authorization']
+            if auth_params:
+                auth_header = await self.on_unauthorized(req._p['header'][auth_params[0]])
+                for name in auth_params:
+                    req._p['header'][name] = auth_header
+                resp = await self.send(req_and_resp, opt, headers)
+
+        return resp
+
+    async def send(self, req_and_resp, opt=None, headers=None):
+        await self.open()
+
+        # make sure all prepared state are clean before processing
+        req, resp = req_and_resp
+        req.reset()
+        resp.reset()
+
+        opt = opt or {}
+        req, resp = super(AsyncClient, self).request((req, resp), opt)
+
+        req.prepare(scheme=self.prepare_schemes(req), handle_files=False)
+        req._patch(opt)
+
+        if req.files:
+            raise NotImplementedError('AsyncClient does not upload files')
+
+        composed_headers = dict(self.headers, **dict(self.compose_headers(req, headers, opt, as_dict=True)))
+
+        async with self.semaphore:
+            start = time.perf_counter()
+            async with self.session.request(req.method.upper(),
+                                            req.url,
+                                            params=req.query,
+                                            data=req.data,
+                                            headers=composed_headers) as rs:
+                raw = await rs.read()
+
+        if self.metrics is not None:
+            self.metrics.record(api.operation_name(req), rs.status, time.perf_counter() - start, len(raw),
+                                page=api.page_number(req))
+
+        resp.apply_with(status=rs.status, header=rs.headers, raw=raw)
+
+        return resp
+
+
+async def make_request(client, elicit, operation, **args):
+    """
+    elicit[operation](**args), once the client has made sure the token it binds won't need a blocking login
+    """
+    if client.authorize is not None:
+        await client.authorize()
+    return elicit[operation](**args)
+
+
+async def add_object(client, elicit, operation, pp = _pp, **args):
+    resp = await client.request(await make_request(client, elicit, operation, **encode_definition_data(args)))
+    assert resp.status == HTTPStatus.CREATED
+
+    created_object = resp.data
+    if pp is not None:
+        pp.print("\n\nCreated new object with %s:\n" % operation)
+        pp.pprint(created_object)
+
+    return created_object
+
+
+async def get_object(client, elicit, operation, pp = _pp, **args):
+    resp = await client.request(await make_request(client, elicit, operation, **args))
+    assert resp.status == HTTPStatus.OK
+
+    found_object = resp.data
+    if pp is not None:
+        pp.print("\n\nGot object with %s(%s):\n" % (operation, args))
+        pp.pprint(found_object)
+
+    return found_object
+
+
+async def find_objects(client, elicit, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE, **args):
+    """
+    Collect every page of a paginated find operation. Once the first page's Link header reveals the last page the
+    remaining pages are requested concurrently, as many at a time as the client's concurrency limit, and returned in
+    page order.
+    """
+    found_objects = []
+    async for page_data in iter_pages(client, elicit, operation, pp, default_page_size, **args):
+        found_objects += page_data
+
+    if pp is not None:
+        pp.print("\n\nFound objects with %s(%s):\n" % (operation, args))
+        pp.pprint(found_objects)
+
+    return found_objects
+
+
+async def iter_objects(client, elicit, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE, **args):
+    """
+    Async generator counterpart of find_objects, yielding records page by page.
+    """
+    async for page_data in iter_pages(client, elicit, operation, pp, default_page_size, **args):
+        for record in page_data:
+            yield record
+
+
+async def iter_pages(client, elicit, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE, **args):
+    pagination_aware = 'page' in args
+    page_size = args.get('page_size') or default_page_size
+
+    async def fetch_page(page):
+        page_args = args if pagination_aware else dict(args, page=page, page_size=page_size)
+        resp = await client.request(await make_request(client, elicit, operation, **page_args))
+        assert resp.status == HTTPStatus.OK
+        return resp
+
+    page = 1
+    next_link = True
+    while next_link:
+        resp = await fetch_page(page)
+        next_link, last_page = False, ''
+        if len(resp.data) > 0 and not pagination_aware:
+            next_link, last_page = page_links(resp, page_size, pp, len(resp.data), page)
+        yield resp.data
+
+        if next_link and last_page:
+            if pp is not None:
+                pp.print("Fetching pages %d-%s concurrently" % (page + 1, last_page))
+            # a window of pages in flight, topped up as pages are yielded, so a slow consumer doesn't buffer the rest
+            remaining = iter(range(page + 1, int(last_page) + 1))
+            pending = collections.deque()
+
+            def schedule():
+                next_page = next(remaining, None)
+                if next_page is not None:
+                    pending.append(asyncio.ensure_future(fetch_page(next_page)))
+
+            for _ in range(max(1, getattr(client, 'concurrency', 1))):
+                schedule()
+            try:
+                while pending:
+                    page_data = (await pending.popleft()).data
+                    schedule()
+                    yield page_data
+            finally:
+                for future in pending:
+                    future.cancel()
+            next_link = False
+
+        page += 1
+
+
+class AsyncElicit:
+    """
+    asyncio counterpart of Elicit, for embedding in async services.
+
+    Takes the same configuration as Elicit, plus:
+        - concurrency (int, optional): Maximum number of requests in flight (default: 10).
+
+    Use as an async context manager, which loads the swagger definition and logs in (both off the event loop), and
+    closes the connection pool:
+
+        async with AsyncElicit(configuration) as elicit:
+            data_points = await elicit.find_data_points(study_result_id=1)
+    """
+    def __init__(self, base_configuration):
+        configuration = base_configuration
+        if not isinstance(base_configuration, dict):
+            configuration = vars(base_configuration)
+
+        self.creds = api.ElicitCreds.from_env(configuration)
+
+        if self.creds is None:
+            raise Exception("Credentials not found")
+
+        self.script_args = types.SimpleNamespace(**configuration)
+        # built by login(), as loading the swagger definition blocks
+        self.elicit_api = None
+        self.client = None
+        self.auth_lock = None
+
+    async def login(self):
+        # Loading the swagger definition and token requests are one-offs, so they reuse the synchronous code, run off
+        # the event loop
+        loop = asyncio.get_running_loop()
+        if self.elicit_api is None:
+            self.elicit_api = await loop.run_in_executor(None, create_elicit_api, self.creds, self.script_args)
+            self.client = AsyncClient(self.elicit_api.auth,
+                                      send_opt=create_send_opt(self.script_args),
+                                      concurrency=getattr(self.script_args, 'concurrency', None) or 10,
+                                      pool_size=getattr(self.script_args, 'pool_size', None) or 10,
+                                      metrics=self.elicit_api.metrics)
+            self.client.authorize = self.authorize
+            self.client.on_unauthorized = self.reauthenticate
+        self.auth_lock = asyncio.Lock()
+        await self.authorize()
+        await self.client.open()
+        return self
+
+    def current_auth_header(self):
+        self.client.headers['Authorization'] = 'Bearer ' + self.elicit_api.token.access_token
+        return self.client.headers['Authorization']
+
+    async def authorize(self):
+        """
+        The current auth header, logging in again first when the token nears expiry
+        """
+        if self.elicit_api.needs_login():
+            async with self.auth_lock:
+                if self.elicit_api.needs_login():
+                    await asyncio.get_running_loop().run_in_executor(None, self.elicit_api.login)
+        return self.current_auth_header()
+
+    async def reauthenticate(self, rejected_header):
+        """
+        A fresh auth header after the server rejected rejected_header; requests rejected together log in once
+        """
+        async with self.auth_lock:
+            if self.current_auth_header() == rejected_header:
+                await asyncio.get_running_loop().run_in_executor(None, self.elicit_api.reauthenticate)
+        return self.current_auth_header()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.elicit_api.metrics.close()
+
+    def metrics_summary(self):
+        return self.elicit_api.metrics.summary()
+
+    async def __aenter__(self):
+        return await self.login()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def api_url(self):
+        return self.script_args.api_url
+
+    async def auth_header(self):
+        return await self.authorize()
+
+    def page_size(self):
+        return getattr(self.script_args, 'page_size', None) or DEFAULT_PAGE_SIZE
+
+    def pp(self):
+        if self.script_args.debug:
+            return _pp
+        else:
+            return None
+
+
+def add_find_api_fn(api_name):
+    fn_name = camel_to_snake(api_name)
+
+    async def fn(self, **kwargs):
+        return await find_objects(self.client, self.elicit_api, api_name, self.pp(),
+                                  default_page_size=self.page_size(), **kwargs)
+
+    setattr(AsyncElicit, fn_name, fn)
+
+def add_iter_api_fn(api_name):
+    fn_name = 'iter_' + camel_to_snake(api_name)[len('find_'):]
+
+    def fn(self, **kwargs):
+        return iter_objects(self.client, self.elicit_api, api_name, self.pp(),
+                            default_page_size=self.page_size(), **kwargs)
+
+    setattr(AsyncElicit, fn_name, fn)
+
+def add_get_api_fn(api_name):
+    fn_name = camel_to_snake(api_name)
+
+    async def fn(self, **kwargs):
+        return await get_object(self.client, self.elicit_api, api_name, self.pp(), **kwargs)
+
+    setattr(AsyncElicit, fn_name, fn)
+
+def add_add_api_fn(api_name):
+    fn_name = camel_to_snake(api_name)
+
+    async def fn(self, **kwargs):
+        return await add_object(self.client, self.elicit_api, api_name, self.pp(), **kwargs)
+
+    setattr(AsyncElicit, fn_name, fn)
+
+for api_name in FIND_APIS:
+    add_find_api_fn(api_name)
+    add_iter_api_fn(api_name)
+
+for api_name in ADD_APIS:
+    add_add_api_fn(api_name)
+
+for api_name in GET_APIS:
+    add_get_api_fn(api_name)
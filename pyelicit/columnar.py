@@ -0,0 +1,145 @@
+"""
+Columnar (pandas / Arrow / Parquet) export of find_* results.
+
+Pages are decoded straight from JSON into typed columns, without building a pyswagger model per record.
+"""
+import json
+import pandas
+from http import HTTPStatus
+from pyswagger.utils import deref, final
+from .elicit import _pp, DEFAULT_PAGE_SIZE, iter_pages
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PANDAS_DTYPES = {
+    'integer': 'Int64',
+    'number': 'Float64',
+    'boolean': 'boolean',
+    'string': 'string',
+}
+
+DATETIME_FORMATS = ('date-time', 'date')
+
+# rows buffered into each Parquet row group
+ROW_GROUP_SIZE = 65536
+
+
+def record_columns(elicit_api, operation):
+    """
+    Return [(name, type, format)] for the records of a find operation's response, from the swagger definition.
+    Nested objects and arrays have type 'object'/'array' and are exported as JSON strings.
+    """
+    response = final(elicit_api.app.op[operation].responses.get(str(HTTPStatus.OK.value)))
+    schema = deref(response.schema) if response is not None and response.schema is not None else None
+    if schema is None or schema.type != 'array' or schema.items is None:
+        return []
+
+    columns = []
+    for name, property_schema in (deref(schema.items).properties or {}).items():
+        property_schema = deref(property_schema)
+        columns.append((name, property_schema.type, property_schema.format))
+    return columns
+
+
+def page_frame(records, columns):
+    """
+    Build a typed DataFrame for one page of raw records
+    """
+    if columns:
+        names = [name for name, _, _ in columns]
+        frame = pandas.DataFrame.from_records(records, columns=names)
+    else:
+        frame = pandas.DataFrame.from_records(records)
+        columns = [(name, None, None) for name in frame.columns]
+
+    for name, _type, _format in columns:
+        if _format in DATETIME_FORMATS:
+            frame[name] = pandas.to_datetime(frame[name], utc=True, errors='coerce')
+        elif _type in PANDAS_DTYPES:
+            frame[name] = frame[name].astype(PANDAS_DTYPES[_type])
+        elif _type in ('object', 'array') or frame[name].map(lambda v: isinstance(v, (dict, list))).any():
+            frame[name] = frame[name].map(lambda v: None if v is None else json.dumps(v)).astype('string')
+    return frame
+
+
+def to_dataframe(client, elicit_api, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE, page_sizer=None,
+                 **args):
+    """
+    Fetch every page of a find operation into one typed DataFrame; see iter_pages for page_sizer
+    """
+    columns = record_columns(elicit_api, operation)
+    pages = iter_pages(client, elicit_api, operation, pp, default_page_size, decode='dict', page_sizer=page_sizer,
+                       **args)
+    frames = [page_frame(page_data, columns) for page_data in pages]
+    if not frames:
+        return page_frame([], columns)
+    return pandas.concat(frames, ignore_index=True)
+
+
+def arrow_schema(columns):
+    types = {
+        'integer': pyarrow.int64(),
+        'number': pyarrow.float64(),
+        'boolean': pyarrow.bool_(),
+    }
+    fields = []
+    for name, _type, _format in columns:
+        if _format in DATETIME_FORMATS:
+            fields.append(pyarrow.field(name, pyarrow.timestamp('us', tz='UTC')))
+        else:
+            fields.append(pyarrow.field(name, types.get(_type, pyarrow.string())))
+    return pyarrow.schema(fields)
+
+
+def to_parquet(client, elicit_api, operation, path, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE, page_sizer=None,
+               row_group_size=ROW_GROUP_SIZE, **args):
+    """
+    Stream every page of a find operation into a Parquet file. Pages are buffered until they fill a row group of
+    about row_group_size rows, so memory stays bounded by the row group whatever the size of the study.
+    See iter_pages for page_sizer.
+    :return: the number of rows written
+    """
+    if pyarrow is None:
+        raise ImportError('Parquet export requires pyarrow; install pyelicit[arrow]')
+
+    columns = record_columns(elicit_api, operation)
+    schema = arrow_schema(columns) if columns else None
+    writer = None
+    buffered = []
+    buffered_rows = rows = 0
+
+    def write_row_group():
+        nonlocal writer
+        table = pyarrow.concat_tables(buffered)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(str(path), table.schema)
+        writer.write_table(table, row_group_size=table.num_rows)
+        buffered.clear()
+
+    try:
+        pages = iter_pages(client, elicit_api, operation, pp, default_page_size, decode='dict', page_sizer=page_sizer,
+                           **args)
+        for page_data in pages:
+            if not page_data:
+                continue
+            table = pyarrow.Table.from_pandas(page_frame(page_data, columns), schema=schema, preserve_index=False)
+            buffered.append(table)
+            rows += table.num_rows
+            buffered_rows += table.num_rows
+            if buffered_rows >= row_group_size:
+                write_row_group()
+                buffered_rows = 0
+        if buffered:
+            write_row_group()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None and schema is not None:
+        pyarrow.parquet.write_table(schema.empty_table(), str(path))
+
+    return rows
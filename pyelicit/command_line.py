@@ -9,18 +9,34 @@ from pathlib import Path
 
 pp = pprint.PrettyPrinter(indent=4)
 
-# grab the address using socket.getaddrinfo
-answers = socket.getaddrinfo('elicit-experiment.com', 443)
-ip4_answers = list(filter(lambda x: x[0] == socket.AF_INET, answers))
+def prod_ip_url():
+    # grab the address using socket.getaddrinfo
+    answers = socket.getaddrinfo('elicit-experiment.com', 443)
+    ip4_answers = list(filter(lambda x: x[0] == socket.AF_INET, answers))
 
-(family, type, proto, canon_name, (prod_ip_address, port)) = ip4_answers[0]
+    (family, socket_type, proto, canon_name, (prod_ip_address, port)) = ip4_answers[0]
+    return "https://%s"%(str(prod_ip_address))
 
-ENVIRONMENTS = {
+
+class Environments(dict):
+    """
+    Environment name to API URL. URLs given as functions (e.g. prod_ip, which needs a DNS lookup) are only
+    resolved, once, when that environment is actually looked up.
+    """
+    def __getitem__(self, key):
+        url = super().__getitem__(key)
+        if callable(url):
+            url = url()
+            self[key] = url
+        return url
+
+
+ENVIRONMENTS = Environments({
     'local': 'http://localhost:3000',
     'local_docker': 'http://elicit.docker.local',
     'prod': "https://elicit-experiment.com",
-    'prod_ip': "https://%s"%(str(prod_ip_address))
-}
+    'prod_ip': prod_ip_url
+})
 parser = None
 
 def init_parser(custom_defaults={}):
@@ -31,7 +47,16 @@ def init_parser(custom_defaults={}):
     :rtype: argparse.ArgumentParser
     """
     global parser
-    parser = argparse.ArgumentParser(prog='elicit')
+    parser = build_parser(custom_defaults)
+    return parser
+
+
+def build_parser(custom_defaults={}, prog='elicit'):
+    """
+    Build a parser for the common Elicit arguments without making it the module's parser, for tools that add their
+    own arguments (e.g. elicit-export).
+    """
+    parser = argparse.ArgumentParser(prog=prog)
     parser.add_argument('--env', choices=ENVIRONMENTS.keys(), default=custom_defaults.get('env') or None,
                         help='Service environment to communicate with')
     parser.add_argument('--env_file', default=custom_defaults.get('env_file') or None,
@@ -39,6 +64,57 @@ def init_parser(custom_defaults={}):
     parser.add_argument('--api_url', type=str, default=custom_defaults.get('api_url') or None)
     parser.add_argument('--ignore_https', action='store_true', default=custom_defaults.get('ignore_https') or False)
     parser.add_argument('--debug', action='store_true', default=custom_defaults.get('debug') or False)
+    parser.add_argument('--offline', action='store_true', default=custom_defaults.get('offline') or False,
+                        help='Use the cached swagger definition without contacting the server')
+    parser.add_argument('--spec_cache_dir', type=str, default=custom_defaults.get('spec_cache_dir') or None,
+                        help='Directory caching the swagger definition')
+    parser.add_argument('--spec_max_age', type=int, default=custom_defaults.get('spec_max_age') or 0,
+                        help='Seconds to trust the cached swagger definition without revalidating it')
+    parser.add_argument('--page_size', type=int, default=custom_defaults.get('page_size') or None,
+                        help='Page size for find requests that do not specify one (default: adapted to the server)')
+    parser.add_argument('--max_page_size', type=int, default=custom_defaults.get('max_page_size') or None,
+                        help='Largest adapted page size when the server declares no limit')
+    parser.add_argument('--page_latency_target', type=float,
+                        default=custom_defaults.get('page_latency_target') or None,
+                        help='Seconds a page may take before the adapted page size shrinks')
+    parser.add_argument('--concurrency', type=int, default=custom_defaults.get('concurrency') or None,
+                        help='Number of requests in flight at once (default: 1 for Elicit, 10 for AsyncElicit)')
+    parser.add_argument('--rate_limit', type=float, default=custom_defaults.get('rate_limit') or None,
+                        help='Requests started per second at most, shared fairly between concurrent jobs')
+    parser.add_argument('--rate_burst', type=int, default=custom_defaults.get('rate_burst') or None,
+                        help='Requests that may start at once under --rate_limit')
+    parser.add_argument('--max_in_flight', type=int, default=custom_defaults.get('max_in_flight') or None,
+                        help='Requests in flight at once')
+    parser.add_argument('--pool_size', type=int, default=custom_defaults.get('pool_size') or None,
+                        help='Keep-alive connections pooled per host')
+    parser.add_argument('--max_retries', type=int, default=custom_defaults.get('max_retries') or None,
+                        help='Retries of idempotent requests on connection errors and 502/503/504 responses')
+    parser.add_argument('--backoff_factor', type=float, default=custom_defaults.get('backoff_factor') or None,
+                        help='Base of the exponential backoff between retries, in seconds')
+    parser.add_argument('--token_cache_dir', type=str, default=custom_defaults.get('token_cache_dir') or None,
+                        help='Directory sharing OAuth tokens between processes')
+    parser.add_argument('--decode', choices=['dict', 'tuple', 'record'], default=custom_defaults.get('decode') or None,
+                        help='Decode find/get results straight from JSON instead of building pyswagger models')
+    parser.add_argument('--validate_sample', type=float, default=custom_defaults.get('validate_sample') or None,
+                        help='Fraction of decoded responses still validated against the swagger schema')
+    parser.add_argument('--timeout', type=float, default=custom_defaults.get('timeout') or None,
+                        help='Per-request timeout in seconds')
+    parser.add_argument('--cache_ttl', type=float, default=custom_defaults.get('cache_ttl'),
+                        help='Cache find_*/get_* responses for this many seconds (default: no caching)')
+    parser.add_argument('--cache_dir', type=str, default=custom_defaults.get('cache_dir') or None,
+                        help='Directory of the on-disk response cache (default: in memory)')
+    parser.add_argument('--cache_size', type=int, default=custom_defaults.get('cache_size') or None,
+                        help='Cached responses kept before the least recently used are evicted')
+    parser.add_argument('--metrics_file', type=str, default=custom_defaults.get('metrics_file') or None,
+                        help='Append per-request metrics as JSON lines to this file')
+    parser.add_argument('--metrics_prometheus', type=str, default=custom_defaults.get('metrics_prometheus') or None,
+                        help='Write request metrics in Prometheus text format to this file on close')
+    parser.add_argument('--participant_index', type=str, default=custom_defaults.get('participant_index') or None,
+                        help='JSON file keeping the index of users available as participants between sessions')
+    parser.add_argument('--mirror_dir', type=str, default=custom_defaults.get('mirror_dir') or None,
+                        help='Directory of the local study mirror that find requests are served from while fresh')
+    parser.add_argument('--mirror_max_age', type=float, default=custom_defaults.get('mirror_max_age') or None,
+                        help='Seconds a mirrored listing is served for')
 
     parser.add_argument('--role', type=str, default=custom_defaults.get('role') or 'admin')
     parser.add_argument('--user', type=str, default=custom_defaults.get('user') or None)
@@ -157,6 +233,8 @@ def add_command_line_args_default(initial_args, custom_defaults={}):
         effective_configuration['ignore_https'] = True
 
     effective_configuration['send_opt'] = dict(verify=(not effective_configuration.get('ignore_https')))
+    if effective_configuration.get('timeout') is not None:
+        effective_configuration['send_opt']['timeout'] = effective_configuration['timeout']
 
     
     return effective_configuration
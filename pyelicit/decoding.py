@@ -0,0 +1,198 @@
+import collections
+import json
+import random
+import threading
+import weakref
+from http import HTTPStatus
+from pyswagger.utils import deref, final
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+DECODE_MODES = ('dict', 'tuple', 'record')
+
+_types = {}
+_types_lock = threading.Lock()
+# App -> {(operation, mode): decoder of its response body}
+_response_decoders = weakref.WeakKeyDictionary()
+
+
+def record_type(name, fields):
+    """
+    Return a lightweight class with __slots__ for the given fields, created once per (name, fields).
+    Instances support attribute access (record.id), _asdict() and equality.
+    """
+    key = ('record', name, fields)
+    with _types_lock:
+        cls = _types.get(key)
+        if cls is None:
+            cls = _types[key] = _make_record_type(name, fields)
+        return cls
+
+
+def tuple_type(name, fields):
+    """
+    Return a namedtuple class for the given fields, created once per (name, fields)
+    """
+    key = ('tuple', name, fields)
+    with _types_lock:
+        cls = _types.get(key)
+        if cls is None:
+            cls = _types[key] = collections.namedtuple(name, fields, rename=True)
+        return cls
+
+
+def _make_record_type(name, fields):
+    def __init__(self, *values):
+        for field, value in zip(fields, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return '%s(%s)' % (name, ', '.join('%s=%r' % (field, getattr(self, field)) for field in fields))
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, f) == getattr(other, f) for f in fields)
+
+    def _asdict(self):
+        return {field: getattr(self, field) for field in fields}
+
+    return type(name, (object,), dict(__slots__=fields, __init__=__init__, __repr__=__repr__, __eq__=__eq__,
+                                      __hash__=None, _asdict=_asdict, _fields=fields))
+
+
+def decode(raw, mode, name='Record', decoder=None):
+    """
+    Decode a raw JSON response body into dicts, namedtuples or __slots__ records (a list for array bodies).
+    With a decoder from response_decoder, the classes are the ones generated from the response schema; otherwise
+    there is one class per set of fields found in the body, named name.
+    """
+    return decode_data(json_loads(raw) if raw else None, mode, name, decoder)
+
+
+def decode_data(data, mode, name='Record', decoder=None):
+    """
+    Convert data already decoded from JSON (a dict, or a list of them) like decode
+    """
+    if mode == 'dict' or data is None:
+        return data
+    if mode not in DECODE_MODES:
+        raise ValueError('Unknown decode mode %r; expected one of %s' % (mode, DECODE_MODES))
+    if decoder is not None:
+        return decoder(data)
+
+    make_type = tuple_type if mode == 'tuple' else record_type
+    if isinstance(data, dict):
+        return make_type(name, tuple(data))(*data.values())
+
+    decoded = []
+    cls, fields = None, None
+    for item in data:
+        if not isinstance(item, dict):
+            decoded.append(item)
+            continue
+        item_fields = tuple(item)
+        if item_fields != fields:
+            fields = item_fields
+            cls = make_type(name, fields)
+        decoded.append(cls(*item.values()))
+    return decoded
+
+
+def schema_decoder(schema, mode, name, memo=None):
+    """
+    Converter of the JSON values matching a pyswagger schema: objects with properties become instances of a record
+    ('record') or namedtuple ('tuple') class with a field per property, named after their definition (else name),
+    and so do the objects nested in them. None when the schema has no such object, so values are kept as they are.
+
+    Objects with fields their definition doesn't declare get a class of their own fields, as decode would give them.
+    """
+    memo = {} if memo is None else memo
+    definition = final(schema)
+    if getattr(definition, '$ref', None) is not None:
+        schema = deref(definition)
+        name = schema.name or name
+    else:
+        schema = definition
+    if id(schema) in memo:
+        return memo[id(schema)]
+
+    if schema.type == 'array' and schema.items is not None:
+        convert_item = schema_decoder(schema.items, mode, name, memo)
+        if convert_item is None:
+            return None
+        return lambda value: [convert_item(item) for item in value] if isinstance(value, list) else value
+
+    properties = schema.properties or {}
+    if not properties:
+        return None
+    fields = tuple(properties)
+    field_set = frozenset(fields)
+    cls = (tuple_type if mode == 'tuple' else record_type)(name, fields)
+    nested = []
+
+    def convert(value):
+        if not isinstance(value, dict):
+            return value
+        if not value.keys() <= field_set:
+            return decode_data(value, mode, name)
+        values = list(map(value.get, fields))
+        for index, convert_field in nested:
+            if values[index] is not None:
+                values[index] = convert_field(values[index])
+        return cls(*values)
+
+    # set before the properties are visited, for definitions that refer to themselves
+    memo[id(schema)] = convert
+    for index, (field, property_schema) in enumerate(properties.items()):
+        convert_field = schema_decoder(property_schema, mode, name + field.title().replace('_', ''), memo)
+        if convert_field is not None:
+            nested.append((index, convert_field))
+    return convert
+
+
+def response_decoder(elicit_api, operation, mode, name='Record'):
+    """
+    schema_decoder of operation's success response, generated once per App; None for 'dict' mode, or without a
+    swagger definition to go by
+    """
+    app = getattr(elicit_api, 'app', None)
+    if app is None or mode not in ('tuple', 'record'):
+        return None
+    with _types_lock:
+        decoders = _response_decoders.setdefault(app, {})
+        if (operation, mode) in decoders:
+            return decoders[(operation, mode)]
+
+    op = app.op[operation]
+    response = final(op.responses.get(str(HTTPStatus.OK.value)) or op.responses.get(str(HTTPStatus.CREATED.value)))
+    decoder = None
+    if response is not None and response.schema is not None:
+        decoder = schema_decoder(response.schema, mode, name)
+    with _types_lock:
+        return decoders.setdefault((operation, mode), decoder)
+
+
+def sample_validate(elicit_api, operation, raw, rate):
+    """
+    With probability `rate`, run the full pyswagger validation of a raw response body against the operation's
+    success schema; raises if it doesn't conform.
+    """
+    if not rate or random.random() >= rate:
+        return False
+
+    to_models(elicit_api, operation, json.loads(raw))
+    return True
+
+
+def to_models(elicit_api, operation, data):
+    """
+    pyswagger models for data decoded from a response body of operation, validated as resp.data would be
+    """
+    op = elicit_api.app.op[operation]
+    response = final(op.responses.get(str(HTTPStatus.OK.value)) or op.responses.get(str(HTTPStatus.CREATED.value)))
+    if response is None or response.schema is None:
+        return data
+    return response.schema._prim_(data, op._prim_factory, ctx=dict(read=True))
@@ -0,0 +1,316 @@
+"""
+Parallel, resumable download of the files find_time_series records point to.
+
+Files are streamed to disk in chunks. When the server supports HTTP Range, large files are split into segments that
+are fetched concurrently and written in place, and the finished segments are recorded so that an interrupted
+download resumes with the missing ones. Completed files are verified against a SHA-256 given with the job, a
+`Digest: sha-256=` header or an MD5 ETag before they are moved into place.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+from .elicit import BulkResult, record_field
+
+CHUNK_SIZE = 1024 * 1024
+SEGMENT_SIZE = 8 * 1024 * 1024
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class DownloadJob:
+    """
+    One file to download: url, destination path and optionally its expected SHA-256 (hex). Set etag_is_md5 when the
+    server's ETags are known to be the MD5 of the body, to check against them; S3 multipart uploads, CDNs and Rails
+    also issue 32-hex ETags that are not.
+    """
+    def __init__(self, url, path, sha256=None, etag_is_md5=False):
+        self.url = url
+        self.path = Path(path)
+        self.sha256 = sha256
+        self.etag_is_md5 = etag_is_md5
+
+    def __repr__(self):
+        return "DownloadJob(%s -> %s)" % (self.url, self.path)
+
+
+def time_series_jobs(time_series, output_dir, base_url):
+    """
+    A DownloadJob per time series record (model, dict or decoded record) that has a file, saved as
+    <output_dir>/<id>_<file name>
+    """
+    jobs = []
+    for record in time_series:
+        url = record_field(record_field(record, 'file') or {}, 'url')
+        if not url:
+            continue
+        name = '%s_%s' % (record_field(record, 'id'), os.path.basename(urlparse(url).path))
+        jobs.append(DownloadJob(urljoin(base_url, url), Path(output_dir) / name))
+    return jobs
+
+
+class FileDownload:
+    """
+    State of one file being downloaded in segments into <path>.part, with the finished segments in <path>.part.json
+    """
+    def __init__(self, job, size, headers, segment_size):
+        self.job = job
+        self.size = size
+        self.headers = headers
+        self.etag = headers.get('ETag')
+        self.part_path = job.path.with_name(job.path.name + '.part')
+        self.state_path = job.path.with_name(job.path.name + '.part.json')
+        self.segments = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+        self.lock = threading.Lock()
+        self.done = set()
+
+        state = self.load_state()
+        if state is not None and state.get('size') == size and state.get('etag') == self.etag and self.part_path.is_file():
+            self.done = set(state.get('done', []))
+        else:
+            with open(self.part_path, 'wb') as part:
+                part.truncate(size)
+
+    def load_state(self):
+        try:
+            return json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def pending(self):
+        return [index for index in range(len(self.segments)) if index not in self.done]
+
+    def segment_done(self, index):
+        """
+        Record a finished segment; True when it was the last one
+        """
+        with self.lock:
+            self.done.add(index)
+            temporary_path = self.state_path.with_suffix('.tmp')
+            temporary_path.write_text(json.dumps(dict(size=self.size, etag=self.etag, done=sorted(self.done))))
+            os.replace(temporary_path, self.state_path)
+            return len(self.done) == len(self.segments)
+
+
+class DownloadManager:
+    """
+    Download files over a requests session on a bounded pool of threads.
+
+    Requests to the API host carry the current auth header (refreshed as it nears expiry); other hosts, such as
+    pre-signed storage URLs, get none.
+    """
+    def __init__(self, session, api_url, auth_header=None, max_workers=4, segment_size=SEGMENT_SIZE,
+                 chunk_size=CHUNK_SIZE, timeout=None):
+        """
+        Initialize
+        :param session: requests.Session, e.g. elicit.client.session, to reuse its connection pool
+        :param api_url: Base URL of the API; relative file URLs are resolved against it
+        :param auth_header: Function returning the Authorization header for requests to the API host
+        :param max_workers: Maximum number of segments and files downloaded at once
+        :param segment_size: Size of the ranges a file is split into when the server supports Range
+        :param chunk_size: Size of the chunks bodies are streamed to disk in
+        :param timeout: requests timeout
+        :return: returns nothing
+        """
+        self.session = session
+        self.api_url = api_url
+        self.api_host = urlparse(api_url).netloc
+        self.auth_header = auth_header
+        self.max_workers = max_workers
+        self.segment_size = segment_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def headers(self, url, **extra):
+        headers = dict(extra)
+        if urlparse(url).netloc == self.api_host:
+            if self.auth_header is not None:
+                headers['Authorization'] = self.auth_header()
+        else:
+            # never send the session's token to other hosts
+            headers['Authorization'] = None
+        return headers
+
+    def get(self, url, **headers):
+        response = self.session.get(url, headers=self.headers(url, **headers), stream=True, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def download(self, jobs):
+        """
+        Download every job, skipping files that already exist
+        :return: BulkResult with the path of each file in job order, and the failures
+        """
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        failures = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # probe every file, downloading the ones that can't or needn't be split outright
+            probes = {executor.submit(self.probe, job): index for index, job in enumerate(jobs)}
+            segments = {}
+            for future in as_completed(probes):
+                index = probes[future]
+                try:
+                    download = future.result()
+                except Exception as e:
+                    failures.append((index, jobs[index], e))
+                    continue
+                if download is None:
+                    results[index] = jobs[index].path
+                    continue
+                if not download.pending():
+                    segments[executor.submit(self.finish, download)] = (index, None)
+                for segment in download.pending():
+                    segments[executor.submit(self.fetch_segment, download, segment)] = (index, segment)
+
+            failed = set()
+            for future in as_completed(segments):
+                index, _ = segments[future]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    if index not in failed:
+                        failed.add(index)
+                        failures.append((index, jobs[index], e))
+                    continue
+                if path is not None and index not in failed:
+                    results[index] = path
+
+        failures.sort(key=lambda failure: failure[0])
+        return BulkResult(results, failures)
+
+    def probe(self, job):
+        """
+        Find the file's size and Range support with a one-byte ranged GET. Returns a FileDownload to fetch in
+        segments, or None once the file has been downloaded in one stream (or already existed).
+        """
+        if job.path.is_file():
+            return None
+        job.path.parent.mkdir(parents=True, exist_ok=True)
+
+        response = self.get(job.url, Range='bytes=0-0')
+        content_range = re.match(r'bytes \d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+        if response.status_code != 206 or content_range is None:
+            # no Range support: this response is the whole file
+            self.stream_whole(job, response)
+            return None
+
+        response.close()
+        return FileDownload(job, int(content_range.group(1)), response.headers, self.segment_size)
+
+    def stream_whole(self, job, response):
+        part_path = job.path.with_name(job.path.name + '.part')
+        with response, open(part_path, 'wb') as part:
+            for chunk in response.iter_content(self.chunk_size):
+                part.write(chunk)
+        self.verify(job, part_path, response.headers)
+        os.replace(part_path, job.path)
+
+    def fetch_segment(self, download, index):
+        start, end = download.segments[index]
+        response = self.get(download.job.url, Range='bytes=%d-%d' % (start, end))
+        if response.status_code != 206:
+            raise IOError('%s ignored the Range header for bytes %d-%d' % (download.job.url, start, end))
+        with response, open(download.part_path, 'r+b') as part:
+            part.seek(start)
+            for chunk in response.iter_content(self.chunk_size):
+                part.write(chunk)
+            if part.tell() != end + 1:
+                raise IOError('Short segment %d-%d of %s' % (start, end, download.job.url))
+        if download.segment_done(index):
+            return self.finish(download)
+        return None
+
+    def finish(self, download):
+        self.verify(download.job, download.part_path, download.headers)
+        os.replace(download.part_path, download.job.path)
+        download.state_path.unlink()
+        return download.job.path
+
+    def verify(self, job, path, headers):
+        """
+        Check the file against the job's SHA-256, else a Digest header, else its ETag when the job says that is an
+        MD5; files without any are accepted as they are
+        """
+        expected = None
+        if job.sha256:
+            algorithm, expected = 'sha256', job.sha256.lower()
+        else:
+            digest = re.search(r'sha-256=([A-Za-z0-9+/=]+)', headers.get('Digest') or '')
+            etag = (headers.get('ETag') or '').strip('"')
+            if digest:
+                algorithm, expected = 'sha256', base64.b64decode(digest.group(1)).hex()
+            elif job.etag_is_md5 and re.fullmatch(r'[0-9a-f]{32}', etag):
+                algorithm, expected = 'md5', etag
+        if expected is None:
+            return
+
+        checksum = hashlib.new(algorithm)
+        with open(path, 'rb') as downloaded:
+            for chunk in iter(lambda: downloaded.read(self.chunk_size), b''):
+                checksum.update(chunk)
+        if checksum.hexdigest() != expected:
+            path.unlink()
+            raise ChecksumError('%s checksum of %s is %s, expected %s' % (algorithm, job.url, checksum.hexdigest(),
+                                                                        expected))
+
+
+def load_time_series(path, dtype='float64', delimiter='\t', skip_header=1, mmap_path=None, rows_per_chunk=65536):
+    """
+    Decode a delimited time series file into a 2D NumPy array, parsing it in chunks. With mmap_path the array is a
+    memory-mapped .npy file, so files larger than memory can be converted and then read lazily; non-numeric fields
+    become NaN.
+    """
+    import numpy
+
+    path = Path(path)
+    with open(path, 'rb') as source:
+        for _ in range(skip_header):
+            source.readline()
+        rows = 0
+        columns = None
+        for line in source:
+            if line.strip():
+                rows += 1
+                if columns is None:
+                    columns = len(line.split(delimiter.encode('utf-8')))
+
+    shape = (rows, columns or 0)
+    if mmap_path is not None:
+        array = numpy.lib.format.open_memmap(str(mmap_path), mode='w+', dtype=dtype, shape=shape)
+    else:
+        array = numpy.empty(shape, dtype=dtype)
+
+    def parse(field):
+        try:
+            return float(field)
+        except ValueError:
+            return float('nan')
+
+    with open(path, 'r') as source:
+        for _ in range(skip_header):
+            source.readline()
+        row = 0
+        chunk = []
+        for line in source:
+            if not line.strip():
+                continue
+            chunk.append([parse(field) for field in line.rstrip('\r\n').split(delimiter)])
+            if len(chunk) == rows_per_chunk:
+                array[row:row + len(chunk)] = chunk
+                row += len(chunk)
+                chunk = []
+        if chunk:
+            array[row:row + len(chunk)] = chunk
+
+    if mmap_path is not None:
+        array.flush()
+    return array
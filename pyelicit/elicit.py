@@ -1,12 +1,17 @@
 import types
 from http import HTTPStatus
 from . import api
+from . import decoding
+from . import prepared
+from . import pagination
 import pprint
 import re
-import json
 import random
 import string
+import time
+import contextvars
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 
 def proxy_print(fmt, **args):
     print(fmt, **args)
@@ -14,6 +19,9 @@ def proxy_print(fmt, **args):
 pp = _pp = pprint.PrettyPrinter(indent=4)
 setattr(pp, 'print', proxy_print)
 
+DEFAULT_PAGE_SIZE = 3
+USER_PAGE_SIZE = 100
+
 def search(d, key, default=None):
     """Return a dict containing to the specified key in the (possibly
     nested) within dictionary d. If there is no item with that key, return
@@ -64,9 +72,67 @@ def assert_role(client, elicit, role = 'admin', debug = False):
 
     return user
 
-def add_users_to_protocol(client, elicit, new_study, new_protocol_definition, study_participants, group_name_map=None):
-    protocol_users = []
-    for user in study_participants:
+class BulkResult:
+    """
+    Outcome of a bulk operation: `results` holds one entry per input item, in input order (None where the item
+    failed), and `failures` lists (index, item, exception) for every item that failed.
+    """
+    def __init__(self, results, failures):
+        self.results = results
+        self.failures = failures
+
+    def succeeded(self):
+        return [result for result in self.results if result is not None]
+
+    def raise_for_failures(self):
+        if self.failures:
+            raise BulkError(self)
+        return self.results
+
+    def __repr__(self):
+        return "BulkResult(%d succeeded, %d failed)" % (len(self.results) - len(self.failures), len(self.failures))
+
+
+class BulkError(Exception):
+    def __init__(self, result):
+        index, item, error = result.failures[0]
+        super().__init__("%d of %d items failed; first failure (item %d): %r" %
+                         (len(result.failures), len(result.results), index, error))
+        self.result = result
+
+
+def in_caller_context(fn):
+    """
+    fn, run on pool threads in a copy of the caller's context, so its requests keep the caller's scheduler job
+    """
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(fn, *args)
+
+
+def run_bulk(fn, items, max_workers=1):
+    """
+    Apply fn to every item on a bounded thread pool, collecting results in order and failures instead of raising.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    failures = []
+
+    def run(index):
+        try:
+            results[index] = fn(items[index])
+        except Exception as e:
+            failures.append((index, items[index], e))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        list(executor.map(in_caller_context(run), range(len(items))))
+
+    failures.sort(key=lambda failure: failure[0])
+    return BulkResult(results, failures)
+
+
+def bulk_add_protocol_users(client, elicit, new_study, new_protocol_definition, study_participants,
+                            group_name_map=None, max_workers=1):
+    def add_protocol_user(user):
         group_name = group_name_map[user.username] if group_name_map else None
         protocol_user = dict(protocol_user=dict(user_id=user.id,
                                                 study_definition_id=new_study.id,
@@ -78,8 +144,35 @@ def add_users_to_protocol(client, elicit, new_study, new_protocol_definition, st
             protocol_definition_id=new_protocol_definition.id))
 
         assert resp.status == HTTPStatus.CREATED
-        protocol_users.append(resp.data)
-    return protocol_users
+        return resp.data
+
+    return run_bulk(add_protocol_user, study_participants, max_workers)
+
+
+def add_users_to_protocol(client, elicit, new_study, new_protocol_definition, study_participants, group_name_map=None,
+                          max_workers=1):
+    return bulk_add_protocol_users(client, elicit, new_study, new_protocol_definition, study_participants,
+                                   group_name_map, max_workers).raise_for_failures()
+
+
+def bulk_add_users(client, elicit, users_details, max_workers=1):
+    def add_user(user_details):
+        resp = client.request(elicit['addUser'](user=dict(user=user_details)))
+        assert resp.status == HTTPStatus.CREATED
+        return resp.data
+
+    return run_bulk(add_user, users_details, max_workers)
+
+
+def random_user_details(role):
+    username = ''.join([random.choice(string.ascii_letters + string.digits) for n in range(16)])
+    password = 'password'
+    return dict(username=username,
+                password=password,
+                email=username + "@elicit.com",
+                role=role,
+                anonymous=(role == 'anonymous_user'),
+                password_confirmation=password)
 
 
 def find_or_create_user(client, elicit, username, password, email=None, role=None, debug=False):
@@ -100,12 +193,27 @@ def find_or_create_user(client, elicit, username, password, email=None, role=Non
         return resp.data
 
 
+def encode_definition_data(args):
+    """
+    A copy of args with a dict definition_data encoded to JSON; the caller's dicts are left as they are
+    """
+    return prepared.encode_definition_data(args)
+
+
 def add_object(client, elicit, operation, pp = _pp, **args):
-    definition_data_parent = search(args, 'definition_data')
-    if definition_data_parent:
-        if isinstance(definition_data_parent['definition_data'], dict):
-            definition_data_parent['definition_data'] = json.dumps(definition_data_parent['definition_data'])
-    resp = client.request(elicit[operation](**args))
+    resp = client.request(elicit[operation](**encode_definition_data(args)))
+    return created(resp, operation, pp)
+
+
+def add_prepared(client, elicit, payload, pp = _pp, values=None, **args):
+    """
+    Send a prepared.PreparedPayload with values stamped into its slots and args for its other parameters
+    """
+    resp = client.request(payload.request(values, **elicit.bind_auth(args)))
+    return created(resp, payload.operation, pp)
+
+
+def created(resp, operation, pp):
     assert resp.status == HTTPStatus.CREATED
     if resp.status != HTTPStatus.CREATED:
         return None
@@ -118,49 +226,105 @@ def add_object(client, elicit, operation, pp = _pp, **args):
     return created_object
 
 
-def find_objects(client, elicit, operation, pp = _pp, **args):
+def fetch(client, elicit, operation, args, decode=None, validate_sample=0.0, expected=HTTPStatus.OK):
+    """
+    Make one request, returning the response and its data.
+
+    By default the data is pyswagger's validated model. With decode ('dict', 'tuple' or 'record') the body is
+    decoded straight from JSON instead, and only a `validate_sample` fraction of responses is validated. Tuples and
+    records are of the classes generated from the swagger definitions, e.g. a DataPoint record for findDataPoints.
+    """
+    req_and_resp = elicit[operation](**args)
+    if decode:
+        req_and_resp[1].raw_body_only = True
+    resp = client.request(req_and_resp)
+    assert resp.status == expected
+
+    if not decode:
+        return resp, resp.data
+
+    decoding.sample_validate(elicit, operation, resp.raw, validate_sample)
+    name = record_name(operation)
+    return resp, decoding.decode(resp.raw, decode, name, decoding.response_decoder(elicit, operation, decode, name))
+
+
+def record_field(record, name):
+    return record.get(name) if isinstance(record, dict) else getattr(record, name, None)
+
+
+def record_name(operation):
+    return operation[0].upper() + operation[1:] + 'Record'
+
+
+def find_objects(client, elicit, operation, pp = _pp, concurrency=1, default_page_size=DEFAULT_PAGE_SIZE,
+                 decode=None, validate_sample=0.0, page_sizer=None, **args):
+    """
+    Collect every page of a paginated find operation.
+
+    Once the first page's Link header reveals the last page, the remaining pages are fetched by up to
+    `concurrency` threads; results are returned in page order either way. See fetch for decode/validate_sample.
+    Without a page_size argument, a pagination.PageSizer (if given) picks the page size and adapts it as pages arrive.
+    """
     next_link = True
     last_page = ""
     found_objects = []
     page = 0
     pagination_aware = 'page' in args
+    adaptive = page_sizer is not None and not pagination_aware and not args.get('page_size')
+    page_size = page_sizer.page_size(operation) if adaptive else args.get('page_size') or default_page_size
+    # records before the next page; page numbers follow from it when the page size changes
+    offset = 0
     while next_link:
-        page += 1
+        page = offset // page_size + 1
 
         if not pagination_aware:
-            page_size = args['page_size'] if 'page_size' in args else 3
             args = dict(args, page=page, page_size=page_size)
 
-        resp = client.request(elicit[operation](**args))
-
-        assert resp.status == HTTPStatus.OK
-        if resp.status != HTTPStatus.OK:
-            return None
+        start = time.perf_counter()
+        resp, page_data = fetch(client, elicit, operation, args, decode, validate_sample)
+        latency = time.perf_counter() - start
 
         next_link = False
-        result_len = len(resp.data)
-        if result_len > 0:
-            link_header = resp.header['Link'] if 'Link' in resp.header else []
+        if len(page_data) > 0:
             if not pagination_aware:
-                if list(filter(None, link_header)):
-                    last_page_link, next_page_link = parse_pagination_links(link_header)
-
-                    if len(last_page_link) == 1:
-                        last_page = re.search(r'.*page=(\d+).*', last_page_link[0]['href']).group(1)
-                        if pp is not None:
-                            pp.print("last_page (%s)" % last_page)
-
-                    if len(next_page_link) == 1:
-                        next_link = bool(next_page_link[0]['href'])
-                        if pp is not None:
-                            pp.pprint("found next page link (%s)"%next_page_link[0]['href'])
-                elif result_len >= page_size:
-                    #  no header, but full page. N+1 risk
-                    if pp is not None:
-                        pp.print("Full page: %d/%d; getting next page" % (result_len, page_size))
-                    next_link = True
-
-            found_objects += resp.data
+                next_link, page_last_page = page_links(resp, page_size, pp, len(page_data), page)
+                last_page = page_last_page or last_page
+
+            found_objects += page_data
+
+        offset += page_size
+        if adaptive and next_link:
+            if len(page_data) < page_size:
+                # the server caps the page size, and numbers its pages by the capped size
+                page_sizer.set_limit(operation, len(page_data))
+                if page > 1:
+                    found_objects, offset = [], 0
+                else:
+                    offset = len(page_data)
+                page_size = len(page_data)
+                if pp is not None:
+                    pp.print("%s pages are capped at %d records" % (operation, page_size))
+                continue
+
+            new_page_size = page_sizer.observe(operation, page_size, latency)
+            if new_page_size != page_size and offset % new_page_size == 0 and \
+                    (new_page_size < page_size or page_sizer.can_grow(operation)):
+                if pp is not None:
+                    pp.print("Page size %d -> %d (%.3fs a page)" % (page_size, new_page_size, latency))
+                page_size = new_page_size
+                # the last page depends on the page size; the next page's links tell the new one
+                last_page = ""
+                continue
+
+        if next_link and last_page and concurrency > 1:
+            remaining_pages = range(page + 1, int(last_page) + 1)
+            if pp is not None:
+                pp.print("Fetching pages %d-%s with %d threads" % (page + 1, last_page, concurrency))
+            for page_data in fetch_pages(client, elicit, operation, args, remaining_pages, concurrency,
+                                         decode, validate_sample):
+                found_objects += page_data
+            page = int(last_page)
+            next_link = False
 
     if pp is not None:
         pp.print("\n\nFound objects with %s(%s) in %d/%s pages:\n" % (operation, args, int(page), last_page))
@@ -168,13 +332,118 @@ def find_objects(client, elicit, operation, pp = _pp, **args):
 
     return found_objects
 
-def get_object(client, elicit, operation, pp = _pp, **args):
-    resp = client.request(elicit[operation](**args))
-    assert resp.status == HTTPStatus.OK
-    if resp.status != HTTPStatus.OK:
-        return (None)
 
-    found_object = resp.data
+def iter_objects(client, elicit, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE,
+                 decode=None, validate_sample=0.0, page_sizer=None, **args):
+    """
+    Generator counterpart of find_objects: yield the records page by page, fetching the next page in the
+    background while the caller works through the current one.
+    """
+    for page_data in iter_pages(client, elicit, operation, pp, default_page_size, decode, validate_sample,
+                                page_sizer, **args):
+        yield from page_data
+
+
+def iter_pages(client, elicit, operation, pp = _pp, default_page_size=DEFAULT_PAGE_SIZE,
+               decode=None, validate_sample=0.0, page_sizer=None, **args):
+    """
+    Yield each page of a find operation as a list, prefetching the next page in the background.
+    See fetch for decode/validate_sample. Without a page_size argument, a pagination.PageSizer (if given) picks the
+    page size, which stays the same for the whole listing.
+    """
+    pagination_aware = 'page' in args
+    adaptive = page_sizer is not None and not pagination_aware and not args.get('page_size')
+    page_size = page_sizer.page_size(operation) if adaptive else args.get('page_size') or default_page_size
+    page = 1
+
+    @in_caller_context
+    def fetch_page(page):
+        page_args = args if pagination_aware else dict(args, page=page, page_size=page_size)
+        return fetch(client, elicit, operation, page_args, decode, validate_sample)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(fetch_page, page)
+        while pending is not None:
+            resp, page_data = pending.result()
+            pending = None
+            if len(page_data) > 0 and not pagination_aware:
+                next_link, _ = page_links(resp, page_size, pp, len(page_data), page)
+                if adaptive and next_link and page == 1 and len(page_data) < page_size:
+                    # the server caps the page size; later listings start at its cap
+                    page_sizer.set_limit(operation, len(page_data))
+                if next_link:
+                    page += 1
+                    pending = executor.submit(fetch_page, page)
+
+            if pp is not None:
+                pp.print("Streaming %d objects from %s page %d" % (len(page_data), operation, page))
+            yield page_data
+
+
+def header_value(resp, name):
+    """First value of a response header, whatever the case of its name; None without one"""
+    for key, values in resp.header.items():
+        if key.lower() == name.lower():
+            return values[0] if isinstance(values, list) else values
+    return None
+
+
+def page_links(resp, page_size, pp = _pp, result_len=None, page=None):
+    """
+    Work out from a page's Link header (or, without one, from the Total header given the page number, or else from
+    whether the page is full) if another page follows.
+    :return: (has_next_page, last_page), last_page being '' when the server doesn't say
+    """
+    if result_len is None:
+        result_len = len(resp.data)
+    next_link = False
+    last_page = ""
+    link_header = resp.header['Link'] if 'Link' in resp.header else []
+    if list(filter(None, link_header)):
+        last_page_link, next_page_link = parse_pagination_links(link_header)
+
+        if len(last_page_link) == 1:
+            last_page = re.search(r'.*page=(\d+).*', last_page_link[0]['href']).group(1)
+            if pp is not None:
+                pp.print("last_page (%s)" % last_page)
+
+        if len(next_page_link) == 1:
+            next_link = bool(next_page_link[0]['href'])
+            if pp is not None:
+                pp.pprint("found next page link (%s)"%next_page_link[0]['href'])
+    elif page is not None and header_value(resp, 'Total') is not None:
+        # the total count tells a full last page apart, without requesting the empty page after it
+        total = int(header_value(resp, 'Total'))
+        served_page_size = page_size
+        if result_len < page_size and (page - 1) * page_size + result_len < total:
+            # a short page that isn't the last one: the server caps the page size
+            served_page_size = result_len
+        last_page = str(max(1, -(-total // served_page_size)))
+        next_link = page < int(last_page)
+        if pp is not None:
+            pp.print("last_page (%s) from Total" % last_page)
+    elif result_len >= page_size:
+        #  no header, but full page. N+1 risk
+        if pp is not None:
+            pp.print("Full page: %d/%d; getting next page" % (result_len, page_size))
+        next_link = True
+
+    return next_link, last_page
+
+
+def fetch_pages(client, elicit, operation, args, pages, concurrency, decode=None, validate_sample=0.0):
+    """
+    Fetch the given pages of a find operation through a bounded thread pool, yielding each page's data in order.
+    """
+    def fetch_page(page):
+        return fetch(client, elicit, operation, dict(args, page=page), decode, validate_sample)[1]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(in_caller_context(fetch_page), pages)
+
+def get_object(client, elicit, operation, pp = _pp, decode=None, validate_sample=0.0, **args):
+    resp, found_object = fetch(client, elicit, operation, args, decode, validate_sample)
+
     if pp != None:
         pp.print("\n\nGot object with %s(%s):\n" %(operation, args))
         pp.pprint(found_object)
@@ -190,6 +459,98 @@ def load_trial_definitions(file_name):
         return _locals['trial_components']
 
 
+def create_elicit_api(creds, script_args, app=None, adapter=None, limiter=None, metrics=None, cache_backend=None):
+    """
+    Build the ElicitApi for a configuration namespace, as used by Elicit and AsyncElicit. An ElicitPool passes the
+    App, HTTP adapter, in-flight limiter, metrics and response cache backend its sessions share.
+    """
+    token_cache = api.TokenCache(cache_dir=getattr(script_args, 'token_cache_dir', None))
+    return api.ElicitApi(creds, script_args.api_url, create_send_opt(script_args), create_spec_cache(script_args),
+                         create_http_opt(script_args), token_cache,
+                         metrics if metrics is not None else create_metrics(script_args),
+                         create_response_cache(creds, script_args, cache_backend),
+                         app=app, adapter=adapter,
+                         limiter=limiter if limiter is not None else create_scheduler(script_args))
+
+
+def create_scheduler(script_args, max_in_flight=None):
+    """
+    api.RequestScheduler for the configured rate_limit, rate_burst and max_in_flight; None when none is set
+    """
+    rate = getattr(script_args, 'rate_limit', None)
+    max_in_flight = max_in_flight or getattr(script_args, 'max_in_flight', None)
+    if not rate and not max_in_flight:
+        return None
+    return api.RequestScheduler(rate, getattr(script_args, 'rate_burst', None), max_in_flight)
+
+
+def create_spec_cache(script_args):
+    return api.SpecCache(cache_dir=getattr(script_args, 'spec_cache_dir', None),
+                         offline=getattr(script_args, 'offline', False),
+                         max_age=getattr(script_args, 'spec_max_age', 0))
+
+
+def create_send_opt(script_args):
+    """
+    Request options: the configured send_opt, with the configured timeout added
+    """
+    send_opt = dict(getattr(script_args, 'send_opt', None) or dict(verify=True))
+    if getattr(script_args, 'timeout', None) is not None:
+        send_opt['timeout'] = script_args.timeout
+    return send_opt
+
+
+def create_http_opt(script_args):
+    return dict(pool_size=getattr(script_args, 'pool_size', None),
+                max_retries=getattr(script_args, 'max_retries', None),
+                backoff_factor=getattr(script_args, 'backoff_factor', None))
+
+
+def create_response_cache(creds, script_args, backend=None):
+    """
+    Cache of find_*/get_* responses, only when a cache_ttl is configured
+    """
+    ttl = getattr(script_args, 'cache_ttl', None)
+    if ttl is None:
+        return None
+    if backend is None:
+        backend = create_cache_backend(script_args)
+    return api.ResponseCache(backend, ttl, getattr(script_args, 'cache_ttls', None),
+                             namespace='%s %s' % (script_args.api_url, creds.user))
+
+
+def create_cache_backend(script_args):
+    cache_dir = getattr(script_args, 'cache_dir', None)
+    cache_size = getattr(script_args, 'cache_size', None)
+    if cache_dir:
+        return api.DiskBackend(cache_dir, max_entries=cache_size or 10000)
+    return api.MemoryBackend(max_entries=cache_size or 1024)
+
+
+def create_metrics(script_args):
+    """
+    Per-session request metrics, also written as JSON lines and/or a Prometheus text file when configured
+    """
+    metrics = api.Metrics()
+    if getattr(script_args, 'metrics_file', None):
+        metrics.add_sink(api.JsonLinesSink(script_args.metrics_file))
+    if getattr(script_args, 'metrics_prometheus', None):
+        metrics.add_sink(api.PrometheusSink(script_args.metrics_prometheus))
+    return metrics
+
+
+def create_page_sizer(elicit_api, script_args):
+    """
+    pagination.PageSizer adapting the page size of find_* calls, or None when a fixed page_size is configured
+    """
+    if getattr(script_args, 'page_size', None):
+        return None
+    return pagination.PageSizer(elicit_api,
+                                maximum=getattr(script_args, 'max_page_size', None) or pagination.MAX_PAGE_SIZE,
+                                target_latency=(getattr(script_args, 'page_latency_target', None) or
+                                                pagination.PAGE_LATENCY_TARGET))
+
+
 class Elicit:
     """
     Constructor for the Elicit class.
@@ -208,6 +569,43 @@ class Elicit:
             - client_id (str, optional): Client ID for authentication.
             - client_secret (str, optional): Client secret for authentication.
             - send_opt (dict, optional): Additional options for API requests (default: {'verify': True}).
+            - spec_cache_dir (str, optional): Directory caching the swagger definition (default: ~/.cache/elicit/swagger).
+            - offline (bool, optional): Only use the cached swagger definition, never download it (default: False).
+            - spec_max_age (int, optional): Seconds to trust the cached swagger definition without revalidating (default: 0).
+            - page_size (int, optional): Page size for find_* calls that don't specify one (default: adapted to the
+              server's limit and latency, see pagination.PageSizer).
+            - max_page_size (int, optional): Largest adapted page size when the server declares no limit (default: 1000).
+            - page_latency_target (float, optional): Seconds a page may take before the adapted page size shrinks
+              (default: 1.0).
+            - concurrency (int, optional): Threads fetching the remaining pages of find_* calls once the last page is known (default: 1).
+            - pool_size (int, optional): Keep-alive connections pooled per host (default: 10).
+            - max_retries (int, optional): Retries of idempotent requests on connection errors and 502/503/504 (default: 3).
+            - backoff_factor (float, optional): Base of the exponential backoff between retries, in seconds (default: 0.5).
+            - timeout (float, optional): Per-request timeout in seconds, added to send_opt (default: none).
+            - token_cache_dir (str, optional): Directory sharing OAuth tokens between processes (default: in-memory only).
+            - decode (str, optional): Return find_*/iter_*/get_* results decoded straight from JSON as 'dict', 'tuple'
+              or 'record' (__slots__ objects) instead of validated pyswagger models (default: None, models).
+            - validate_sample (float, optional): Fraction of decoded responses still validated against the schema (default: 0).
+            - cache_ttl (float, optional): Cache find_*/get_* responses for this many seconds, then revalidate them
+              with their ETag; add_* calls invalidate the cached responses of their resource (default: no caching).
+            - cache_ttls (dict, optional): Per-operation TTLs overriding cache_ttl, None to never cache (default: none).
+            - cache_dir (str, optional): Keep the response cache in a SQLite database in this directory, shared between
+              sessions, instead of in memory (default: none).
+            - cache_size (int, optional): Cached responses kept before the least recently used are evicted
+              (default: 1024 in memory, 10000 on disk).
+            - metrics_file (str, optional): Append a JSON line per request (operation, status, latency, bytes, page,
+              retries) to this file (default: none).
+            - metrics_prometheus (str, optional): Write the request metrics in Prometheus text format to this file on
+              close (default: none).
+            - participant_index (str, optional): Keep the index of users available as participants, which
+              ensure_users picks from, in this JSON file between sessions (default: in memory only).
+            - mirror_dir (str, optional): Directory of the local study mirror; find_* calls it covers are served
+              from it while it is fresh, see mirror.StudyMirror (default: none).
+            - mirror_max_age (float, optional): Seconds a mirrored listing is served for (default: 86400).
+            - rate_limit (float, optional): Requests started per second at most, shared fairly between jobs, see
+              api.RequestScheduler; 429 responses pause all requests until their Retry-After (default: no limit).
+            - rate_burst (int, optional): Requests that may start at once under rate_limit (default: rate_limit).
+            - max_in_flight (int, optional): Requests in flight at once (default: no cap).
 
     Raises:
         FileNotFoundError: If the environment YAML file is not found during credential loading.
@@ -217,9 +615,10 @@ class Elicit:
         - If a user is provided, it assumes all the credentials (user, password, client_id, and client_secret) are specified.
         - Otherwise, it loads credentials from an environment-specific YAML file (e.g. `prod.yaml`) located in the same directory as this script.
         - Initializes the ElicitApi object with the defined credentials and configuration.
-        - Logs in to the ElicitApi and creates a client object for further API interactions.
+        - Logs in to the ElicitApi and creates a client object for further API interactions, reusing a cached token
+          for the same API URL, user and client ID while it is valid; tokens are refreshed as they near expiry.
     """
-    def __init__(self, base_configuration):
+    def __init__(self, base_configuration, elicit_api=None):
         # Convert configuration to a dictionary if it is an argparse.Namespace
         configuration = base_configuration
         if not isinstance(base_configuration, dict):
@@ -231,8 +630,12 @@ class Elicit:
             raise Exception("Credentials not found")
 
         self.script_args = types.SimpleNamespace(**configuration)
-        self.elicit_api = api.ElicitApi(self.creds, self.script_args.api_url, self.script_args.send_opt)
+        # an ElicitPool builds the ElicitApi from the parts its sessions share
+        self.elicit_api = elicit_api if elicit_api is not None else create_elicit_api(self.creds, self.script_args)
         self.client = self.elicit_api.login()
+        self._participant_index = None
+        self._mirror = None
+        self.page_sizer = create_page_sizer(self.elicit_api, self.script_args)
 
     def api_url(self):
         return self.script_args.api_url
@@ -243,6 +646,18 @@ class Elicit:
     def add_obj(self, op, args):
         return add_object(self.client, self.elicit_api, op, self.pp(), **args)
 
+    def prepare(self, op, **args):
+        """
+        Serialize op's body argument once for add_prepared, see prepared.PreparedPayload
+        """
+        return prepared.PreparedPayload(self.elicit_api.app, op, **args)
+
+    def add_prepared(self, payload, values=None, **args):
+        """
+        Create an object from a prepared payload, stamping values into its slots
+        """
+        return add_prepared(self.client, self.elicit_api, payload, self.pp(), values, **args)
+
     def get_all_users(self, args = dict()):
         resp = self.client.request(self.elicit_api['findUsers'](**args))
         assert resp.status == HTTPStatus.OK
@@ -252,81 +667,188 @@ class Elicit:
         user = find_or_create_user(self.client, self.elicit_api, username, password, email, role)
         return user
 
-    def ensure_users(self, num_registered, num_anonymous, debug: False):
-        page = 0
-        next_link = 'first'
-        study_participants = []
-        while ((num_registered > 0) or (num_anonymous > 0)) and next_link:
-            page += 1
-
-            if debug:
-                print("GETTING page %d next %s"%(page, next_link))
-            resp = self.client.request(self.elicit_api['findUsers'](page=page, page_size=3))
-            assert resp.status == HTTPStatus.OK
-            users = resp.data
+    def ensure_users(self, num_registered, num_anonymous, debug=False):
+        """
+        Pick num_registered registered and num_anonymous (non-mturk) anonymous existing users, creating any that are
+        missing on a pool of `concurrency` workers.
+        :return: the participants, existing users first; raises BulkError if any user could not be created
+        """
+        result = self.bulk_ensure_users(num_registered, num_anonymous, debug)
+        return result.raise_for_failures()
 
-            if debug:
-                print("got %d users"%len(users))
-
-            link_header = resp.header['Link']
-
-            last_page_link, next_page_link = parse_pagination_links(link_header)
-
-            if len(last_page_link) == 1:
-                last_page = re.search(r'.*page=(\d+).*', last_page_link[0]['href']).group(1)
+    def bulk_ensure_users(self, num_registered, num_anonymous, debug=False):
+        study_participants = []
+        for role, count in [('registered_user', num_registered), ('anonymous_user', num_anonymous)]:
+            if count > 0:
+                existing_users = self.find_users_by_role(role, count, debug)
+                study_participants += existing_users
                 if debug:
-                    print("last_page %s"%last_page)
-
-            if len(next_page_link) == 1:
-                next_link = next_page_link[0]['href']
+                    print("Got existing %d %s users of %d." % (len(existing_users), role, count))
+
+        remaining_registered = num_registered - sum(user.role == 'registered_user' for user in study_participants)
+        remaining_anonymous = num_anonymous - sum(user.role == 'anonymous_user' for user in study_participants)
+        if ((remaining_registered > 0) or (remaining_anonymous > 0)) and debug:
+            print('Creating remaining %d registered and %d anonymous users' % (remaining_registered, remaining_anonymous))
+
+        users_details = ([random_user_details('anonymous_user') for i in range(remaining_anonymous)] +
+                         [random_user_details('registered_user') for i in range(remaining_registered)])
+        created = bulk_add_users(self.client, self.elicit_api, users_details, self.concurrency())
+        self.participant_index().add(created.results)
+
+        return BulkResult(self.decode_users(study_participants + created.results),
+                          [(len(study_participants) + index, item, error) for index, item, error in created.failures])
+
+    def decode_users(self, users):
+        """
+        Users picked from the participant index or created with addUser (None for failures) as find_users returns
+        them: pyswagger models, or decoded with the configured decode
+        """
+        from .participants import plain
+        decode = self.decode_opt({})['decode']
+        records = [plain(user) for user in users if user is not None]
+        if not decode:
+            decoded = decoding.to_models(self.elicit_api, 'findUsers', records)
+        else:
+            name = record_name('findUsers')
+            decoded = decoding.decode_data(records, decode, name,
+                                           decoding.response_decoder(self.elicit_api, 'findUsers', decode, name))
+        decoded = iter(decoded)
+        return [None if user is None else next(decoded) for user in users]
+
+    def find_users_by_role(self, role, count, debug=False):
+        """
+        Return up to count existing users with the given role (anonymous mturk users excluded) from the participant
+        index, which fetches findUsers pages, filtered by role on the server when it supports that, only as needed.
+        """
+        return self.participant_index().pick(role, count)
+
+    def participant_index(self):
+        """
+        The session's participants.ParticipantIndex, kept in the participant_index file when one is configured
+        """
+        if self._participant_index is None:
+            from .participants import ParticipantIndex
+            self._participant_index = ParticipantIndex(self, getattr(self.script_args, 'participant_index', None))
+        return self._participant_index
+
+    def mirror(self):
+        """
+        The session's mirror.StudyMirror in the configured mirror_dir
+        """
+        if self._mirror is None:
+            from .mirror import StudyMirror, MIRROR_MAX_AGE
+            if not getattr(self.script_args, 'mirror_dir', None):
+                raise ValueError('No mirror_dir configured')
+            max_age = getattr(self.script_args, 'mirror_max_age', None)
+            self._mirror = StudyMirror(self, self.script_args.mirror_dir,
+                                       max_age if max_age is not None else MIRROR_MAX_AGE)
+        return self._mirror
+
+    def mirror_results(self, **kwargs):
+        """
+        Mirror the trial results and data points matching kwargs (e.g. study_definition_id), for find_* calls to
+        read locally
+        :return: {operation: number of records mirrored}
+        """
+        from .mirror import MIRROR_OPERATIONS
+        return {operation: self.mirror().update(operation, **kwargs)
+                for operation in MIRROR_OPERATIONS if operation in self.elicit_api.operations}
+
+    def find_users(self, role=None, email=None, **kwargs):
+        """
+        Users with the given role and an email containing email. Filters findUsers supports are applied by the
+        server, the others to each page as it arrives.
+        """
+        return list(self.iter_users(role, email, **kwargs))
+
+    def iter_users(self, role=None, email=None, **kwargs):
+        filters = dict(role=role, email=email)
+        local_filters = {}
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if self.elicit_api.has_parameter('findUsers', name):
+                kwargs[name] = value
             else:
-                next_link = ''
-
-            for user in users:
-                if user.role == 'registered_user':
-                    if num_registered > 0:
-                        study_participants += [user]
-                        num_registered -= 1
-                elif user.role == 'anonymous_user':
-                    if (num_anonymous > 0) and not "mturk" in user.email:
-                        study_participants += [user]
-                        num_anonymous -= 1
-            if debug:
-                print("Got existing %d users.  %d registered and %d anonymous users remain."%(len(study_participants), num_registered, num_anonymous))
-
-        if (num_registered > 0) or (num_anonymous > 0) and debug:
-            print('Creating remaining users')
-
-        for i in range(num_anonymous):
-            username = ''.join([random.choice(string.ascii_letters + string.digits) for n in range(16)])
-            role = 'anonymous_user'
-            password = 'password'
-            user_details = dict(username=username,
-                                password=password,
-                                email=username + "@elicit.com",
-                                role=role or 'registered_user',
-                                anonymous=True,
-                                password_confirmation=password)
-            new_user = self.add_user(user=dict(user=user_details))
-            study_participants += [new_user]
-
-        for i in range(num_registered):
-            username = ''.join([random.choice(string.ascii_letters + string.digits) for n in range(16)])
-            role = 'registered_user'
-            password = 'password'
-            user_details = dict(username=username,
-                                password=password,
-                                email=username + "@elicit.com",
-                                role=role or 'registered_user',
-                                anonymous=False,
-                                password_confirmation=password)
-            new_user = self.add_user(user=dict(user=user_details))
-            study_participants += [new_user]
-
-        return study_participants
-
-    def add_users_to_protocol(self, new_study, new_protocol, study_participants):
-        add_users_to_protocol(self.client, self.elicit_api, new_study, new_protocol, study_participants)
+                local_filters[name] = value
+
+        kwargs.setdefault('page_size', USER_PAGE_SIZE)
+        for user in iter_objects(self.client, self.elicit_api, 'findUsers', self.pp(),
+                                 default_page_size=self.page_size(), **self.decode_opt(kwargs)):
+            if 'role' in local_filters and record_field(user, 'role') != role:
+                continue
+            if 'email' in local_filters and email not in (record_field(user, 'email') or ''):
+                continue
+            yield user
+
+    def add_users_to_protocol(self, new_study, new_protocol, study_participants, group_name_map=None):
+        return add_users_to_protocol(self.client, self.elicit_api, new_study, new_protocol, study_participants,
+                                     group_name_map, self.concurrency())
+
+    def bulk_add_users_to_protocol(self, new_study, new_protocol, study_participants, group_name_map=None):
+        return bulk_add_protocol_users(self.client, self.elicit_api, new_study, new_protocol, study_participants,
+                                       group_name_map, self.concurrency())
+
+    def study_sync(self, path, page_size=100):
+        """
+        Open the SQLite checkpoint store at path for incremental syncs of study results, see sync.StudySync
+        """
+        from .sync import StudySync
+        return StudySync(self, path, page_size)
+
+    def download_time_series(self, output_dir, time_series=None, max_workers=None, **kwargs):
+        """
+        Download the files of time series records (by default, find_time_series(**kwargs)) into output_dir on up to
+        max_workers threads (default: concurrency), see downloads.DownloadManager
+        :return: BulkResult with the path of each downloaded file
+        """
+        from .downloads import DownloadManager, time_series_jobs
+        if time_series is None:
+            time_series = self.find_time_series(**dict(kwargs, decode='dict'))
+        manager = DownloadManager(self.client.session, self.api_url(), self.auth_header,
+                                  max_workers=max_workers or self.concurrency(),
+                                  timeout=create_send_opt(self.script_args).get('timeout'))
+        return manager.download(time_series_jobs(time_series, output_dir, self.api_url()))
+
+    def build_study(self, tree, max_workers=None):
+        """
+        Create a whole study definition tree concurrently and return a summary, see study_builder.StudyBuilder
+        """
+        from .study_builder import StudyBuilder
+        return StudyBuilder(self, max_workers).run(tree)
+
+    def job(self, name):
+        """
+        Context manager under which requests belong to job name, e.g. one per study exported concurrently, which a
+        rate_limit or max_in_flight scheduler serves in turn
+        """
+        return api.RequestScheduler.job(name)
+
+    def scheduler_stats(self):
+        """
+        Queue depth and throttling counters of the request scheduler (see api.RequestScheduler.stats), None without one
+        """
+        limiter = self.client.limiter
+        return limiter.stats() if isinstance(limiter, api.RequestScheduler) else None
+
+    def metrics_summary(self):
+        """
+        Per-operation report of the requests made this session: count, errors, retries, latency and bytes
+        """
+        return self.elicit_api.metrics.summary()
+
+    def clear_cache(self):
+        """
+        Drop every cached find_*/get_* response
+        """
+        if self.client.response_cache is not None:
+            self.client.response_cache.clear()
+
+    def close(self):
+        """
+        Flush and close the metrics sinks
+        """
+        self.elicit_api.metrics.close()
 
     def assert_admin(self):
         return assert_role(self.client, self.elicit_api, 'admin')
@@ -337,6 +859,21 @@ class Elicit:
     def assert_creator(self):
         return assert_role(self.client, self.elicit_api, ['admin', 'investigator'])
 
+    def page_size(self):
+        return getattr(self.script_args, 'page_size', None) or DEFAULT_PAGE_SIZE
+
+    def concurrency(self):
+        return getattr(self.script_args, 'concurrency', None) or 1
+
+    def decode_opt(self, kwargs):
+        """
+        Decoding options for find_*/iter_*/get_* calls: the configured decode mode and validation sample rate,
+        unless the call passes its own decode/validate_sample.
+        """
+        return dict(dict(decode=getattr(self.script_args, 'decode', None),
+                         validate_sample=getattr(self.script_args, 'validate_sample', None) or 0.0),
+                    **kwargs)
+
     def pp(self):
         if self.script_args.debug:
             return _pp
@@ -347,15 +884,47 @@ def add_find_api_fn(api_name):
     fn_name = camel_to_snake(api_name)
 
     def fn(self, **kwargs):
-        return find_objects(self.client, self.elicit_api, api_name, self.pp(), **kwargs)
+        if getattr(self.script_args, 'mirror_dir', None):
+            found_objects = self.mirror().find(api_name, **self.decode_opt(kwargs))
+            if found_objects is not None:
+                return found_objects
+        return find_objects(self.client, self.elicit_api, api_name, self.pp(),
+                            concurrency=self.concurrency(), default_page_size=self.page_size(),
+                            page_sizer=self.page_sizer, **self.decode_opt(kwargs))
 
     setattr(Elicit, fn_name, fn)
 
+def add_iter_api_fn(api_name):
+    fn_name = 'iter_' + camel_to_snake(api_name)[len('find_'):]
+
+    def fn(self, **kwargs):
+        return iter_objects(self.client, self.elicit_api, api_name, self.pp(),
+                            default_page_size=self.page_size(), page_sizer=self.page_sizer,
+                            **self.decode_opt(kwargs))
+
+    setattr(Elicit, fn_name, fn)
+
+def add_columnar_api_fns(api_name):
+    record_name = camel_to_snake(api_name)[len('find_'):]
+
+    def to_dataframe(self, **kwargs):
+        from . import columnar
+        return columnar.to_dataframe(self.client, self.elicit_api, api_name, self.pp(),
+                                     default_page_size=self.page_size(), page_sizer=self.page_sizer, **kwargs)
+
+    def to_parquet(self, path, **kwargs):
+        from . import columnar
+        return columnar.to_parquet(self.client, self.elicit_api, api_name, path, self.pp(),
+                                   default_page_size=self.page_size(), page_sizer=self.page_sizer, **kwargs)
+
+    setattr(Elicit, record_name + '_to_dataframe', to_dataframe)
+    setattr(Elicit, record_name + '_to_parquet', to_parquet)
+
 def add_get_api_fn(api_name):
     fn_name = camel_to_snake(api_name)
 
     def fn(self, **kwargs):
-        return get_object(self.client, self.elicit_api, api_name, self.pp(), **kwargs)
+        return get_object(self.client, self.elicit_api, api_name, self.pp(), **self.decode_opt(kwargs))
 
     setattr(Elicit, fn_name, fn)
 
@@ -367,13 +936,21 @@ def add_add_api_fn(api_name):
 
     setattr(Elicit, fn_name, fn)
 
-for api_name in ['findStudyResults', 'findExperiments', 'findStages', 'findDataPoints', 'findTimeSeries',
-                 'findTrialResults', 'findComponents', 'findTimeSeries', 'findStudyDefinitions']:
+FIND_APIS = ['findStudyResults', 'findExperiments', 'findStages', 'findDataPoints', 'findTimeSeries',
+             'findTrialResults', 'findComponents', 'findStudyDefinitions']
+
+ADD_APIS = ['addStudy', 'addProtocolDefinition', 'addPhaseDefinition', 'addTrialDefinition', 'addTrialOrder',
+            'addPhaseOrder', 'addProtocolUser', 'addComponent', 'addUser']
+
+GET_APIS = ['getComponent']
+
+for api_name in FIND_APIS:
     add_find_api_fn(api_name)
+    add_iter_api_fn(api_name)
+    add_columnar_api_fns(api_name)
 
-for api_name in ['addStudy', 'addProtocolDefinition', 'addPhaseDefinition', 'addTrialDefinition', 'addTrialOrder',
-                 'addPhaseOrder', 'addProtocolUser', 'addComponent', 'addUser']:
+for api_name in ADD_APIS:
     add_add_api_fn(api_name)
 
-for api_name in ['getComponent']:
+for api_name in GET_APIS:
     add_get_api_fn(api_name)
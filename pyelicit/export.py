@@ -0,0 +1,241 @@
+"""
+elicit-export: export the results of many studies on a pool of worker processes.
+
+Every (study, operation) pair is one task, streamed page by page to <output_dir>/study_<id>/<operation>.jsonl. After
+each page the task's progress (next page and file offset) is saved next to the file, so an interrupted export
+resumes where it stopped and finished files are skipped.
+
+    elicit-export --env prod --output_dir export 12 13 14
+    elicit-export --env prod --output_dir export --title 'Pilot.*' --processes 8
+"""
+import collections
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from . import command_line
+from .elicit import Elicit, fetch, page_links
+
+EXPORT_OPERATIONS = ['findStudyResults', 'findExperiments', 'findStages', 'findTrialResults', 'findDataPoints',
+                     'findTimeSeries']
+
+EXPORT_PAGE_SIZE = 500
+
+TaskResult = collections.namedtuple('TaskResult', ['study_id', 'operation', 'records', 'pages', 'bytes', 'seconds',
+                                                   'already_done', 'error'])
+
+
+def build_parser():
+    parser = command_line.build_parser(dict(page_size=EXPORT_PAGE_SIZE), prog='elicit-export')
+    parser.add_argument('study_ids', nargs='*', type=int,
+                        help='Study definition ids to export (default: every study matching --title)')
+    parser.add_argument('--title', type=str, default=None,
+                        help='Export the studies whose title matches this regular expression')
+    parser.add_argument('--output_dir', type=str, default='elicit-export',
+                        help='Directory receiving one subdirectory of JSON lines files per study')
+    parser.add_argument('--operations', nargs='+', default=EXPORT_OPERATIONS,
+                        help='find operations to export for each study')
+    parser.add_argument('--study_parameter', type=str, default='study_definition_id',
+                        help='Parameter selecting a study\'s records in the find operations')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='Worker processes, each with its own authenticated session')
+    return parser
+
+
+class Progress:
+    """
+    Resume point of one export file: the next page to fetch and the file size after the last complete page
+    """
+    def __init__(self, path, page_size):
+        self.path = path
+        self.state = dict(page_size=page_size, next_page=1, offset=0, records=0, complete=False)
+        if path.is_file():
+            saved = json.loads(path.read_text())
+            if saved.get('page_size') == page_size:
+                self.state = saved
+
+    def save(self, **changes):
+        self.state.update(changes)
+        temporary_path = self.path.with_suffix('.tmp')
+        temporary_path.write_text(json.dumps(self.state))
+        os.replace(temporary_path, self.path)
+
+    def __getitem__(self, name):
+        return self.state[name]
+
+
+def export_operation(elicit, output_dir, study_id, operation, page_size, study_parameter):
+    """
+    Export every record of operation for one study, resuming from its saved progress
+    :return: TaskResult, counting the records and pages fetched by this call
+    """
+    start = time.time()
+    study_dir = Path(output_dir) / ('study_%s' % study_id)
+    study_dir.mkdir(parents=True, exist_ok=True)
+    progress = Progress(study_dir / (operation + '.progress.json'), page_size)
+    if progress['complete']:
+        return TaskResult(study_id, operation, progress['records'], 0, 0, 0.0, True, None)
+
+    pages = 0
+    fetched = 0
+    written = 0
+    page = progress['next_page']
+    with open(study_dir / (operation + '.jsonl'), 'ab') as output:
+        # drop anything written after the last saved page
+        output.truncate(progress['offset'])
+        while True:
+            resp, records = fetch(elicit.client, elicit.elicit_api, operation,
+                                  {study_parameter: study_id, 'page': page, 'page_size': page_size}, decode='dict')
+            data = b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records)
+            output.write(data)
+            output.flush()
+            pages += 1
+            fetched += len(records)
+            written += len(data)
+
+            next_link = len(records) > 0 and page_links(resp, page_size, None, len(records))[0]
+            progress.save(next_page=page + 1, offset=output.tell(), records=progress['records'] + len(records),
+                          complete=not next_link)
+            if not next_link:
+                break
+            page += 1
+
+    return TaskResult(study_id, operation, fetched, pages, written, time.time() - start, False, None)
+
+
+_worker = None
+
+
+def init_worker(configuration):
+    global _worker
+    # the parent already downloaded the swagger definition and cached a token for the workers to share
+    _worker = Elicit(dict(configuration, offline=True))
+
+
+def run_task(output_dir, study_id, operation, page_size, study_parameter):
+    try:
+        return export_operation(_worker, output_dir, study_id, operation, page_size, study_parameter)
+    except Exception as e:
+        return TaskResult(study_id, operation, 0, 0, 0, 0.0, False, repr(e))
+
+
+def select_studies(elicit, study_ids, title=None):
+    """
+    The given study ids, or the ids of every study definition whose title matches title
+    """
+    if study_ids:
+        return list(study_ids)
+    studies = elicit.find_study_definitions(page_size=EXPORT_PAGE_SIZE, decode='dict')
+    return [study['id'] for study in studies if title is None or re.search(title, study.get('title') or '')]
+
+
+def exportable_operations(elicit, operations, study_parameter):
+    exportable = []
+    for operation in operations:
+        try:
+            supported = elicit.elicit_api.has_parameter(operation, study_parameter)
+        except KeyError:
+            supported = False
+        if supported:
+            exportable.append(operation)
+        else:
+            print("WARNING: %s cannot be filtered by %s; not exporting it" % (operation, study_parameter))
+    return exportable
+
+
+def export(configuration, tasks, output_dir, processes, page_size, study_parameter):
+    """
+    Run the (study_id, operation) tasks on a pool of processes
+    :return: ExportReport
+    """
+    report = ExportReport(processes)
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(configuration,)) as executor:
+        futures = [executor.submit(run_task, output_dir, study_id, operation, page_size, study_parameter)
+                   for study_id, operation in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            report.add(result)
+            print(report.progress_line(result, len(tasks)))
+    report.finish()
+    return report
+
+
+class ExportReport:
+    def __init__(self, processes):
+        self.processes = processes
+        self.start = time.time()
+        self.elapsed = 0.0
+        self.results = []
+
+    def add(self, result):
+        self.results.append(result)
+
+    def finish(self):
+        self.elapsed = time.time() - self.start
+
+    def failures(self):
+        return [result for result in self.results if result.error]
+
+    def progress_line(self, result, total):
+        status = ('FAILED %s' % result.error if result.error else
+                  'already done' if result.already_done else '%d records' % result.records)
+        return "[%d/%d] study %s %s: %s" % (len(self.results), total, result.study_id, result.operation, status)
+
+    def __str__(self):
+        exported = [result for result in self.results if not result.error and not result.already_done]
+        records = sum(result.records for result in exported)
+        written = sum(result.bytes for result in exported)
+        elapsed = self.elapsed or 1e-9
+        lines = ["Exported %d records (%.1f MB) from %d files in %.1fs with %d processes: %.0f records/s, %.2f MB/s" %
+                 (records, written / 1e6, len(exported), self.elapsed, self.processes, records / elapsed,
+                  written / 1e6 / elapsed)]
+
+        by_operation = collections.defaultdict(lambda: [0, 0, 0.0])
+        for result in exported:
+            totals = by_operation[result.operation]
+            totals[0] += result.records
+            totals[1] += result.pages
+            totals[2] += result.seconds
+        for operation, (operation_records, pages, seconds) in sorted(by_operation.items()):
+            lines.append("    %s: %d records in %d pages, %.1f worker s" % (operation, operation_records, pages, seconds))
+
+        already_done = sum(result.already_done for result in self.results)
+        if already_done:
+            lines.append("%d files were already complete" % already_done)
+        for result in self.failures():
+            lines.append("FAILED study %s %s: %s" % (result.study_id, result.operation, result.error))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configuration = command_line.add_command_line_args_default(args)
+    token_dir = None
+    if configuration.get('token_cache_dir') is None:
+        # workers authenticate with the parent's token instead of each logging in; without a token_cache_dir it is
+        # shared through a private directory removed at the end, rather than kept on disk
+        token_dir = configuration['token_cache_dir'] = tempfile.mkdtemp(prefix='elicit-export-tokens-')
+
+    try:
+        elicit = Elicit(configuration)
+        study_ids = select_studies(elicit, args.study_ids, args.title)
+        operations = exportable_operations(elicit, args.operations, args.study_parameter)
+        tasks = [(study_id, operation) for study_id in study_ids for operation in operations]
+        print("Exporting %d studies x %d operations to %s" % (len(study_ids), len(operations), args.output_dir))
+
+        report = export(configuration, tasks, args.output_dir, args.processes, configuration['page_size'],
+                        args.study_parameter)
+    finally:
+        if token_dir is not None:
+            shutil.rmtree(token_dir, ignore_errors=True)
+    print(report)
+    return 1 if report.failures() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Local mirror of study results, read through memory mapping.
+
+update() pages through a find operation, e.g. findDataPoints for one study, and writes the records to an uncompressed
+Arrow IPC file. Next to it, each id column (study, study result, experiment, stage, trial, ...) gets an index file with
+the column's sorted values and their row numbers. Reads memory-map both, so opening a listing copies nothing and a
+lookup by id only touches the matching rows. A manifest records the arguments and time of every listing. A query can be
+served from any fresh listing made with a subset of its arguments, as long as the others are indexed columns.
+
+    mirror = elicit.mirror()
+    mirror.update('findDataPoints', study_definition_id=12)
+    table = mirror.table('findDataPoints', study_definition_id=12, stage_id=3)   # pyarrow.Table
+    data_points = mirror.find('findDataPoints', study_definition_id=12, stage_id=3, decode='dict')
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from . import decoding
+from .columnar import record_columns
+from .elicit import iter_pages, record_name
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+MIRROR_OPERATIONS = ('findTrialResults', 'findDataPoints')
+INDEX_COLUMNS = ('study_definition_id', 'study_result_id', 'experiment_id', 'protocol_user_id', 'stage_id',
+                 'phase_definition_id', 'trial_definition_id', 'trial_result_id', 'component_id', 'id')
+MIRROR_MAX_AGE = 24 * 60 * 60
+# arguments that don't change which records a listing holds
+PAGING_ARGUMENTS = ('page_size',)
+
+
+def arrow_type(_type):
+    types = {
+        'integer': pyarrow.int64(),
+        'number': pyarrow.float64(),
+        'boolean': pyarrow.bool_(),
+    }
+    # dates are kept as the API's strings; nested objects and arrays as JSON
+    return types.get(_type, pyarrow.string())
+
+
+class StudyMirror:
+    """
+    Listings of find operations kept on disk under path, served while they are younger than max_age seconds
+    """
+    def __init__(self, elicit, path, max_age=MIRROR_MAX_AGE):
+        """
+        Initialize
+        :param elicit: Elicit session the listings are fetched with
+        :param path: Directory of the mirror
+        :param max_age: Seconds a listing is served for after it was fetched, None for as long as it exists
+        :return: returns nothing
+        """
+        if pyarrow is None:
+            raise ImportError('The study mirror requires pyarrow; install pyelicit[arrow]')
+        self.elicit = elicit
+        self.path = Path(path)
+        self.max_age = max_age
+        self.manifest_path = self.path / 'manifest.json'
+        self.lock = threading.Lock()
+        self.manifest = self.load_manifest()
+        self.tables = {}
+
+    def load_manifest(self):
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.manifest_path.with_suffix('.tmp')
+        temporary_path.write_text(json.dumps(self.manifest, indent=1))
+        os.replace(temporary_path, self.manifest_path)
+
+    @staticmethod
+    def listing_args(args):
+        return {name: value for name, value in args.items() if name not in PAGING_ARGUMENTS and value is not None}
+
+    @staticmethod
+    def listing_key(operation, args):
+        listing = json.dumps([operation, {name: str(value) for name, value in args.items()}], sort_keys=True)
+        return hashlib.sha1(listing.encode('utf-8')).hexdigest()[:16]
+
+    def update(self, operation, **args):
+        """
+        Fetch every record of operation(**args) into the mirror, replacing the listing made with the same arguments
+        :return: the number of records mirrored
+        """
+        columns = record_columns(self.elicit.elicit_api, operation)
+        if not columns:
+            raise ValueError('%s has no record schema to mirror' % operation)
+        schema = pyarrow.schema([pyarrow.field(name, arrow_type(_type)) for name, _type, _ in columns])
+        json_columns = [name for name, _type, _ in columns if _type in ('object', 'array')]
+
+        args = self.listing_args(args)
+        key = self.listing_key(operation, args)
+        # taken before fetching, so records changed meanwhile make the listing stale sooner, not later
+        fetched_at = time.time()
+        stem = '%s-%d' % (key, fetched_at * 1000)
+        directory = self.path / operation
+        directory.mkdir(parents=True, exist_ok=True)
+        data_path = directory / (stem + '.arrow')
+        temporary_path = data_path.with_suffix('.tmp')
+
+        elicit = self.elicit
+        rows = 0
+        pages = iter_pages(elicit.client, elicit.elicit_api, operation, elicit.pp(), elicit.page_size(),
+                           decode='dict', page_sizer=elicit.page_sizer, **args)
+        with pyarrow.OSFile(str(temporary_path), 'wb') as sink, pyarrow.ipc.new_file(sink, schema) as writer:
+            for page_data in pages:
+                for record in page_data:
+                    for name in json_columns:
+                        if record.get(name) is not None:
+                            record[name] = json.dumps(record[name])
+                writer.write_table(pyarrow.Table.from_pylist(page_data, schema))
+                rows += len(page_data)
+        os.replace(temporary_path, data_path)
+
+        listing = dict(args=args, rows=rows, fetched_at=fetched_at, data=data_path.name, json_columns=json_columns,
+                       indexes=self.write_indexes(data_path, stem, columns))
+        with self.lock:
+            previous = self.manifest.setdefault(operation, {}).get(key)
+            self.manifest[operation][key] = listing
+            self.save_manifest()
+        if previous is not None:
+            # readers holding the old files keep their memory maps; the session stops caching them
+            with self.lock:
+                self.tables.pop(str(directory / previous['data']), None)
+            for name in [previous['data']] + list(previous['indexes'].values()):
+                (directory / name).unlink(missing_ok=True)
+        return rows
+
+    def write_indexes(self, data_path, stem, columns):
+        """
+        Write (sorted values, row numbers) of every integer id column, leaving out null values
+        :return: {column: index file name}
+        """
+        import numpy
+
+        table = self.open_table(data_path)
+        indexes = {}
+        for name, _type, _ in columns:
+            if name not in INDEX_COLUMNS or _type != 'integer':
+                continue
+            column = table.column(name)
+            rows = numpy.flatnonzero(column.is_valid().to_numpy(zero_copy_only=False))
+            values = pyarrow.compute.fill_null(column, 0).to_numpy()[rows]
+            order = numpy.argsort(values, kind='stable')
+            index_path = data_path.with_name('%s.%s.npy' % (stem, name))
+            numpy.save(index_path, numpy.stack([values[order], rows[order]]).astype('int64'))
+            indexes[name] = index_path.name
+        return indexes
+
+    def open_table(self, data_path):
+        """
+        The Arrow table of a data file, memory-mapped: its buffers point into the file's pages
+        """
+        key = str(data_path)
+        with self.lock:
+            table = self.tables.get(key)
+        if table is None:
+            with pyarrow.memory_map(key) as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+            with self.lock:
+                self.tables[key] = table
+        return table
+
+    def is_fresh(self, listing):
+        return self.max_age is None or time.time() - listing['fetched_at'] <= self.max_age
+
+    def covering(self, operation, args):
+        """
+        The most recent fresh listing of operation made with a subset of args, whose other arguments are indexed
+        :return: (listing, {column: value} to look up in its indexes), or None
+        """
+        if 'page' in args:
+            return None
+        args = self.listing_args(args)
+        with self.lock:
+            listings = list(self.manifest.get(operation, {}).values())
+
+        best = None
+        for listing in listings:
+            if not self.is_fresh(listing):
+                continue
+            if any(name not in args or str(args[name]) != str(value) for name, value in listing['args'].items()):
+                continue
+            lookups = {name: value for name, value in args.items() if name not in listing['args']}
+            if any(name not in listing['indexes'] for name in lookups):
+                continue
+            try:
+                lookups = {name: int(value) for name, value in lookups.items()}
+            except (TypeError, ValueError):
+                continue
+            if best is None or listing['fetched_at'] > best[0]['fetched_at']:
+                best = (listing, lookups)
+        return best
+
+    def lookup(self, operation, args):
+        covering = self.covering(operation, args)
+        if covering is None:
+            return None, None
+        listing, lookups = covering
+        directory = self.path / operation
+        table = self.open_table(directory / listing['data'])
+        if not lookups:
+            return listing, table
+
+        import numpy
+        rows = None
+        for name, value in lookups.items():
+            index = numpy.load(directory / listing['indexes'][name], mmap_mode='r')
+            start, end = numpy.searchsorted(index[0], [value, value + 1])
+            matches = numpy.sort(index[1][start:end])
+            rows = matches if rows is None else numpy.intersect1d(rows, matches, assume_unique=True)
+        return listing, table.take(pyarrow.array(rows, type=pyarrow.int64()))
+
+    def table(self, operation, **args):
+        """
+        The mirrored records of operation(**args) as a pyarrow.Table, or None when no fresh listing covers the query
+        """
+        return self.lookup(operation, args)[1]
+
+    def find(self, operation, decode=None, validate_sample=0.0, **args):
+        """
+        The mirrored records of operation(**args) as find_objects would return them (pyswagger models, or decoded
+        with decode), or None when no fresh listing covers the query
+        """
+        listing, table = self.lookup(operation, args)
+        if table is None:
+            return None
+
+        records = table.to_pylist()
+        for name in listing['json_columns']:
+            for record in records:
+                if record[name] is not None:
+                    record[name] = json.loads(record[name])
+        if not decode:
+            return decoding.to_models(self.elicit.elicit_api, operation, records)
+        name = record_name(operation)
+        return decoding.decode_data(records, decode, name,
+                                    decoding.response_decoder(self.elicit.elicit_api, operation, decode, name))
@@ -0,0 +1,99 @@
+"""
+Adaptive page sizes for find_* calls that don't give a page_size.
+
+A PageSizer starts every find operation at INITIAL_PAGE_SIZE records a page. After each full page it doubles the size
+while pages take less than half the target latency, and halves it (down to MIN_PAGE_SIZE) when one takes longer than
+the target. The size never exceeds the largest page the server allows. That limit comes from the `maximum` of the
+operation's page_size parameter in the swagger definition. Without one, the limit is found by probing: a first page
+shorter than requested, while more pages follow, shows the server's own cap. Sizes are kept per operation, so later
+calls start where the earlier ones left off.
+"""
+import threading
+
+INITIAL_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+PAGE_LATENCY_TARGET = 1.0
+
+
+class PageSizer:
+    """
+    Page size per find operation, adapted to the latency of the pages and the server's page size limit
+    """
+    def __init__(self, elicit_api=None, initial=INITIAL_PAGE_SIZE, minimum=MIN_PAGE_SIZE, maximum=MAX_PAGE_SIZE,
+                 target_latency=PAGE_LATENCY_TARGET, growth=2):
+        """
+        Initialize
+        :param elicit_api: ElicitApi whose swagger definition gives the page_size maximum of each operation, if any
+        :param initial: Page size of an operation's first request
+        :param minimum: Smallest page size slow pages shrink it to
+        :param maximum: Largest page size requested when the server declares no limit
+        :param target_latency: Seconds a page may take before the page size shrinks
+        :param growth: Factor the page size grows or shrinks by
+        :return: returns nothing
+        """
+        self.elicit_api = elicit_api
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.growth = growth
+        self.lock = threading.Lock()
+        self.sizes = {}
+        self.limits = {}
+
+    def limit(self, operation):
+        """
+        The server's page size limit for operation, None while it is unknown
+        """
+        with self.lock:
+            if operation not in self.limits:
+                self.limits[operation] = self.declared_limit(operation)
+            return self.limits[operation]
+
+    def declared_limit(self, operation):
+        if self.elicit_api is None or not hasattr(self.elicit_api, 'parameter_maximum'):
+            return None
+        maximum = self.elicit_api.parameter_maximum(operation, 'page_size')
+        return int(maximum) if maximum else None
+
+    def set_limit(self, operation, limit):
+        """
+        Record the page size the server capped a page of operation to
+        """
+        with self.lock:
+            self.limits[operation] = limit
+            self.sizes[operation] = min(self.sizes.get(operation, limit), limit)
+
+    def ceiling(self, operation):
+        return min(self.limit(operation) or self.maximum, self.maximum)
+
+    def page_size(self, operation):
+        """
+        Page size for the next request of operation
+        """
+        ceiling = self.ceiling(operation)
+        with self.lock:
+            return min(self.sizes.get(operation, self.initial), ceiling)
+
+    def observe(self, operation, page_size, latency):
+        """
+        Adapt operation's page size to a full page of page_size records that took latency seconds
+        :return: the new page size
+        """
+        if latency > self.target_latency:
+            new_size = max(min(self.minimum, page_size), page_size // self.growth)
+        elif latency < self.target_latency / 2:
+            new_size = min(page_size * self.growth, self.ceiling(operation))
+        else:
+            new_size = page_size
+        with self.lock:
+            self.sizes[operation] = new_size
+        return new_size
+
+    def can_grow(self, operation):
+        """
+        Whether a listing may switch to a larger page size part way through: only below a known limit, as pages
+        past an unknown cap would be numbered differently by the server
+        """
+        return self.limit(operation) is not None
@@ -0,0 +1,171 @@
+"""
+Local index of the users available as study participants, by role.
+
+Picking participants used to page through every user. The index asks findUsers for one role at a time (filtered on
+the server when the API supports it) and only fetches as many pages as the picks need. Users created through
+ensure_users are added to it directly, and refresh() picks up users created elsewhere. With a path, the index is
+saved as JSON and reused by later sessions.
+"""
+import json
+import os
+from pathlib import Path
+from .elicit import fetch, page_links, record_field, USER_PAGE_SIZE
+
+
+class Participant(dict):
+    """
+    A user record whose fields can also be read as attributes, like the pyswagger models of find_users
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def plain(value):
+    """A user as the JSON the index is saved as: pyswagger models, records and dates converted to dicts and strings"""
+    if isinstance(value, dict):
+        return {name: plain(field) for name, field in value.items()}
+    if hasattr(value, '_asdict'):
+        # decoded tuple or record
+        return plain(value._asdict())
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    if hasattr(value, 'to_json'):
+        # pyswagger Date and Datetime
+        return value.to_json()
+    return value
+
+
+def eligible(user, role):
+    """Whether user can take part as role: anonymous Mechanical Turk users are kept for MTurk studies"""
+    if record_field(user, 'role') != role:
+        return False
+    return not (role == 'anonymous_user' and 'mturk' in (record_field(user, 'email') or ''))
+
+
+class ParticipantIndex:
+    """
+    Users by role, filled page by page from findUsers.
+
+    Each listing (one per role when findUsers filters by role, else a single one for all users) keeps a cursor: the
+    next page to fetch, and whether the last page was reached. As users are listed in id order, refresh() restarts a
+    finished listing from its last, possibly partial, page to find users created since.
+    """
+    def __init__(self, elicit, path=None, page_size=USER_PAGE_SIZE):
+        """
+        Initialize
+        :param elicit: Elicit session the users are fetched with
+        :param path: JSON file the index is loaded from and saved to (default: in memory only)
+        :param page_size: Users fetched per request
+        :return: returns nothing
+        """
+        self.elicit = elicit
+        self.path = Path(path) if path else None
+        self.page_size = page_size
+        self.filter_by_role = elicit.elicit_api.has_parameter('findUsers', 'role')
+        self.pools = {}
+        self.cursors = {}
+        self.load()
+
+    def load(self):
+        if self.path is None or not self.path.is_file():
+            return
+        saved = json.loads(self.path.read_text())
+        if saved.get('page_size') != self.page_size or saved.get('filter_by_role') != self.filter_by_role:
+            return
+        self.pools = {role: {user['id']: Participant(user) for user in users} for role, users in saved['pools'].items()}
+        self.cursors = saved['cursors']
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix('.tmp')
+        temporary_path.write_text(json.dumps(dict(page_size=self.page_size,
+                                                  filter_by_role=self.filter_by_role,
+                                                  pools={role: list(users.values()) for role, users in self.pools.items()},
+                                                  cursors=self.cursors)))
+        os.replace(temporary_path, self.path)
+
+    def listing(self, role):
+        return role if self.filter_by_role else '*'
+
+    def cursor(self, role):
+        return self.cursors.setdefault(self.listing(role), dict(next_page=1, complete=False))
+
+    def pool(self, role):
+        return self.pools.setdefault(role, {})
+
+    def insert(self, user):
+        user = plain(user)
+        self.pool(user['role'])[user['id']] = Participant(user)
+
+    def add(self, users):
+        """
+        Add users created in this session, e.g. by ensure_users, to their roles' pools; None (failed) entries are skipped
+        """
+        for user in users:
+            if user is not None:
+                self.insert(user)
+        self.save()
+
+    def fetch_page(self, role):
+        """
+        Fetch the next page of role's listing into the pools
+        :return: number of users fetched
+        """
+        cursor = self.cursor(role)
+        args = dict(page=cursor['next_page'], page_size=self.page_size)
+        if self.filter_by_role:
+            args['role'] = role
+        # plain dicts, as saved in the index, whatever the session's decode mode
+        decode_opt = self.elicit.decode_opt(dict(decode='dict'))
+        resp, users = fetch(self.elicit.client, self.elicit.elicit_api, 'findUsers', args, **decode_opt)
+        for user in users:
+            self.insert(user)
+
+        next_link = len(users) > 0 and page_links(resp, self.page_size, None, len(users))[0]
+        if next_link:
+            cursor['next_page'] += 1
+        else:
+            # the last page may still grow, so a refresh starts from it
+            cursor.update(complete=True, next_page=cursor['next_page'] if users else max(1, cursor['next_page'] - 1))
+        return len(users)
+
+    def pick(self, role, count, exclude=()):
+        """
+        Up to count users eligible for role, skipping the ids in exclude, fetching pages only until there are enough
+        """
+        exclude = set(exclude)
+        fetched = False
+        while True:
+            users = [user for user_id, user in self.pool(role).items()
+                     if user_id not in exclude and eligible(user, role)]
+            if len(users) >= count or self.cursor(role)['complete']:
+                break
+            self.fetch_page(role)
+            fetched = True
+        if fetched:
+            self.save()
+        return users[:count]
+
+    def refresh(self, role=None):
+        """
+        Fetch the users created since role's listing (or every listing) was last read to its end
+        :return: number of users added to the index
+        """
+        before = len(self)
+        roles = [role] if role is not None else list(self.pools)
+        # one role per listing, as they all share one when the server doesn't filter by role
+        for role in {self.listing(role): role for role in roles}.values():
+            cursor = self.cursor(role)
+            cursor['complete'] = False
+            while not cursor['complete']:
+                self.fetch_page(role)
+        self.save()
+        return len(self) - before
+
+    def __len__(self):
+        return sum(len(pool) for pool in self.pools.values())
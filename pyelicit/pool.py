@@ -0,0 +1,170 @@
+"""
+A thread-safe pool of Elicit sessions for long-running services.
+
+Building an Elicit loads the swagger definition, resolves a pyswagger App, opens a connection pool and logs in. An
+ElicitPool does the first three once per API URL (backend) and hands out one session per set of credentials, so a new
+user context only costs a token lookup (or a login, the first time its token is needed). All the sessions of a
+backend share its connections and a cap on the requests in flight.
+
+    pool = ElicitPool(dict(api_url='https://elicit-experiment.com', send_opt=dict(verify=True), max_in_flight=16))
+
+    def handle(request):
+        elicit = pool.session(request.user, request.password)
+        return elicit.find_study_definitions(decode='dict')
+"""
+import collections
+import hashlib
+import threading
+import types
+from . import api
+from .elicit import (Elicit, create_elicit_api, create_spec_cache, create_http_opt, create_cache_backend,
+                     create_metrics, create_scheduler)
+
+MAX_SESSIONS = 256
+
+
+class Backend:
+    """
+    What the sessions of one API URL share: the resolved App, the HTTPAdapter with its connection pool and the
+    api.RequestScheduler capping the requests in flight (and their rate, with rate_limit)
+    """
+    def __init__(self, app, adapter, limiter):
+        self.app = app
+        self.adapter = adapter
+        self.limiter = limiter
+
+
+class ElicitPool:
+    """
+    Elicit sessions keyed by API URL and credentials, created on first use and kept (up to max_sessions, least
+    recently used first out) for reuse from any thread.
+
+    The configuration is the one Elicit takes; its max_in_flight and rate_limit apply to each backend, max_in_flight
+    defaulting to the connection pool_size. Its credentials, if any, are the defaults of session(). Request metrics
+    and the response cache backend are shared by all sessions; the cached responses of different users are kept apart.
+    """
+    def __init__(self, configuration, max_sessions=MAX_SESSIONS):
+        if not isinstance(configuration, dict):
+            configuration = vars(configuration)
+        self.configuration = dict(configuration)
+        script_args = types.SimpleNamespace(**self.configuration)
+        self.max_in_flight = (getattr(script_args, 'max_in_flight', None) or
+                              api.ElicitClient.merge_http_opt(create_http_opt(script_args))['pool_size'])
+        self.max_sessions = max_sessions
+
+        self.metrics = create_metrics(script_args)
+        self.cache_backend = (create_cache_backend(script_args)
+                              if getattr(script_args, 'cache_ttl', None) is not None else None)
+
+        self.lock = threading.Lock()
+        self.backends = {}
+        self.sessions = collections.OrderedDict()
+        # creating a backend or session can take a while; only callers needing the same one wait for it
+        self.creation_locks = collections.defaultdict(threading.Lock)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def backend(self, api_url):
+        """
+        The Backend for api_url, loading its swagger definition the first time
+        """
+        with self.lock:
+            backend = self.backends.get(api_url)
+            creation_lock = self.creation_locks[('backend', api_url)]
+        if backend is not None:
+            return backend
+
+        with creation_lock:
+            with self.lock:
+                backend = self.backends.get(api_url)
+            if backend is None:
+                script_args = types.SimpleNamespace(**dict(self.configuration, api_url=api_url))
+                app = create_spec_cache(script_args).load_app(api_url + api.ElicitApi.SWAGGER_PATH)
+                http_opt = create_http_opt(script_args)
+                # enough connections for every request in flight
+                http_opt['pool_size'] = max(self.max_in_flight, http_opt['pool_size'] or 0)
+                backend = Backend(app, api.ElicitClient.create_adapter(http_opt),
+                                  create_scheduler(script_args, self.max_in_flight))
+                with self.lock:
+                    self.backends[api_url] = backend
+        return backend
+
+    @staticmethod
+    def session_key(configuration):
+        # the secrets are part of the key, so a session is only handed to callers that know them
+        secrets = hashlib.sha256(repr((configuration['password'], configuration['client_secret'])).encode('utf-8'))
+        return (configuration['api_url'].rstrip('/'), configuration['user'], configuration['client_id'],
+                secrets.hexdigest())
+
+    def session(self, user=None, password=None, client_id=None, client_secret=None, api_url=None):
+        """
+        The Elicit session for these credentials (default: the pool configuration's), creating it on first use
+        """
+        overrides = dict(user=user, password=password, client_id=client_id, client_secret=client_secret,
+                         api_url=api_url)
+        configuration = dict(self.configuration, **{k: v for k, v in overrides.items() if v is not None})
+        creds = api.ElicitCreds.from_env(configuration)
+        if creds is None or configuration.get('api_url') is None:
+            raise Exception("Credentials not found")
+
+        key = self.session_key(configuration)
+        with self.lock:
+            elicit = self.sessions.get(key)
+            if elicit is not None:
+                self.sessions.move_to_end(key)
+                return elicit
+            creation_lock = self.creation_locks[('session', key)]
+
+        with creation_lock:
+            with self.lock:
+                elicit = self.sessions.get(key)
+            if elicit is None:
+                elicit = self.create_session(creds, configuration)
+                with self.lock:
+                    self.sessions[key] = elicit
+                    while len(self.sessions) > self.max_sessions:
+                        evicted, _ = self.sessions.popitem(last=False)
+                        self.creation_locks.pop(('session', evicted), None)
+        return elicit
+
+    def create_session(self, creds, configuration):
+        backend = self.backend(configuration['api_url'])
+        script_args = types.SimpleNamespace(**configuration)
+        elicit_api = create_elicit_api(creds, script_args, app=backend.app, adapter=backend.adapter,
+                                       limiter=backend.limiter, metrics=self.metrics, cache_backend=self.cache_backend)
+        return Elicit(configuration, elicit_api)
+
+    def metrics_summary(self):
+        """
+        Per-operation report of the requests made by every session of the pool
+        """
+        return self.metrics.summary()
+
+    def scheduler_stats(self):
+        """
+        {api_url: queue depth and throttling counters of its scheduler}, see api.RequestScheduler.stats
+        """
+        with self.lock:
+            backends = dict(self.backends)
+        return {api_url: backend.limiter.stats() for api_url, backend in backends.items()}
+
+    def close(self):
+        """
+        Drop the sessions, close the shared connection pools and the metrics sinks
+        """
+        with self.lock:
+            self.sessions.clear()
+            backends = list(self.backends.values())
+            self.backends.clear()
+        for backend in backends:
+            backend.adapter.close()
+        if hasattr(self.cache_backend, 'close'):
+            self.cache_backend.close()
+        self.metrics.close()
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,156 @@
+"""
+Prepared requests: add* payloads serialized once and sent many times.
+
+A payload is encoded to JSON bytes when it is prepared, with its definition_data encoded once along the way. Values
+that change from one request to the next, such as the id of the trial a component belongs to, are left as `Slot`
+placeholders and stamped into the bytes when the request is sent, without walking or re-encoding the rest of the
+payload. Slots may also appear inside definition_data.
+
+    component = elicit.prepare('addComponent',
+                               component=dict(name='Question', definition_data=dict(Instruments=[...],
+                                                                                     TrialId=Slot('trial'))))
+    for trial in trials:
+        elicit.add_prepared(component, values=dict(trial=trial.id), study_definition_id=study.id, ...,
+                            trial_definition_id=trial.id)
+"""
+import json
+import re
+from pyswagger.io import Request, Response
+from pyswagger.utils import final
+from .api.operations import CompiledOperation, compile_operations
+
+SLOT_MARKER = '__pyelicit_slot_%s__'
+SLOT_PATTERN = re.compile(r'(\\*)"__pyelicit_slot_(\w+)__\\*"')
+
+
+class Slot:
+    """
+    Placeholder for a value given when a prepared payload is sent
+    """
+    def __init__(self, name):
+        if not re.fullmatch(r'\w+', name):
+            raise ValueError('Slot names are made of letters, digits and underscores: %r' % name)
+        self.name = name
+
+    def __repr__(self):
+        return "Slot(%r)" % self.name
+
+
+def encode_definition_data(body):
+    """
+    A copy of body with a dict definition_data (and any Slot in it) encoded to its JSON string, whether it is in body
+    itself or in the object body wraps, e.g. dict(component=dict(definition_data=...))
+    """
+    if not isinstance(body, dict):
+        return body
+    if isinstance(body.get('definition_data'), (dict, list)):
+        return dict(body, definition_data=json.dumps(with_markers(body['definition_data'])))
+    return {name: encode_definition_data(value) for name, value in body.items()}
+
+
+def with_markers(value):
+    if isinstance(value, Slot):
+        return SLOT_MARKER % value.name
+    if isinstance(value, dict):
+        return {k: with_markers(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [with_markers(v) for v in value]
+    return value
+
+
+def stamp_value(value, level):
+    """JSON for value, escaped once for every level of JSON string it is nested in"""
+    encoded = json.dumps(value)
+    for _ in range(level):
+        encoded = json.dumps(encoded)[1:-1]
+    return encoded.encode('utf-8')
+
+
+class PreparedPayload:
+    """
+    The body of one operation serialized to JSON bytes, split around its slots
+    """
+    def __init__(self, app, operation, **args):
+        """
+        Initialize
+        :param app: pyswagger App the operation is taken from
+        :param operation: Operation id, e.g. 'addComponent'
+        :param args: The operation's body argument, and optionally default values for its other parameters
+        :return: returns nothing
+        """
+        self.operation = operation
+        self.op = app.op[operation]
+        self.compiled = compile_operations(app).get(operation) or CompiledOperation(self.op)
+        self.parameters = {parameter.name: parameter for parameter in map(final, self.op.parameters)}
+        body_names = [name for name, parameter in self.parameters.items() if getattr(parameter, 'in') == 'body']
+        if len(body_names) != 1:
+            raise ValueError('%s does not take a body' % operation)
+        self.body_name = body_names[0]
+
+        unknown = set(args) - set(self.parameters)
+        if unknown:
+            raise ValueError('Unknown parameters: {0}'.format(unknown))
+        if self.body_name not in args:
+            raise ValueError('requires parameter: ' + self.body_name)
+        self.defaults = {name: value for name, value in args.items() if name != self.body_name}
+        self.content_type = self.op.consumes[0] if self.op.consumes else 'application/json'
+
+        body = with_markers(encode_definition_data(args[self.body_name]))
+        self.segments = self.split(json.dumps(body))
+        self.slots = {name for _, name, _ in self.segments if name is not None}
+        self.validated = False
+
+    @staticmethod
+    def split(text):
+        """[(bytes, slot name or None, nesting level)] making up text, one slot after each chunk"""
+        segments = []
+        position = 0
+        for match in SLOT_PATTERN.finditer(text):
+            level = (len(match.group(1)) + 1).bit_length() - 1
+            segments.append((text[position:match.start()].encode('utf-8'), match.group(2), level))
+            position = match.end()
+        segments.append((text[position:].encode('utf-8'), None, 0))
+        return segments
+
+    def stamp(self, **values):
+        """
+        The body with values filled into its slots. The first stamped body is validated against the swagger definition.
+        """
+        missing = self.slots - set(values)
+        if missing:
+            raise ValueError('Missing values for slots: {0}'.format(missing))
+        data = b''.join(chunk + (stamp_value(values[name], level) if name is not None else b'')
+                        for chunk, name, level in self.segments)
+        if not self.validated:
+            self.validate(json.loads(data))
+        return data
+
+    def validate(self, body):
+        # raises ValueError like any pyswagger call with a body that doesn't match the schema
+        self.parameters[self.body_name]._prim_(body, self.op._prim_factory, ctx=dict(read=False))
+        self.validated = True
+
+    def request(self, values=None, **args):
+        """
+        (req, resp) pair for client.request, sending the stamped body as it is
+        """
+        if self.body_name in args:
+            raise ValueError('%s is part of the prepared body' % self.body_name)
+        params = self.compiled.params(dict(self.defaults, **args), body=False)
+        return PreparedRequest(self.op, params, self.stamp(**(values or {})), self.content_type), Response(self.op)
+
+
+class PreparedRequest(Request):
+    """
+    pyswagger Request whose body is already encoded
+    """
+    def __init__(self, op, params, data, content_type):
+        super(PreparedRequest, self).__init__(op, params)
+        self.prepared_data = data
+        self.content_type = content_type
+
+    def prepare(self, scheme='http', handle_files=True, encoding='utf-8'):
+        super(PreparedRequest, self).prepare(scheme, handle_files, encoding)
+        self._Request__data = self.prepared_data
+        self._Request__header['Content-Type'] = self.content_type
+        return self
@@ -0,0 +1,240 @@
+import json
+import time
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http import HTTPStatus
+from .elicit import fetch, in_caller_context, encode_definition_data
+
+
+class Task:
+    """
+    One object to create: `make_args` builds the operation's arguments from the objects created by `deps`.
+    """
+    def __init__(self, key, operation, make_args, deps=()):
+        self.key = key
+        self.operation = operation
+        self.make_args = make_args
+        self.deps = list(deps)
+
+    def __repr__(self):
+        return "Task(%s %s)" % (self.operation, '/'.join(map(str, self.key)))
+
+
+class BuildSummary:
+    def __init__(self, objects, failures, skipped, elapsed):
+        self.objects = objects
+        self.failures = failures
+        self.skipped = skipped
+        self.elapsed = elapsed
+        self.created = Counter(operation for operation, _ in objects.values())
+
+    @property
+    def study(self):
+        created = self.objects.get(('study',))
+        return created[1] if created else None
+
+    def object(self, *key):
+        """
+        The object created for key, e.g. object('study', 'protocol', 0, 'phase', 0, 'trial', 3)
+        """
+        created = self.objects.get(key)
+        return created[1] if created else None
+
+    def ok(self):
+        return not self.failures
+
+    def __str__(self):
+        lines = ["Created %d objects in %.1fs:" % (sum(self.created.values()), self.elapsed)]
+        lines += ["    %s: %d" % (operation, count) for operation, count in sorted(self.created.items())]
+        if self.failures:
+            lines.append("%d failed, %d skipped as a result:" % (len(self.failures), len(self.skipped)))
+            lines += ["    %r: %r" % (task, error) for task, error in self.failures]
+        return "\n".join(lines)
+
+
+def encode(definition_data):
+    return definition_data if isinstance(definition_data, str) else json.dumps(definition_data)
+
+
+class StudyBuilder:
+    """
+    Create a whole study definition from a declarative tree, planning it as a dependency DAG so that independent
+    siblings (all phases of a protocol, all trials of a phase, all components of a trial) are created concurrently.
+
+    The tree is:
+
+        dict(study_definition={...},
+             protocols=[dict(protocol_definition={...},
+                             phases=[dict(phase_definition={...},
+                                          trials=[dict(trial_definition={...}, components=[{...}, ...]), ...])])])
+
+    `trials` may also be a list of component lists, as returned by load_trial_definitions. Components without a
+    `definition_data` key are taken to be the definition data itself. Each phase gets a trial order of its trials
+    and each protocol a phase order of its phases, unless `trial_order`/`phase_order` is False on that node.
+    definition_data is JSON-encoded on every node that carries one, as add_object does.
+    """
+    def __init__(self, elicit, max_workers=None):
+        self.elicit = elicit
+        self.max_workers = max_workers or elicit.concurrency()
+
+    def plan(self, tree):
+        tasks = []
+        study_key = ('study',)
+        tasks.append(Task(study_key, 'addStudy',
+                          lambda created: dict(study=dict(study_definition=tree['study_definition']))))
+
+        for protocol_index, protocol in enumerate(tree.get('protocols', [])):
+            tasks += self.plan_protocol(study_key + ('protocol', protocol_index), study_key, protocol)
+
+        return tasks
+
+    def plan_protocol(self, key, study_key, protocol):
+        def make_args(created):
+            study_definition_id = created[study_key].id
+            return dict(protocol_definition=dict(protocol_definition=dict(protocol['protocol_definition'],
+                                                                          study_definition_id=study_definition_id)),
+                        study_definition_id=study_definition_id)
+
+        tasks = [Task(key, 'addProtocolDefinition', make_args, [study_key])]
+
+        phase_keys = []
+        for phase_index, phase in enumerate(protocol.get('phases', [])):
+            phase_key = key + ('phase', phase_index)
+            phase_keys.append(phase_key)
+            tasks += self.plan_phase(phase_key, study_key, key, phase)
+
+        if phase_keys and protocol.get('phase_order', True):
+            def make_phase_order_args(created):
+                ids = dict(study_definition_id=created[study_key].id, protocol_definition_id=created[key].id)
+                sequence_data = ",".join(str(created[phase_key].id) for phase_key in phase_keys)
+                return dict(phase_order=dict(phase_order=dict(ids, sequence_data=sequence_data, user_id=None)), **ids)
+
+            tasks.append(Task(key + ('phase_order',), 'addPhaseOrder', make_phase_order_args, phase_keys))
+
+        return tasks
+
+    def plan_phase(self, key, study_key, protocol_key, phase):
+        phase_definition = dict(phase.get('phase_definition', {}))
+        if 'definition_data' in phase_definition:
+            phase_definition['definition_data'] = encode(phase_definition['definition_data'])
+
+        def path_ids(created):
+            return dict(study_definition_id=created[study_key].id, protocol_definition_id=created[protocol_key].id)
+
+        def make_args(created):
+            ids = path_ids(created)
+            return dict(phase_definition=dict(phase_definition=dict(phase_definition, **ids)), **ids)
+
+        tasks = [Task(key, 'addPhaseDefinition', make_args, [study_key, protocol_key])]
+
+        trial_keys = []
+        for trial_index, trial in enumerate(phase.get('trials', [])):
+            trial_key = key + ('trial', trial_index)
+            trial_keys.append(trial_key)
+            tasks += self.plan_trial(trial_key, (study_key, protocol_key, key), trial)
+
+        if trial_keys and phase.get('trial_order', True):
+            def make_trial_order_args(created):
+                ids = dict(path_ids(created), phase_definition_id=created[key].id)
+                sequence_data = ",".join(str(created[trial_key].id) for trial_key in trial_keys)
+                return dict(trial_order=dict(trial_order=dict(ids, sequence_data=sequence_data, user_id=None)), **ids)
+
+            tasks.append(Task(key + ('trial_order',), 'addTrialOrder', make_trial_order_args, [key] + trial_keys))
+
+        return tasks
+
+    def plan_trial(self, key, parent_keys, trial):
+        study_key, protocol_key, phase_key = parent_keys
+        if not isinstance(trial, dict):
+            trial = dict(components=trial)
+        trial_definition = dict(trial.get('trial_definition', {}))
+        if 'definition_data' in trial_definition:
+            trial_definition['definition_data'] = encode(trial_definition['definition_data'])
+
+        def path_ids(created):
+            return dict(study_definition_id=created[study_key].id,
+                        protocol_definition_id=created[protocol_key].id,
+                        phase_definition_id=created[phase_key].id)
+
+        def make_args(created):
+            ids = path_ids(created)
+            return dict(trial_definition=dict(trial_definition=dict(trial_definition, **ids)), **ids)
+
+        tasks = [Task(key, 'addTrialDefinition', make_args, parent_keys)]
+
+        for component_index, component in enumerate(trial.get('components', [])):
+            if 'definition_data' not in component:
+                component = dict(name='Component %d' % component_index, definition_data=component)
+            component = dict(component, definition_data=encode(component['definition_data']))
+
+            def make_component_args(created, component=component):
+                ids = dict(path_ids(created), trial_definition_id=created[key].id)
+                return dict(component=dict(component=dict(component, **ids)), **ids)
+
+            tasks.append(Task(key + ('component', component_index), 'addComponent', make_component_args,
+                              list(parent_keys) + [key]))
+
+        return tasks
+
+    def run(self, tree):
+        """
+        Create the study tree, returning a BuildSummary. Objects whose parents failed are skipped, not attempted.
+        """
+        return self.execute(self.plan(tree))
+
+    def execute(self, tasks):
+        start = time.time()
+        client, elicit_api = self.elicit.client, self.elicit.elicit_api
+        objects = {}
+        failures = []
+        skipped = []
+        waiting_on = {task.key: set(task.deps) for task in tasks}
+        dependents = defaultdict(list)
+        for task in tasks:
+            for dep in task.deps:
+                dependents[dep].append(task)
+
+        def create(task, args):
+            return fetch(client, elicit_api, task.operation, encode_definition_data(args),
+                         expected=HTTPStatus.CREATED)[1]
+
+        def skip(task):
+            for dependent in dependents[task.key]:
+                if dependent.key in waiting_on:
+                    del waiting_on[dependent.key]
+                    skipped.append(dependent)
+                    skip(dependent)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            created = {}
+
+            def submit(task):
+                del waiting_on[task.key]
+                return executor.submit(in_caller_context(create), task, task.make_args(created))
+
+            running = {submit(task): task for task in tasks if not task.deps}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        created[task.key] = future.result()
+                    except Exception as e:
+                        failures.append((task, e))
+                        skip(task)
+                        continue
+
+                    objects[task.key] = (task.operation, created[task.key])
+                    for dependent in dependents[task.key]:
+                        deps = waiting_on.get(dependent.key)
+                        if deps is None:
+                            continue
+                        deps.discard(task.key)
+                        if not deps:
+                            running[submit(dependent)] = dependent
+
+        summary = BuildSummary(objects, failures, skipped, time.time() - start)
+        pp = self.elicit.pp()
+        if pp:
+            pp.print(str(summary))
+        return summary
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+from .elicit import fetch, page_links
+
+UPDATED_SINCE_PARAMETERS = ('updated_since', 'updated_after', 'since')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    study_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    id TEXT NOT NULL,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (study_id, operation, id)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    study_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    page_size INTEGER NOT NULL,
+    next_page INTEGER NOT NULL DEFAULT 1,
+    watermark TEXT,
+    in_progress INTEGER NOT NULL DEFAULT 0,
+    pass_since TEXT,
+    pass_max_updated TEXT,
+    PRIMARY KEY (study_id, operation)
+);
+"""
+
+
+class SyncResult:
+    def __init__(self, operation, study_id):
+        self.operation = operation
+        self.study_id = study_id
+        self.pages = 0
+        self.fetched = 0
+        self.inserted = 0
+        self.updated = 0
+
+    def __repr__(self):
+        return "SyncResult(%s study %s: %d pages, %d fetched, %d new, %d updated)" % (
+            self.operation, self.study_id, self.pages, self.fetched, self.inserted, self.updated)
+
+
+class CheckpointStore:
+    """
+    SQLite copy of synced records plus a checkpoint per (study, operation).
+
+    Every page is merged and its checkpoint advanced in one transaction, so an interrupted sync resumes from the
+    first page it had not finished.
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def checkpoint(self, study_id, operation):
+        row = self.connection.execute(
+            "SELECT page_size, next_page, watermark, in_progress, pass_since, pass_max_updated FROM checkpoints "
+            "WHERE study_id = ? AND operation = ?", (str(study_id), operation)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['page_size', 'next_page', 'watermark', 'in_progress', 'pass_since', 'pass_max_updated'], row))
+
+    def save_page(self, study_id, operation, records, checkpoint, result):
+        with self.connection:
+            for record in records:
+                record_id = str(record['id'])
+                updated_at = record.get('updated_at')
+                existing = self.connection.execute(
+                    "SELECT updated_at FROM records WHERE study_id = ? AND operation = ? AND id = ?",
+                    (str(study_id), operation, record_id)).fetchone()
+                if existing is None:
+                    result.inserted += 1
+                elif existing[0] != updated_at or updated_at is None:
+                    result.updated += 1
+                else:
+                    continue
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO records (study_id, operation, id, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (str(study_id), operation, record_id, updated_at, json.dumps(record)))
+            self.save_checkpoint(study_id, operation, checkpoint)
+
+    def save_checkpoint(self, study_id, operation, checkpoint):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (study_id, operation, page_size, next_page, watermark, "
+                "in_progress, pass_since, pass_max_updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(study_id), operation, checkpoint['page_size'], checkpoint['next_page'], checkpoint['watermark'],
+                 int(checkpoint['in_progress']), checkpoint['pass_since'], checkpoint['pass_max_updated']))
+
+    def records(self, study_id, operation):
+        rows = self.connection.execute(
+            "SELECT data FROM records WHERE study_id = ? AND operation = ? ORDER BY CAST(id AS INTEGER), id",
+            (str(study_id), operation))
+        return [json.loads(data) for (data,) in rows]
+
+
+class StudySync:
+    """
+    Incrementally sync find_* results (findStudyResults, findExperiments, findStages, findTrialResults, ...) for a
+    study into a local CheckpointStore.
+
+    When the operation accepts an updated-since parameter, each pass only asks for records updated since the last
+    completed pass (the watermark). Otherwise pages are assumed to be ordered by id and each pass restarts from the
+    last, possibly partial, page it saw, so only new records are downloaded.
+    """
+    def __init__(self, elicit, path, page_size=100):
+        self.elicit = elicit
+        self.store = CheckpointStore(path)
+        self.page_size = page_size
+
+    def close(self):
+        self.store.close()
+
+    def records(self, operation, study_id):
+        return self.store.records(study_id, operation)
+
+    def sync(self, operation, study_id, **args):
+        """
+        Fetch what changed since the last sync of operation for study_id and merge it into the local copy
+        :param operation: find operation, e.g. 'findTrialResults'
+        :param study_id: key of the checkpoint (typically the study definition id)
+        :param args: arguments selecting the study's records, e.g. study_definition_id=...
+        :return: SyncResult
+        """
+        result = SyncResult(operation, study_id)
+        elicit_api = self.elicit.elicit_api
+        pp = self.elicit.pp()
+        since_parameter = next((name for name in UPDATED_SINCE_PARAMETERS
+                                if elicit_api.has_parameter(operation, name)), None)
+
+        checkpoint = self.store.checkpoint(study_id, operation)
+        if checkpoint is None or checkpoint['page_size'] != self.page_size:
+            checkpoint = dict(page_size=self.page_size, next_page=1, watermark=None, in_progress=False,
+                              pass_since=None, pass_max_updated=None)
+
+        if not checkpoint['in_progress']:
+            checkpoint.update(in_progress=True, pass_since=checkpoint['watermark'], pass_max_updated=None)
+            if since_parameter:
+                checkpoint['next_page'] = 1
+
+        if since_parameter and checkpoint['pass_since']:
+            args = dict(args, **{since_parameter: checkpoint['pass_since']})
+
+        page = checkpoint['next_page']
+        while True:
+            resp, records = fetch(self.elicit.client, elicit_api, operation,
+                                  dict(args, page=page, page_size=self.page_size), decode='dict')
+            result.pages += 1
+            result.fetched += len(records)
+
+            for record in records:
+                updated_at = record.get('updated_at')
+                pass_max_updated = checkpoint['pass_max_updated']
+                if updated_at and (pass_max_updated is None or updated_at > pass_max_updated):
+                    checkpoint['pass_max_updated'] = updated_at
+
+            next_link = False
+            if len(records) > 0:
+                next_link, _ = page_links(resp, self.page_size, pp, len(records))
+
+            if next_link:
+                page += 1
+                checkpoint['next_page'] = page
+            else:
+                # pass complete; in id order the last page may still grow, so it is where the next pass starts
+                watermarks = [checkpoint['watermark'], checkpoint['pass_max_updated']]
+                checkpoint.update(next_page=page if len(records) > 0 else max(1, page - 1),
+                                  watermark=max(filter(None, watermarks), default=None),
+                                  in_progress=False, pass_since=None, pass_max_updated=None)
+
+            self.store.save_page(study_id, operation, records, checkpoint, result)
+            if not next_link:
+                break
+
+        if pp is not None:
+            pp.print(repr(result))
+        return result
@@ -0,0 +1,3 @@
+from .mock_server import *
+
+__all__ = ['mock_server']
@@ -0,0 +1,470 @@
+"""
+Local stand-in for the Elicit API, for tests and benchmarks that must not touch a real server.
+
+MockElicitServer serves a swagger.json describing the endpoints it implements: the OAuth token endpoint,
+getCurrentUser, paginated findUsers/findDataPoints/findTimeSeries (with Link headers and ETags like the real server)
+and the add* endpoints used to build studies. Find results are generated on the fly, so the dataset size costs no
+memory. The time series files the findTimeSeries records point to are served too, with Range support.
+"""
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_BASE_PATH = '/api/v1'
+SWAGGER_PATH = '/apidocs/v1/swagger.json'
+TIME_SERIES_FILE_PATH = re.compile(r'^/time_series/(\d+)\.tsv$')
+
+STUDY_PATH = '/study_definitions/{study_definition_id}'
+PROTOCOL_PATH = STUDY_PATH + '/protocol_definitions/{protocol_definition_id}'
+PHASE_PATH = PROTOCOL_PATH + '/phase_definitions/{phase_definition_id}'
+TRIAL_PATH = PHASE_PATH + '/trial_definitions/{trial_definition_id}'
+
+# operationId: (path, body parameter, definition)
+ADD_OPERATIONS = {
+    'addUser': ('/users', 'user', 'User'),
+    'addStudy': ('/study_definitions', 'study', 'StudyDefinition'),
+    'addProtocolDefinition': (STUDY_PATH + '/protocol_definitions', 'protocol_definition', 'ProtocolDefinition'),
+    'addPhaseDefinition': (PROTOCOL_PATH + '/phase_definitions', 'phase_definition', 'PhaseDefinition'),
+    'addTrialDefinition': (PHASE_PATH + '/trial_definitions', 'trial_definition', 'TrialDefinition'),
+    'addComponent': (TRIAL_PATH + '/components', 'component', 'Component'),
+    'addTrialOrder': (PHASE_PATH + '/trial_orders', 'trial_order', 'TrialOrder'),
+    'addPhaseOrder': (PROTOCOL_PATH + '/phase_orders', 'phase_order', 'PhaseOrder'),
+    'addProtocolUser': (PROTOCOL_PATH + '/users', 'protocol_user', 'ProtocolUser'),
+}
+
+# operationId: (path, definition, filter parameters)
+FIND_OPERATIONS = {
+    'findUsers': ('/users', 'User', ['role', 'email']),
+    'findStudyDefinitions': ('/study_definitions', 'StudyDefinition', []),
+    'findDataPoints': ('/data_points', 'DataPoint', ['study_definition_id', 'study_result_id', 'stage_id']),
+    'findTimeSeries': ('/time_series', 'TimeSeries', ['study_definition_id', 'study_result_id', 'stage_id']),
+}
+
+INTEGER = {'type': 'integer'}
+STRING = {'type': 'string'}
+DATE_TIME = {'type': 'string', 'format': 'date-time'}
+
+DEFINITIONS = {
+    'Token': {'access_token': STRING, 'refresh_token': STRING, 'token_type': STRING, 'expires_in': INTEGER,
+              'created_at': INTEGER},
+    'User': {'id': INTEGER, 'username': STRING, 'email': STRING, 'role': STRING, 'anonymous': {'type': 'boolean'},
+             'created_at': DATE_TIME},
+    'DataPoint': {'id': INTEGER, 'study_definition_id': INTEGER, 'study_result_id': INTEGER, 'stage_id': INTEGER, 'component_id': INTEGER,
+                  'point_type': STRING, 'kind': STRING, 'method': STRING, 'value': STRING, 'entity_type': STRING,
+                  'datetime': DATE_TIME},
+    'TimeSeries': {'id': INTEGER, 'study_definition_id': INTEGER, 'study_result_id': INTEGER, 'stage_id': INTEGER, 'component_id': INTEGER,
+                   'series_type': STRING, 'file': {'type': 'object', 'properties': {'url': STRING}},
+                   'created_at': DATE_TIME, 'updated_at': DATE_TIME},
+    'StudyDefinition': {'id': INTEGER, 'title': STRING, 'description': STRING},
+    'ProtocolDefinition': {'id': INTEGER, 'study_definition_id': INTEGER, 'name': STRING},
+    'PhaseDefinition': {'id': INTEGER, 'study_definition_id': INTEGER, 'protocol_definition_id': INTEGER,
+                        'definition_data': STRING},
+    'TrialDefinition': {'id': INTEGER, 'study_definition_id': INTEGER, 'protocol_definition_id': INTEGER,
+                        'phase_definition_id': INTEGER, 'definition_data': STRING},
+    'Component': {'id': INTEGER, 'study_definition_id': INTEGER, 'protocol_definition_id': INTEGER,
+                  'phase_definition_id': INTEGER, 'trial_definition_id': INTEGER, 'name': STRING,
+                  'definition_data': STRING},
+    'TrialOrder': {'id': INTEGER, 'phase_definition_id': INTEGER, 'sequence_data': STRING},
+    'PhaseOrder': {'id': INTEGER, 'protocol_definition_id': INTEGER, 'sequence_data': STRING},
+    'ProtocolUser': {'id': INTEGER, 'user_id': INTEGER, 'protocol_definition_id': INTEGER, 'group_name': STRING},
+}
+
+ROLES = ('registered_user', 'anonymous_user', 'investigator', 'admin')
+USER_CREATED_AT = '2024-01-01T00:00:00.000Z'
+
+
+def ref(definition):
+    return {'$ref': '#/definitions/' + definition}
+
+
+def swagger_definition(host):
+    """
+    The swagger 2.0 definition of the endpoints MockElicitServer implements, for a server at host
+    """
+    authorization = {'name': 'authorization', 'in': 'header', 'type': 'string'}
+
+    def path_parameters(path):
+        return [dict(name=name, type='integer', required=True, **{'in': 'path'})
+                for name in re.findall(r'{(\w+)}', path)]
+
+    paths = {
+        '/oauth/token': {'post': {
+            'operationId': 'getAuthToken',
+            'parameters': [{'name': 'auth_request', 'in': 'body', 'required': True, 'schema': {'type': 'object'}}],
+            'responses': {'200': {'description': 'token', 'schema': ref('Token')}}}},
+        '/users/current': {'get': {
+            'operationId': 'getCurrentUser',
+            'parameters': [authorization],
+            'responses': {'200': {'description': 'user', 'schema': ref('User')}}}},
+        '/users/{id}': {'get': {
+            'operationId': 'findUser',
+            'parameters': [authorization, {'name': 'id', 'in': 'path', 'type': 'string', 'required': True}],
+            'responses': {'200': {'description': 'user', 'schema': ref('User')},
+                          '404': {'description': 'not found'}}}},
+    }
+
+    for operation, (path, definition, filters) in FIND_OPERATIONS.items():
+        parameters = [authorization,
+                      {'name': 'page', 'in': 'query', 'type': 'integer'},
+                      {'name': 'page_size', 'in': 'query', 'type': 'integer'}]
+        parameters += [dict(name=name, type='string' if name in ('role', 'email') else 'integer', **{'in': 'query'})
+                       for name in filters]
+        paths.setdefault(path, {})['get'] = {
+            'operationId': operation,
+            'parameters': parameters,
+            'responses': {'200': {'description': definition, 'schema': {'type': 'array', 'items': ref(definition)}},
+                          '401': {'description': 'unauthorized'}}}
+
+    for operation, (path, body, definition) in ADD_OPERATIONS.items():
+        paths.setdefault(path, {})['post'] = {
+            'operationId': operation,
+            'parameters': [authorization, {'name': body, 'in': 'body', 'required': True, 'schema': {'type': 'object'}}]
+                          + path_parameters(path),
+            'responses': {'201': {'description': definition, 'schema': ref(definition)},
+                          '401': {'description': 'unauthorized'}}}
+
+    return {
+        'swagger': '2.0',
+        'info': {'title': 'Elicit (mock)', 'version': 'v1'},
+        'host': host,
+        'basePath': API_BASE_PATH,
+        'schemes': ['http'],
+        'consumes': ['application/json'],
+        'produces': ['application/json'],
+        'paths': paths,
+        'definitions': {name: {'type': 'object', 'properties': properties}
+                        for name, properties in DEFINITIONS.items()},
+    }
+
+
+class MockElicitServer:
+    """
+    HTTP server implementing enough of the Elicit API to run Elicit against, on 127.0.0.1 and a free port.
+
+    Use as a context manager:
+
+        with MockElicitServer(num_data_points=10000, latency=0.01) as server:
+            elicit = Elicit(server.configuration(spec_cache_dir=tmp_path))
+            data_points = elicit.find_data_points(study_result_id=1, page_size=500)
+    """
+    def __init__(self, num_users=100, num_data_points=1000, num_time_series=100, latency=0.0, max_page_size=None,
+                 value_size=16, token_expires_in=7200, time_series_size=65536, range_requests=True, throttle=0,
+                 link_headers=True):
+        """
+        Initialize
+        :param num_users: Existing users, with roles cycling through ROLES
+        :param num_data_points: Records findDataPoints returns for any query (e.g. for every study)
+        :param num_time_series: Records findTimeSeries returns for any query
+        :param latency: Seconds added to every API request
+        :param max_page_size: Largest page size honoured; larger requests are truncated to it
+        :param value_size: Length of each data point's value, to scale payload sizes
+        :param token_expires_in: Lifetime of the issued tokens in seconds
+        :param time_series_size: Approximate size in bytes of each time series file
+        :param range_requests: Whether time series files are served with HTTP Range support
+        :param throttle: Authorized API requests answered with 429 Too Many Requests (Retry-After: 0) before the
+                         others are served
+        :param link_headers: Whether find responses have a Link header; without, only the Total header paginates them
+        :return: returns nothing
+        """
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.value_size = value_size
+        self.token_expires_in = token_expires_in
+        self.counts = dict(findDataPoints=num_data_points, findTimeSeries=num_time_series)
+        self.time_series_size = time_series_size
+        self.range_requests = range_requests
+        self.throttle = throttle
+        self.link_headers = link_headers
+        self.files = {}
+        self.file_requests = []
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.users = [self.make_user(next(self.ids), ROLES[index % len(ROLES)]) for index in range(num_users)]
+        self.created = {operation: [] for operation in ADD_OPERATIONS}
+        self.tokens = set()
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        self.httpd = None
+        self.thread = None
+        self.swagger = None
+        self.routes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), MockElicitHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.swagger = json.dumps(swagger_definition(self.host)).encode('utf-8')
+        self.routes = self.compile_routes(json.loads(self.swagger))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='MockElicitServer', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join()
+            self.httpd = None
+
+    @property
+    def host(self):
+        return '127.0.0.1:%d' % self.httpd.server_address[1]
+
+    @property
+    def url(self):
+        return 'http://' + self.host
+
+    def configuration(self, **overrides):
+        """
+        Configuration for Elicit/AsyncElicit pointing at this server
+        """
+        return dict(dict(api_url=self.url,
+                         user='pi@elicit.com',
+                         password='password',
+                         client_id='admin_public',
+                         client_secret='secret',
+                         send_opt=dict(verify=False),
+                         debug=False),
+                    **overrides)
+
+    @staticmethod
+    def compile_routes(swagger):
+        routes = []
+        for path, methods in swagger['paths'].items():
+            pattern = re.compile('^' + API_BASE_PATH + re.sub(r'{(\w+)}', r'(?P<\1>[^/]+)', path) + '$')
+            for method, operation in methods.items():
+                routes.append((method.upper(), pattern, operation['operationId']))
+        # literal paths (/users/current) win over templated ones (/users/{id})
+        routes.sort(key=lambda route: route[1].pattern.count('(?P'))
+        return routes
+
+    def route(self, method, path):
+        for route_method, pattern, operation in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                return operation, match.groupdict()
+        return None, None
+
+    def handle(self, method, path, query, headers, body):
+        """
+        Serve one request, counting the requests served at once in in_flight and its high-water mark peak_in_flight
+        :return: (status, headers, JSON-serialisable or bytes body)
+        """
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return self.serve(method, path, query, headers, body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def serve(self, method, path, query, headers, body):
+        if path == SWAGGER_PATH:
+            return HTTPStatus.OK, {}, self.swagger
+
+        file_match = TIME_SERIES_FILE_PATH.match(path)
+        if file_match and method == 'GET':
+            return self.time_series_file(int(file_match.group(1)), headers)
+
+        operation, path_args = self.route(method, path)
+        if operation is None:
+            return HTTPStatus.NOT_FOUND, {}, dict(error='no route for %s %s' % (method, path))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests.append((operation, dict(query, **path_args)))
+
+        if operation == 'getAuthToken':
+            return self.get_auth_token(body)
+
+        authorization = headers.get('Authorization') or ''
+        if authorization[len('Bearer '):] not in self.tokens:
+            return HTTPStatus.UNAUTHORIZED, {}, dict(error='invalid token')
+
+        with self.lock:
+            throttled = self.throttle > 0
+            self.throttle -= throttled
+        if throttled:
+            return HTTPStatus.TOO_MANY_REQUESTS, {'Retry-After': '0'}, dict(error='rate limited')
+
+        if operation == 'getCurrentUser':
+            return HTTPStatus.OK, {}, self.make_user(0, 'admin', 'pi')
+        if operation == 'findUser':
+            user = next((user for user in self.users if user['username'] == path_args['id']), None)
+            return (HTTPStatus.OK, {}, user) if user else (HTTPStatus.NOT_FOUND, {}, dict(error='not found'))
+        if operation in FIND_OPERATIONS:
+            return self.find(operation, path, query, headers.get('If-None-Match'))
+        return self.add(operation, path_args, body)
+
+    def time_series_file(self, time_series_id, headers):
+        """
+        A generated tab-separated time series file, honouring a single-range Range header
+        """
+        authorization = headers.get('Authorization') or ''
+        if authorization[len('Bearer '):] not in self.tokens:
+            return HTTPStatus.UNAUTHORIZED, {}, dict(error='invalid token')
+
+        with self.lock:
+            content = self.files.get(time_series_id)
+            if content is None:
+                rows = ['t\tx\ty\n']
+                size = len(rows[0])
+                while size < self.time_series_size:
+                    index = len(rows)
+                    rows.append('%d\t%.1f\t%d\n' % (index * 10 + time_series_id, index * 0.5, index % 7))
+                    size += len(rows[-1])
+                content = self.files[time_series_id] = ''.join(rows).encode('utf-8')
+            self.file_requests.append((time_series_id, headers.get('Range')))
+
+        response_headers = {'Content-Type': 'text/tab-separated-values',
+                            'ETag': '"%s"' % hashlib.md5(content).hexdigest()}
+        match = re.match(r'^bytes=(\d+)-(\d*)$', headers.get('Range') or '')
+        if not self.range_requests or match is None:
+            return HTTPStatus.OK, response_headers, content
+
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+        response_headers.update({'Accept-Ranges': 'bytes',
+                                 'Content-Range': 'bytes %d-%d/%d' % (start, end, len(content))})
+        return HTTPStatus.PARTIAL_CONTENT, response_headers, content[start:end + 1]
+
+    def get_auth_token(self, body):
+        token = 'token%d' % next(self.ids)
+        with self.lock:
+            self.tokens.add(token)
+        return HTTPStatus.OK, {}, dict(access_token=token, refresh_token='refresh-' + token, token_type='Bearer',
+                                       expires_in=self.token_expires_in, created_at=int(time.time()))
+
+    def find(self, operation, path, query, if_none_match=None):
+        # the ETag changes when the records do (only users and studies can be added), like a Rails fresh_when
+        state = [operation, query, len(self.users), len(self.created['addStudy'])]
+        etag = '"%s"' % hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+        if if_none_match == etag:
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, None
+
+        page = int(query.get('page', 1))
+        page_size = int(query.get('page_size', 20))
+        if self.max_page_size:
+            page_size = min(page_size, self.max_page_size)
+
+        if operation in ('findUsers', 'findStudyDefinitions'):
+            with self.lock:
+                listed = self.users if operation == 'findUsers' else self.created['addStudy']
+                listed = [record for record in listed if query.get('role') in (None, record.get('role'))
+                          and query.get('email', '') in (record.get('email') or '')]
+            total = len(listed)
+            records = listed[(page - 1) * page_size:page * page_size]
+        else:
+            total = self.counts[operation]
+            make_record = self.make_data_point if operation == 'findDataPoints' else self.make_time_series
+            records = [make_record(index, query) for index in range((page - 1) * page_size,
+                                                                    min(page * page_size, total))]
+
+        last_page = max(1, -(-total // page_size))
+        link = '<%s%s%s?page=%%d&page_size=%d>; rel="%%s"' % (self.url, API_BASE_PATH, path, page_size)
+        links = [link % (last_page, 'last')]
+        if page < last_page:
+            links.append(link % (page + 1, 'next'))
+        headers = {'Total': str(total), 'ETag': etag}
+        if self.link_headers:
+            headers['Link'] = ', '.join(links)
+        return HTTPStatus.OK, headers, records
+
+    def add(self, operation, path_args, body):
+        # bodies are wrapped like the Rails params, e.g. {"study_definition": {...}}
+        created = dict(body or {})
+        if len(created) == 1 and isinstance(next(iter(created.values())), dict):
+            created = dict(next(iter(created.values())))
+        created.update({name: int(value) for name, value in path_args.items()})
+        with self.lock:
+            created['id'] = next(self.ids)
+            self.created[operation].append(created)
+            if operation == 'addUser':
+                # like the real server, users are listed without their passwords
+                created.pop('password', None)
+                created.pop('password_confirmation', None)
+                created.setdefault('created_at', USER_CREATED_AT)
+                self.users.append(created)
+        return HTTPStatus.CREATED, {}, created
+
+    @staticmethod
+    def make_user(user_id, role, username=None):
+        username = username or 'user%d' % user_id
+        return dict(id=user_id, username=username, email=username + '@elicit.com', role=role,
+                    anonymous=role == 'anonymous_user', created_at=USER_CREATED_AT)
+
+    def make_data_point(self, index, query):
+        return dict(id=index + 1,
+                    study_definition_id=int(query.get('study_definition_id', 1)),
+                    study_result_id=int(query.get('study_result_id', 1)),
+                    stage_id=int(query.get('stage_id', 1)),
+                    component_id=index % 10 + 1,
+                    point_type='State',
+                    kind='Mouse',
+                    method='click',
+                    value=('%d' % index).rjust(self.value_size, 'x'),
+                    entity_type='Component',
+                    datetime='2024-01-01T00:00:%02d.000Z' % (index % 60))
+
+    def make_time_series(self, index, query):
+        return dict(id=index + 1,
+                    study_definition_id=int(query.get('study_definition_id', 1)),
+                    study_result_id=int(query.get('study_result_id', 1)),
+                    stage_id=int(query.get('stage_id', 1)),
+                    component_id=index % 10 + 1,
+                    series_type='webgazer',
+                    file=dict(url='/time_series/%d.tsv' % (index + 1)),
+                    created_at='2024-01-01T00:00:00.000Z',
+                    updated_at='2024-01-01T00:00:00.000Z')
+
+
+class MockElicitHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        status, headers, data = self.server.mock.handle(method, url.path, query, self.headers, body)
+
+        if data is None:
+            payload = b''
+        else:
+            payload = data if isinstance(data, bytes) else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', headers.pop('Content-Type', 'application/json'))
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
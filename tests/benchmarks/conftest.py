@@ -0,0 +1,11 @@
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks take about a minute, so they only run when asked for: `pytest tests/benchmarks` or --benchmark-only
+    if config.getoption('benchmark_only', False) or any('benchmarks' in str(arg) for arg in config.args):
+        return
+    skip = pytest.mark.skip(reason='benchmarks run with `pytest tests/benchmarks`')
+    for item in items:
+        if 'benchmarks' in str(item.fspath):
+            item.add_marker(skip)
@@ -0,0 +1,128 @@
+"""
+Benchmarks of the client hot paths against MockElicitServer; run with `pytest tests/benchmarks`.
+
+Throughput (pages/s, records/s) and peak traced memory are reported in each benchmark's extra_info, so they show up
+in `--benchmark-json` output and can be compared between releases with `--benchmark-compare`.
+"""
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+from pyelicit.elicit import Elicit
+from pyelicit.testing import MockElicitServer
+
+pytest.importorskip('pytest_benchmark')
+
+NUM_DATA_POINTS = 20000
+PAGE_SIZE = 500
+
+
+@pytest.fixture(scope='module')
+def server():
+    with MockElicitServer(num_users=1000, num_data_points=NUM_DATA_POINTS, value_size=64) as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def elicit(server, tmp_path_factory):
+    spec_cache_dir = tmp_path_factory.mktemp('swagger')
+    return Elicit(server.configuration(spec_cache_dir=str(spec_cache_dir), concurrency=4))
+
+
+def measure(benchmark, fn, pages):
+    """
+    Benchmark fn, then run it once more under tracemalloc for the peak memory, and record throughput
+    """
+    records = benchmark(fn)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark.extra_info.update(records=len(records), peak_memory_bytes=peak)
+    # no timings under --benchmark-disable
+    if benchmark.stats is not None:
+        mean = benchmark.stats.stats.mean
+        benchmark.extra_info.update(pages_per_second=pages / mean, records_per_second=len(records) / mean)
+    return records
+
+
+@pytest.mark.parametrize('decode', [None, 'dict', 'record'])
+def test_find_data_points(benchmark, elicit, decode):
+    def find():
+        return elicit.find_data_points(study_result_id=1, page_size=PAGE_SIZE, decode=decode)
+
+    records = measure(benchmark, find, NUM_DATA_POINTS // PAGE_SIZE)
+    assert len(records) == NUM_DATA_POINTS
+
+
+def test_iter_data_points(benchmark, elicit):
+    def iterate():
+        return list(elicit.iter_data_points(study_result_id=1, page_size=PAGE_SIZE, decode='dict'))
+
+    records = measure(benchmark, iterate, NUM_DATA_POINTS // PAGE_SIZE)
+    assert len(records) == NUM_DATA_POINTS
+
+
+@pytest.mark.parametrize('compiled', [True, False])
+def test_build_request(benchmark, elicit, compiled):
+    """Building the (req, resp) pair of a find call, with the compiled operation or pyswagger's"""
+    elicit_api = elicit.elicit_api
+    if compiled:
+        build = elicit_api['findDataPoints']
+    else:
+        op = elicit_api.app.op['findDataPoints']
+        build = lambda **args: op(authorization=elicit_api.auth_header, **args)
+
+    benchmark(build, study_result_id=1, page=3, page_size=PAGE_SIZE)
+
+
+def test_find_users_by_role(benchmark, elicit):
+    users = benchmark(elicit.find_users_by_role, 'registered_user', 200)
+    assert len(users) == 200
+
+
+def test_add_objects(benchmark, elicit):
+    def add_studies():
+        return [elicit.add_study(study=dict(study_definition=dict(title='Study %d' % index, description='bench')))
+                for index in range(50)]
+
+    measure(benchmark, add_studies, 50)
+
+
+DEFINITION_DATA = dict(Instruments=[dict(Type='RadioButtonGroup', Items=['Item %d' % i for i in range(100)])])
+
+
+def test_add_components(benchmark, elicit):
+    path_ids = dict(study_definition_id=1, protocol_definition_id=1, phase_definition_id=1)
+
+    def add_components():
+        return [elicit.add_component(component=dict(component=dict(name='Question', definition_data=DEFINITION_DATA)),
+                                     trial_definition_id=trial_id, **path_ids)
+                for trial_id in range(50)]
+
+    measure(benchmark, add_components, 50)
+
+
+def test_add_prepared_components(benchmark, elicit):
+    payload = elicit.prepare('addComponent',
+                             component=dict(component=dict(name='Question', definition_data=DEFINITION_DATA)),
+                             study_definition_id=1, protocol_definition_id=1, phase_definition_id=1)
+
+    def add_components():
+        return [elicit.add_prepared(payload, trial_definition_id=trial_id) for trial_id in range(50)]
+
+    measure(benchmark, add_components, 50)
+
+
+def test_startup(benchmark, server, tmp_path):
+    """Interpreter start, import and Elicit construction with a warm swagger cache"""
+    configuration = server.configuration(spec_cache_dir=str(tmp_path / 'swagger'))
+    code = "from pyelicit.elicit import Elicit; Elicit(%r)" % configuration
+    subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', code],),
+                       kwargs=dict(check=True, capture_output=True), rounds=5)
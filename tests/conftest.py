@@ -0,0 +1,31 @@
+import pytest
+
+from pyelicit.elicit import Elicit
+from pyelicit.testing import MockElicitServer
+
+
+@pytest.fixture
+def server_options():
+    """MockElicitServer arguments of the server fixture; test modules override this fixture to size their data"""
+    return {}
+
+
+@pytest.fixture
+def server(server_options):
+    with MockElicitServer(**server_options) as server:
+        yield server
+
+
+@pytest.fixture
+def elicit_options(tmp_path):
+    """Configuration make_elicit adds to a server's; test modules override this fixture for their defaults"""
+    return {}
+
+
+@pytest.fixture
+def make_elicit(tmp_path, elicit_options):
+    """Factory of Elicit sessions for a MockElicitServer, sharing a swagger cache under tmp_path"""
+    def make(server, **overrides):
+        return Elicit(server.configuration(spec_cache_dir=str(tmp_path / 'swagger'),
+                                           **dict(elicit_options, **overrides)))
+    return make
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+import pytest
+
+from pyswagger import App
+from pyelicit.async_elicit import AsyncClient, AsyncElicit, find_objects, add_object, iter_pages
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+DATA_POINTS = [dict(id=i, value=str(i)) for i in range(25)]
+PAGE_REQUESTS = []
+
+
+def swagger(port):
+    return {
+        'swagger': '2.0',
+        'info': {'title': 'Elicit', 'version': 'v1'},
+        'host': '127.0.0.1:%d' % port,
+        'basePath': '/api/v1',
+        'schemes': ['http'],
+        'paths': {
+            '/data_points': {
+                'get': {
+                    'operationId': 'findDataPoints',
+                    'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'},
+                                   {'name': 'page_size', 'in': 'query', 'type': 'integer'},
+                                   {'name': 'Authorization', 'in': 'header', 'type': 'string'}],
+                    'responses': {'200': {'description': 'data points',
+                                          'schema': {'type': 'array', 'items': {'$ref': '#/definitions/DataPoint'}}}}
+                },
+                'post': {
+                    'operationId': 'addDataPoint',
+                    'parameters': [{'name': 'data_point', 'in': 'body', 'schema': {'type': 'object'}}],
+                    'responses': {'201': {'description': 'created', 'schema': {'$ref': '#/definitions/DataPoint'}}}
+                }
+            }
+        },
+        'definitions': {'DataPoint': {'type': 'object',
+                                      'properties': {'id': {'type': 'integer'}, 'value': {'type': 'string'}}}}
+    }
+
+
+async def find_data_points(request):
+    if request.headers.get('Authorization') == 'Bearer expired':
+        return web.json_response(dict(error='unauthorized'), status=401)
+    PAGE_REQUESTS.append(request.query['page'])
+    page, page_size = int(request.query['page']), int(request.query['page_size'])
+    last_page = -(-len(DATA_POINTS) // page_size)
+    links = ['<http://test/api/v1/data_points?page=%d>; rel="last"' % last_page]
+    if page < last_page:
+        links.append('<http://test/api/v1/data_points?page=%d>; rel="next"' % (page + 1))
+    return web.json_response(DATA_POINTS[(page - 1) * page_size:page * page_size], headers={'Link': ', '.join(links)})
+
+
+async def add_data_point(request):
+    body = await request.json()
+    return web.json_response(dict(id=100, value=body['value']), status=201)
+
+
+class Operations:
+    def __init__(self, app):
+        self.app = app
+
+    def __getitem__(self, op):
+        return self.app.op[op]
+
+
+async def run_against_server(tmp_path, scenario):
+    server = web.Application()
+    server.router.add_get('/api/v1/data_points', find_data_points)
+    server.router.add_post('/api/v1/data_points', add_data_point)
+    runner = web.AppRunner(server)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    swagger_path = tmp_path / 'swagger.json'
+    swagger_path.write_text(json.dumps(swagger(port)))
+    client = AsyncClient(concurrency=4)
+    try:
+        return await scenario(client, Operations(App.create(swagger_path.as_uri())))
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_async_find_objects_fetches_all_pages_in_order(tmp_path):
+    async def scenario(client, elicit):
+        return await find_objects(client, elicit, 'findDataPoints', None, default_page_size=4)
+
+    found = asyncio.run(run_against_server(tmp_path, scenario))
+    assert [data_point.id for data_point in found] == list(range(25))
+
+
+def test_async_add_object(tmp_path):
+    async def scenario(client, elicit):
+        return await add_object(client, elicit, 'addDataPoint', None, data_point=dict(value='x'))
+
+    created = asyncio.run(run_against_server(tmp_path, scenario))
+    assert created.id == 100
+    assert created.value == 'x'
+
+
+def test_async_api_functions_generated():
+    for fn_name in ['find_data_points', 'iter_data_points', 'add_study', 'get_component']:
+        assert callable(getattr(AsyncElicit, fn_name))
+
+
+def test_async_iter_pages_keeps_a_bounded_window_in_flight(tmp_path):
+    async def scenario(client, elicit):
+        PAGE_REQUESTS.clear()
+        pages = iter_pages(client, elicit, 'findDataPoints', None, default_page_size=1)
+        first = [(await pages.__anext__())[0].id for _ in range(2)]
+        # a slow consumer: only the pages in the window are fetched meanwhile
+        await asyncio.sleep(0.2)
+        requested = len(PAGE_REQUESTS)
+        rest = [page_data[0].id async for page_data in pages]
+        return first + rest, requested
+
+    found, requested = asyncio.run(run_against_server(tmp_path, scenario))
+    assert found == list(range(25))
+    # the first page, the one yielded and a window of four
+    assert requested == 6
+
+
+def test_async_client_retries_once_after_401(tmp_path):
+    rejected = []
+
+    async def on_unauthorized(auth_header):
+        rejected.append(auth_header)
+        return 'Bearer fresh'
+
+    async def scenario(client, elicit):
+        client.on_unauthorized = on_unauthorized
+        req_and_resp = elicit['findDataPoints'](page=1, page_size=5, Authorization='Bearer expired')
+        return await client.request(req_and_resp)
+
+    resp = asyncio.run(run_against_server(tmp_path, scenario))
+    assert resp.status == 200
+    assert [data_point.id for data_point in resp.data] == list(range(5))
+    assert rejected == ['Bearer expired']
+
+
+def test_async_elicit_refreshes_tokens_off_the_event_loop(tmp_path):
+    from pyelicit.testing import MockElicitServer
+
+    async def scenario(elicit, server):
+        async with elicit:
+            elicit.elicit_api.token.expires_at = 0
+            await elicit.find_data_points(page_size=5)
+            # revoked on the server: the rejected requests log in again, once
+            server.tokens.clear()
+            pages = await asyncio.gather(*[elicit.find_data_points(page=page, page_size=5) for page in (1, 2, 3)])
+            return [len(page) for page in pages]
+
+    with MockElicitServer(num_data_points=15, token_expires_in=3600) as server:
+        elicit = AsyncElicit(server.configuration(spec_cache_dir=str(tmp_path)))
+        assert asyncio.run(scenario(elicit, server)) == [5, 5, 5]
+        assert len(server.tokens) == 1
+
+
+def test_async_elicit_loads_the_api_off_the_event_loop(tmp_path, monkeypatch):
+    from pyelicit import async_elicit
+    from pyelicit.testing import MockElicitServer
+
+    threads = []
+
+    def create_elicit_api(*args):
+        threads.append(threading.current_thread())
+        return async_elicit_create_elicit_api(*args)
+
+    async_elicit_create_elicit_api = async_elicit.create_elicit_api
+    monkeypatch.setattr(async_elicit, 'create_elicit_api', create_elicit_api)
+
+    async def scenario(elicit):
+        async with elicit:
+            return await elicit.find_data_points(page_size=4)
+
+    # without Link headers the Total header tells the last page
+    with MockElicitServer(num_data_points=12, link_headers=False) as server:
+        elicit = AsyncElicit(server.configuration(spec_cache_dir=str(tmp_path)))
+        assert elicit.elicit_api is None
+        assert [data_point.id for data_point in asyncio.run(scenario(elicit))] == list(range(1, 13))
+        assert threads and threads[0] is not threading.main_thread()
+        # pages 1-3, and no empty page after the full last one
+        assert sorted(args['page'] for operation, args in server.requests if operation == 'findDataPoints') == \
+            ['1', '2', '3']
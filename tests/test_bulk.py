@@ -0,0 +1,116 @@
+import itertools
+import json
+import threading
+import pytest
+
+from http import HTTPStatus
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from pyelicit.elicit import Elicit, BulkError, run_bulk
+from pyelicit.participants import Participant
+
+
+def make_elicit(concurrency=4):
+    config = SimpleNamespace(api_url='https://test.com', user='test_user', password='test_pass',
+                             client_id='test_client', client_secret='test_secret', send_opt={'verify': True},
+                             debug=False, concurrency=concurrency, decode='record')
+    with patch('pyelicit.elicit.api.ElicitApi') as mock_api:
+        mock_api.return_value.login.return_value = MagicMock()
+        return Elicit(config)
+
+
+class FakeApi:
+    def __init__(self, parameters=()):
+        self.parameters = parameters
+
+    def __getitem__(self, op):
+        return lambda **args: (op, FakeResponse(args))
+
+    def has_parameter(self, op, name):
+        return name in self.parameters
+
+
+class FakeResponse:
+    def __init__(self, args):
+        self.args = args
+        self.raw_body_only = False
+
+
+class FakeUsersClient:
+    """Serves findUsers from a fixed user list and creates users for addUser, failing for usernames in `fail`"""
+
+    def __init__(self, users, fail=()):
+        self.users = users
+        self.fail = fail
+        self.requests = []
+        self.ids = itertools.count(1000)
+        self.lock = threading.Lock()
+
+    def request(self, req_and_resp):
+        op, resp = req_and_resp
+        args = resp.args
+        with self.lock:
+            self.requests.append((op, args))
+        if op == 'findUsers':
+            users = [user for user in self.users if args.get('role') in (None, user.role)]
+            page, page_size = args['page'], args['page_size']
+            users = users[(page - 1) * page_size:page * page_size]
+            if resp.raw_body_only:
+                return SimpleNamespace(status=HTTPStatus.OK, header={}, raw=json.dumps([vars(user) for user in users]))
+            return SimpleNamespace(status=HTTPStatus.OK, header={}, data=users)
+        if op == 'addUser':
+            details = args['user']['user']
+            if details['username'] in self.fail:
+                return SimpleNamespace(status=HTTPStatus.UNPROCESSABLE_ENTITY, header={}, data=None)
+            return SimpleNamespace(status=HTTPStatus.CREATED, header={},
+                                   data=Participant(id=next(self.ids), role=details['role'],
+                                                    username=details['username'], email=details['email']))
+        raise AssertionError(op)
+
+
+def user(id, role, email=None):
+    return SimpleNamespace(id=id, role=role, username='user%d' % id, email=email or 'user%d@elicit.com' % id)
+
+
+def test_run_bulk_keeps_order_and_reports_failures():
+    def square(x):
+        if x == 3:
+            raise ValueError('three')
+        return x * x
+
+    result = run_bulk(square, range(6), max_workers=3)
+
+    assert result.results == [0, 1, 4, None, 16, 25]
+    assert [(index, item) for index, item, error in result.failures] == [(3, 3)]
+    with pytest.raises(BulkError):
+        result.raise_for_failures()
+
+
+def test_ensure_users_reuses_existing_and_creates_missing():
+    elicit = make_elicit()
+    elicit.elicit_api = FakeApi(parameters=('role',))
+    elicit.client = FakeUsersClient([user(1, 'admin'), user(2, 'registered_user'),
+                                     user(3, 'anonymous_user', 'x@mturk.com'), user(4, 'anonymous_user')])
+
+    participants = elicit.ensure_users(2, 2)
+
+    assert [p.id for p in participants[:2]] == [2, 4]
+    assert [p.role for p in participants[2:]] == ['anonymous_user', 'registered_user']
+    find_requests = [args for op, args in elicit.client.requests if op == 'findUsers']
+    assert {args['role'] for args in find_requests} == {'registered_user', 'anonymous_user'}
+    assert all(args['page_size'] == 100 for args in find_requests)
+
+
+def test_bulk_ensure_users_reports_partial_failures():
+    elicit = make_elicit()
+    elicit.elicit_api = FakeApi()
+    elicit.client = FakeUsersClient([])
+
+    with patch('pyelicit.elicit.random_user_details', side_effect=lambda role: dict(username='u' + role, role=role,
+                                                                                 email='u@elicit.com')):
+        elicit.client.fail = ('uanonymous_user',)
+        result = elicit.bulk_ensure_users(1, 1)
+
+    assert result.results[0] is None
+    assert result.results[1].role == 'registered_user'
+    assert [index for index, item, error in result.failures] == [0]
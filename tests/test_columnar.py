@@ -0,0 +1,108 @@
+import json
+import pytest
+
+from urllib.parse import urlparse, parse_qs
+from pyswagger import App
+from requests.models import Response
+from pyelicit.api import ElicitClient
+from pyelicit import columnar
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {'title': 'Elicit', 'version': 'v1'},
+    'host': 'test.com',
+    'basePath': '/api/v1',
+    'schemes': ['https'],
+    'paths': {
+        '/data_points': {
+            'get': {
+                'operationId': 'findDataPoints',
+                'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'},
+                               {'name': 'page_size', 'in': 'query', 'type': 'integer'}],
+                'responses': {'200': {'description': 'data points',
+                                      'schema': {'type': 'array', 'items': {'$ref': '#/definitions/DataPoint'}}}}
+            }
+        }
+    },
+    'definitions': {
+        'DataPoint': {'type': 'object', 'properties': {
+            'id': {'type': 'integer'},
+            'value': {'type': 'string'},
+            'score': {'type': 'number'},
+            'datetime': {'type': 'string', 'format': 'date-time'},
+            'meta': {'type': 'object'}}}
+    }
+}
+
+DATA_POINTS = [dict(id=i, value='v%d' % i, score=None if i % 3 == 0 else i / 2,
+                    datetime='2024-01-01T00:00:%02dZ' % i, meta=dict(i=i)) for i in range(11)]
+
+
+def send(request, **kwargs):
+    query = parse_qs(urlparse(request.url).query)
+    page, page_size = int(query['page'][0]), int(query['page_size'][0])
+    response = Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(DATA_POINTS[(page - 1) * page_size:page * page_size]).encode('utf-8')
+    return response
+
+
+class Operations:
+    def __init__(self, app):
+        self.app = app
+
+    def __getitem__(self, op):
+        return self.app.op[op]
+
+
+@pytest.fixture
+def elicit_api(tmp_path):
+    (tmp_path / 'swagger.json').write_text(json.dumps(SWAGGER))
+    return Operations(App.create((tmp_path / 'swagger.json').as_uri()))
+
+
+@pytest.fixture
+def client():
+    client = ElicitClient()
+    client.session.send = send
+    return client
+
+
+def test_to_dataframe_is_typed(client, elicit_api):
+    frame = columnar.to_dataframe(client, elicit_api, 'findDataPoints', None, default_page_size=4)
+
+    assert list(frame['id']) == list(range(11))
+    assert str(frame['id'].dtype) == 'Int64'
+    assert str(frame['score'].dtype) == 'Float64'
+    assert frame['score'].isna().sum() == 4
+    assert str(frame['datetime'].dtype) == 'datetime64[ns, UTC]'
+    assert json.loads(frame['meta'][5]) == dict(i=5)
+
+
+def test_to_parquet_streams_row_groups(client, elicit_api, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'data_points.parquet'
+
+    rows = columnar.to_parquet(client, elicit_api, 'findDataPoints', path, None, default_page_size=4,
+                               row_group_size=6)
+
+    parquet_file = pyarrow_parquet.ParquetFile(str(path))
+    assert rows == 11
+    # pages of 4 buffered into row groups of at least 6 rows, then the rest
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.metadata.num_row_groups)] == [8, 3]
+    assert parquet_file.read().column('id').to_pylist() == list(range(11))
+
+
+def test_exports_use_adaptive_page_sizes(tmp_path):
+    pytest.importorskip('pyarrow.parquet')
+    from pyelicit.elicit import Elicit
+    from pyelicit.testing import MockElicitServer
+
+    with MockElicitServer(num_data_points=300) as server:
+        elicit = Elicit(server.configuration(spec_cache_dir=str(tmp_path)))
+        assert elicit.data_points_to_parquet(tmp_path / 'data_points.parquet', study_result_id=1) == 300
+        assert len(elicit.data_points_to_dataframe(study_result_id=1)) == 300
+
+        pages = [args for operation, args in server.requests if operation == 'findDataPoints']
+        assert len(pages) <= 6
@@ -0,0 +1,100 @@
+import json
+import pytest
+
+from types import SimpleNamespace
+from pyswagger import App
+from pyelicit import decoding
+from pyelicit.elicit import get_object
+
+BODY = json.dumps([dict(id=1, role='admin', email='a@elicit.com'),
+                   dict(id=2, role='registered_user', email='b@elicit.com')]).encode('utf-8')
+
+
+def test_decode_modes():
+    dicts = decoding.decode(BODY, 'dict')
+    tuples = decoding.decode(BODY, 'tuple', 'User')
+    records = decoding.decode(BODY, 'record', 'User')
+
+    assert dicts[1]['role'] == 'registered_user'
+    assert tuples[1].role == 'registered_user' and tuples[1] == (2, 'registered_user', 'b@elicit.com')
+    assert records[1].role == 'registered_user'
+    assert records[0]._asdict() == dict(id=1, role='admin', email='a@elicit.com')
+    assert not hasattr(records[0], '__dict__')
+    # one class per field set
+    assert type(records[0]) is type(records[1]) is decoding.record_type('User', ('id', 'role', 'email'))
+
+
+def test_decode_single_object():
+    record = decoding.decode(b'{"id": 3, "name": "x"}', 'record', 'Component')
+    assert (record.id, record.name) == (3, 'x')
+
+
+def test_decode_unknown_mode():
+    with pytest.raises(ValueError):
+        decoding.decode(BODY, 'xml')
+
+
+def test_sampled_validation(tmp_path):
+    (tmp_path / 'swagger.json').write_text(json.dumps({
+        'swagger': '2.0', 'info': {'title': 'Elicit', 'version': 'v1'}, 'host': 'test.com', 'basePath': '/api/v1',
+        'paths': {'/users': {'get': {'operationId': 'findUsers', 'responses': {'200': {
+            'description': 'users', 'schema': {'type': 'array', 'items': {'$ref': '#/definitions/User'}}}}}}},
+        'definitions': {'User': {'type': 'object', 'properties': {'id': {'type': 'integer'}}}}}))
+    elicit_api = SimpleNamespace(app=App.create((tmp_path / 'swagger.json').as_uri()))
+
+    assert not decoding.sample_validate(elicit_api, 'findUsers', b'[{"id": "x"}]', 0.0)
+    assert decoding.sample_validate(elicit_api, 'findUsers', b'[{"id": 1}]', 1.0)
+    with pytest.raises(Exception):
+        decoding.sample_validate(elicit_api, 'findUsers', b'[{"id": "x"}]', 1.0)
+
+
+def test_get_object_skips_models():
+    response = SimpleNamespace(status=200, raw=b'{"id": 7, "name": "c"}', raw_body_only=False)
+
+    class Client:
+        def request(self, req_and_resp):
+            assert req_and_resp[1].raw_body_only
+            return req_and_resp[1]
+
+    class Operations:
+        def __getitem__(self, op):
+            return lambda **args: (args, response)
+
+    component = get_object(Client(), Operations(), 'getComponent', None, decode='record', id=7)
+    assert (component.id, component.name) == (7, 'c')
+    assert type(component).__name__ == 'GetComponentRecord'
+
+
+@pytest.fixture
+def mock_api(tmp_path):
+    from pyelicit.testing.mock_server import swagger_definition
+    (tmp_path / 'swagger.json').write_text(json.dumps(swagger_definition('test.com')))
+    return SimpleNamespace(app=App.create((tmp_path / 'swagger.json').as_uri()))
+
+
+def test_records_generated_from_definitions(mock_api):
+    body = json.dumps([dict(id=1, series_type='webgazer', file=dict(url='/time_series/1.tsv')),
+                       dict(id=2, file=None)]).encode('utf-8')
+    decoder = decoding.response_decoder(mock_api, 'findTimeSeries', 'record', 'FindTimeSeriesRecord')
+    records = decoding.decode(body, 'record', 'FindTimeSeriesRecord', decoder)
+
+    assert type(records[0]).__name__ == 'TimeSeries'
+    assert type(records[0]) is type(records[1])
+    assert records[0].file.url == '/time_series/1.tsv'
+    assert type(records[0].file).__name__ == 'TimeSeriesFile'
+    # fields missing from the body are None, as on pyswagger models
+    assert (records[1].series_type, records[1].file) == (None, None)
+    assert not hasattr(records[0], '__dict__')
+    assert decoding.response_decoder(mock_api, 'findTimeSeries', 'record') is decoder
+
+
+def test_tuples_generated_from_definitions(mock_api):
+    decoder = decoding.response_decoder(mock_api, 'getCurrentUser', 'tuple')
+    user = decoding.decode(b'{"id": 1, "role": "admin"}', 'tuple', 'User', decoder)
+
+    assert user.role == 'admin'
+    assert user._fields == ('id', 'username', 'email', 'role', 'anonymous', 'created_at')
+    # undeclared fields are kept, in a class of their own
+    extended = decoding.decode(b'{"id": 1, "role": "admin", "locale": "da"}', 'tuple', 'User', decoder)
+    assert (extended.role, extended.locale) == ('admin', 'da')
+    assert decoding.response_decoder(mock_api, 'getCurrentUser', 'dict') is None
@@ -0,0 +1,105 @@
+import hashlib
+
+import numpy
+import pytest
+
+from pyelicit.downloads import DownloadJob, DownloadManager, ChecksumError, load_time_series
+from pyelicit.testing import MockElicitServer
+
+
+@pytest.fixture
+def elicit_options():
+    return dict(concurrency=4)
+
+
+def test_download_time_series_in_segments(tmp_path, make_elicit):
+    with MockElicitServer(num_time_series=3, time_series_size=50000) as server:
+        elicit = make_elicit(server)
+        manager = DownloadManager(elicit.client.session, server.url, elicit.auth_header, max_workers=4,
+                                  segment_size=16384)
+
+        jobs = [DownloadJob(server.url + '/time_series/%d.tsv' % i, tmp_path / 'out' / ('%d.tsv' % i))
+                for i in (1, 2, 3)]
+        result = manager.download(jobs)
+
+        assert result.failures == []
+        for time_series_id, path in zip((1, 2, 3), result.results):
+            assert path.read_bytes() == server.files[time_series_id]
+        assert not list((tmp_path / 'out').glob('*.part*'))
+        # a one-byte probe plus four 16k segments per file
+        ranges = sorted(r for i, r in server.file_requests if i == 1)
+        assert len(ranges) == 5 and 'bytes=0-16383' in ranges
+
+
+def test_download_resumes_missing_segments(tmp_path, make_elicit):
+    with MockElicitServer(num_time_series=1, time_series_size=50000) as server:
+        elicit = make_elicit(server)
+        manager = DownloadManager(elicit.client.session, server.url, elicit.auth_header, segment_size=16384)
+        job = DownloadJob(server.url + '/time_series/1.tsv', tmp_path / '1.tsv')
+
+        # interrupted after the first and last segments
+        download = manager.probe(job)
+        for segment in (0, 3):
+            manager.fetch_segment(download, segment)
+        server.file_requests.clear()
+
+        assert manager.download([job]).raise_for_failures() == [job.path]
+        assert job.path.read_bytes() == server.files[1]
+        assert sorted(r for _, r in server.file_requests) == ['bytes=0-0', 'bytes=16384-32767', 'bytes=32768-49151']
+
+
+def test_download_without_range_support_and_checksum(tmp_path, make_elicit):
+    with MockElicitServer(num_time_series=1, time_series_size=20000, range_requests=False) as server:
+        elicit = make_elicit(server)
+        result = elicit.download_time_series(tmp_path / 'out', study_result_id=1)
+
+        (path,) = result.raise_for_failures()
+        assert path.name == '1_1.tsv'
+        assert path.read_bytes() == server.files[1]
+
+        manager = DownloadManager(elicit.client.session, server.url, elicit.auth_header)
+        wrong = DownloadJob(server.url + '/time_series/1.tsv', tmp_path / 'wrong.tsv', sha256='0' * 64)
+        right = DownloadJob(server.url + '/time_series/1.tsv', tmp_path / 'right.tsv',
+                            sha256=hashlib.sha256(server.files[1]).hexdigest())
+        result = manager.download([wrong, right])
+
+        assert result.results == [None, right.path]
+        assert isinstance(result.failures[0][2], ChecksumError)
+        assert not wrong.path.exists()
+
+
+def test_etag_is_only_an_md5_when_the_job_says_so(tmp_path, make_elicit):
+    with MockElicitServer(num_time_series=1, time_series_size=20000, range_requests=False) as server:
+        elicit = make_elicit(server)
+        manager = DownloadManager(elicit.client.session, server.url, elicit.auth_header)
+        url = server.url + '/time_series/1.tsv'
+        # e.g. an S3 multipart ETag: 32 hex digits, but not the MD5 of the body
+        headers = {'ETag': '"%s"' % ('0' * 32)}
+        path = tmp_path / '1.tsv'
+        path.write_bytes(b'data')
+
+        manager.verify(DownloadJob(url, path), path, headers)
+        with pytest.raises(ChecksumError):
+            manager.verify(DownloadJob(url, path, etag_is_md5=True), path, headers)
+
+        result = manager.download([DownloadJob(url, tmp_path / 'checked.tsv', etag_is_md5=True)])
+        assert result.raise_for_failures() == [tmp_path / 'checked.tsv']
+
+
+def test_other_hosts_get_no_token():
+    manager = DownloadManager(None, 'https://elicit-experiment.com', lambda: 'Bearer secret')
+
+    assert manager.headers('https://elicit-experiment.com/time_series/1.tsv') == {'Authorization': 'Bearer secret'}
+    assert manager.headers('https://storage.example.com/1.tsv?signature=x') == {'Authorization': None}
+
+
+def test_load_time_series_memory_mapped(tmp_path):
+    path = tmp_path / 'series.tsv'
+    path.write_text('t\tx\tlabel\n' + ''.join('%d\t%.1f\tfix\n' % (i, i / 2) for i in range(10)))
+
+    array = load_time_series(path, mmap_path=tmp_path / 'series.npy', rows_per_chunk=3)
+
+    assert array.shape == (10, 3)
+    assert array[9, 0] == 9 and array[9, 1] == 4.5
+    assert numpy.isnan(array[:, 2]).all()
+    assert numpy.load(tmp_path / 'series.npy', mmap_mode='r').shape == (10, 3)
@@ -0,0 +1,20 @@
+from pyelicit.api.elicit_client import ElicitClient
+
+
+def test_session_pool_and_retry_policy():
+    client = ElicitClient(send_opt=dict(verify=True, timeout=5), http_opt=dict(pool_size=32, max_retries=5))
+
+    adapter = client.session.get_adapter('https://elicit-experiment.com/api/v1/users')
+    assert adapter._pool_maxsize == 32
+    assert adapter.max_retries.total == 5
+    assert adapter.max_retries.backoff_factor == ElicitClient.DEFAULT_HTTP_OPT['backoff_factor']
+    assert set(adapter.max_retries.status_forcelist) == {502, 503, 504}
+    # POST is not idempotent so it is never retried
+    assert 'POST' not in adapter.max_retries.allowed_methods
+
+
+def test_default_http_opt():
+    client = ElicitClient(http_opt=dict(pool_size=None))
+
+    assert client.http_opt == ElicitClient.DEFAULT_HTTP_OPT
+    assert client.session.headers['Connection'] == 'keep-alive'
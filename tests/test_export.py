@@ -0,0 +1,73 @@
+import json
+
+from pyelicit.export import main, Progress
+from pyelicit.testing import MockElicitServer
+
+
+def export_args(server, tmp_path, *extra):
+    return list(extra) + ['--api_url', server.url, '--user', 'pi@elicit.com', '--password', 'password',
+            '--client_id', 'admin_public', '--client_secret', 'secret',
+            '--spec_cache_dir', str(tmp_path / 'swagger'), '--token_cache_dir', str(tmp_path / 'tokens'),
+            '--output_dir', str(tmp_path / 'export'), '--processes', '2', '--page_size', '10',
+            '--operations', 'findDataPoints', 'findTimeSeries', 'findStudyResults']
+
+
+def read_ids(path):
+    return [json.loads(line)['id'] for line in path.read_text().splitlines()]
+
+
+def test_export_and_resume(tmp_path, capsys):
+    with MockElicitServer(num_data_points=35, num_time_series=4) as server:
+        assert main(export_args(server, tmp_path, '3', '4')) == 0
+
+        for study_id in (3, 4):
+            study_dir = tmp_path / 'export' / ('study_%d' % study_id)
+            assert read_ids(study_dir / 'findDataPoints.jsonl') == list(range(1, 36))
+            assert read_ids(study_dir / 'findTimeSeries.jsonl') == list(range(1, 5))
+        output = capsys.readouterr().out
+        assert 'findStudyResults cannot be filtered by study_definition_id' in output
+        assert 'Exported 78 records' in output
+        # only the parent logged in; the workers reused its cached token
+        assert sum(operation == 'getAuthToken' for operation, _ in server.requests) == 1
+
+        # interrupted after the first page, with a partly written second page
+        study_dir = tmp_path / 'export' / 'study_3'
+        first_page = sum(len(line) + 1 for line in (study_dir / 'findDataPoints.jsonl').read_text().splitlines()[:10])
+        Progress(study_dir / 'findDataPoints.progress.json', 10).save(next_page=2, offset=first_page, records=10,
+                                                                     complete=False)
+        with open(study_dir / 'findDataPoints.jsonl', 'a') as output_file:
+            output_file.write('{"id": 11, "trunc')
+
+        assert main(export_args(server, tmp_path, '3', '4')) == 0
+
+        assert read_ids(study_dir / 'findDataPoints.jsonl') == list(range(1, 36))
+        output = capsys.readouterr().out
+        assert 'Exported 25 records' in output
+        assert '3 files were already complete' in output
+
+
+def test_export_studies_matching_title(tmp_path, capsys):
+    with MockElicitServer(num_data_points=5, num_time_series=0) as server:
+        for title in ['Pilot A', 'Main', 'Pilot B']:
+            server.add('addStudy', {}, dict(study_definition=dict(title=title)))
+
+        pilot_ids = [study['id'] for study in server.created['addStudy'] if study['title'].startswith('Pilot')]
+
+        assert main(export_args(server, tmp_path, '--title', '^Pilot')) == 0
+
+        assert sorted(path.name for path in (tmp_path / 'export').iterdir()) == ['study_%d' % i for i in pilot_ids]
+
+
+def test_export_shares_the_token_through_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    with MockElicitServer(num_data_points=5, num_time_series=0) as server:
+        args = export_args(server, tmp_path, '3')
+        token_option = args.index('--token_cache_dir')
+        del args[token_option:token_option + 2]
+
+        assert main(args) == 0
+
+        assert sum(operation == 'getAuthToken' for operation, _ in server.requests) == 1
+        assert not list(tmp_path.glob('elicit-export-tokens-*'))
+        assert not (tmp_path / 'home').exists()
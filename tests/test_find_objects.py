@@ -0,0 +1,143 @@
+import threading
+import time
+
+from http import HTTPStatus
+from types import SimpleNamespace
+from pyelicit.elicit import Elicit, find_objects, iter_objects
+from pyelicit.pagination import PageSizer
+
+OPERATION = 'findDataPoints'
+
+
+class PagedClient:
+    """
+    Stand-in for the swagger client serving `total` records in pages with Link headers (or only a Total header),
+    truncated to max_page_size records
+    """
+
+    def __init__(self, total, links=True, max_page_size=None):
+        self.total = total
+        self.links = links
+        self.max_page_size = max_page_size
+        self.requested_pages = []
+        self.requested_page_sizes = []
+        self.lock = threading.Lock()
+
+    def request(self, args):
+        page, page_size = args['page'], args['page_size']
+        with self.lock:
+            self.requested_pages.append(page)
+            self.requested_page_sizes.append(page_size)
+        page_size = min(page_size, self.max_page_size or page_size)
+        last_page = max(1, -(-self.total // page_size))
+        data = list(range((page - 1) * page_size, min(page * page_size, self.total)))
+        if not self.links:
+            return SimpleNamespace(status=HTTPStatus.OK, data=data, header={'Total': [str(self.total)]})
+        links = ['<https://test.com/api?page=%d>; rel="last"' % last_page]
+        if page < last_page:
+            links.append('<https://test.com/api?page=%d>; rel="next"' % (page + 1))
+        return SimpleNamespace(status=HTTPStatus.OK, data=data, header={'Link': [', '.join(links)]})
+
+
+class Operations:
+    def __getitem__(self, op):
+        assert op == OPERATION
+        return lambda **args: args
+
+
+def test_find_objects_serial():
+    client = PagedClient(10)
+    found = find_objects(client, Operations(), OPERATION, None)
+
+    assert found == list(range(10))
+    assert client.requested_pages == [1, 2, 3, 4]
+
+
+def test_find_objects_concurrent_keeps_order():
+    client = PagedClient(1000)
+    found = find_objects(client, Operations(), OPERATION, None, concurrency=8, page_size=7)
+
+    assert found == list(range(1000))
+    assert sorted(client.requested_pages) == list(range(1, 144))
+
+
+def test_find_objects_default_page_size():
+    client = PagedClient(100)
+    found = find_objects(client, Operations(), OPERATION, None, default_page_size=50)
+
+    assert found == list(range(100))
+    assert client.requested_pages == [1, 2]
+
+
+def test_find_objects_total_header_skips_trailing_empty_page():
+    client = PagedClient(10, links=False)
+    found = find_objects(client, Operations(), OPERATION, None, page_size=5)
+
+    assert found == list(range(10))
+    assert client.requested_pages == [1, 2]
+
+
+class DeclaredLimit:
+    def parameter_maximum(self, op, name):
+        assert (op, name) == (OPERATION, 'page_size')
+        return 80
+
+
+def test_find_objects_grows_page_size_up_to_declared_limit():
+    client = PagedClient(1000)
+    page_sizer = PageSizer(DeclaredLimit(), initial=10)
+    found = find_objects(client, Operations(), OPERATION, None, page_sizer=page_sizer)
+
+    assert found == list(range(1000))
+    # the size doubles where the pages line up with the larger size
+    assert client.requested_page_sizes[:5] == [10, 10, 20, 40, 80]
+    assert max(client.requested_page_sizes) == 80
+    assert len(client.requested_pages) < 20
+    assert page_sizer.page_size(OPERATION) == 80
+
+
+def test_find_objects_probes_server_page_size_cap():
+    client = PagedClient(100, max_page_size=25)
+    page_sizer = PageSizer(initial=60)
+    found = find_objects(client, Operations(), OPERATION, None, page_sizer=page_sizer)
+
+    assert found == list(range(100))
+    assert page_sizer.limit(OPERATION) == 25
+    assert client.requested_page_sizes == [60, 25, 25, 25]
+    assert page_sizer.page_size(OPERATION) == 25
+
+
+def test_find_objects_shrinks_slow_pages():
+    client = PagedClient(100)
+    page_sizer = PageSizer(initial=40, target_latency=0.0)
+    found = find_objects(client, Operations(), OPERATION, None, page_sizer=page_sizer)
+
+    assert found == list(range(100))
+    assert client.requested_page_sizes == [40, 20, 10, 10, 10, 10]
+
+
+def test_explicit_page_size_is_not_adapted():
+    client = PagedClient(100)
+    find_objects(client, Operations(), OPERATION, None, page_sizer=PageSizer(initial=40), page_size=30)
+
+    assert client.requested_page_sizes == [30, 30, 30, 30]
+
+
+def test_iter_objects_streams_pages_with_prefetch():
+    client = PagedClient(10)
+    records = iter_objects(client, Operations(), OPERATION, None)
+
+    assert next(records) == 0
+    # page 2 is prefetched while the caller works through page 1
+    deadline = time.time() + 5
+    while len(client.requested_pages) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.requested_pages == [1, 2]
+    assert list(records) == list(range(1, 10))
+    assert client.requested_pages == [1, 2, 3, 4]
+
+
+def test_iter_api_functions_generated():
+    assert callable(Elicit.iter_data_points)
+    assert callable(Elicit.iter_time_series)
+    assert callable(Elicit.iter_trial_results)
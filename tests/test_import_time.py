@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+# Generous budgets for a cold interpreter; they catch regressions like eager pyswagger/pandas imports or network
+# access at import time, not small slowdowns.
+IMPORT_BUDGET_SECONDS = 0.5
+COMMAND_LINE_IMPORT_BUDGET_SECONDS = 1.5
+
+NO_NETWORK = """
+import socket
+def no_network(*args, **kwargs):
+    raise socket.gaierror('no network at import time')
+socket.getaddrinfo = no_network
+"""
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, '-c', NO_NETWORK + code], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_import_is_lazy_and_fast():
+    output = run_python("""
+import sys, time
+start = time.perf_counter()
+import pyelicit
+elapsed = time.perf_counter() - start
+print(elapsed, 'pyswagger' in sys.modules, 'pandas' in sys.modules)
+""")
+    elapsed, pyswagger_loaded, pandas_loaded = output.split()
+
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
+    assert pyswagger_loaded == 'False'
+    assert pandas_loaded == 'False'
+
+
+def test_command_line_import_needs_no_network():
+    output = run_python("""
+import time
+start = time.perf_counter()
+import pyelicit.command_line as command_line
+elapsed = time.perf_counter() - start
+args = command_line.add_command_line_args_default(command_line.get_parser().parse_args(['--env', 'local']))
+print(elapsed, args['api_url'], 'prod_ip' in command_line.ENVIRONMENTS)
+""")
+    elapsed, api_url, has_prod_ip = output.split()
+
+    assert float(elapsed) < COMMAND_LINE_IMPORT_BUDGET_SECONDS
+    assert api_url == 'http://localhost:3000'
+    assert has_prod_ip == 'True'
+
+
+def test_prod_ip_resolved_on_selection():
+    from unittest.mock import patch
+    import socket
+    from pyelicit.command_line import Environments, prod_ip_url
+
+    environments = Environments(prod_ip=prod_ip_url)
+    answers = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 443))]
+    with patch('pyelicit.command_line.socket.getaddrinfo', return_value=answers) as mock_getaddrinfo:
+        assert environments['prod_ip'] == 'https://192.0.2.1'
+        assert environments['prod_ip'] == 'https://192.0.2.1'
+
+    mock_getaddrinfo.assert_called_once()
@@ -0,0 +1,105 @@
+import json
+from types import SimpleNamespace
+
+from pyswagger import App
+from requests.models import Response
+from pyelicit.api import ElicitClient, Metrics, JsonLinesSink, PrometheusSink
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {'title': 'Elicit', 'version': 'v1'},
+    'host': 'test.com',
+    'basePath': '/api/v1',
+    'schemes': ['https'],
+    'paths': {
+        '/users': {
+            'get': {
+                'operationId': 'findUsers',
+                'parameters': [{'name': 'authorization', 'in': 'header', 'type': 'string'},
+                               {'name': 'page', 'in': 'query', 'type': 'integer'}],
+                'responses': {'200': {'description': 'users', 'schema': {'type': 'array', 'items': {'type': 'object'}}},
+                              '401': {'description': 'unauthorized'}}
+            }
+        }
+    }
+}
+
+
+class FakeServer:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def send(self, request, **kwargs):
+        response = Response()
+        response.headers['Content-Type'] = 'application/json'
+        response.status_code = self.statuses.pop(0)
+        response._content = b'[{"id": 1}, {"id": 2}]'
+        return response
+
+
+def make_client(tmp_path, statuses, metrics):
+    (tmp_path / 'swagger.json').write_text(json.dumps(SWAGGER))
+    app = App.create((tmp_path / 'swagger.json').as_uri())
+    client = ElicitClient(metrics=metrics)
+    client.session.send = FakeServer(statuses).send
+    return app, client
+
+
+def test_request_recorded_in_every_sink(tmp_path):
+    prometheus_path = tmp_path / 'elicit.prom'
+    metrics = Metrics()
+    metrics.add_sink(JsonLinesSink(tmp_path / 'metrics.jsonl'))
+    metrics.add_sink(PrometheusSink(prometheus_path))
+    app, client = make_client(tmp_path, [200, 200], metrics)
+
+    client.request(app.op['findUsers'](authorization='Bearer token', page=2))
+    client.request(app.op['findUsers'](authorization='Bearer token', page=3))
+    metrics.close()
+
+    lines = [json.loads(line) for line in (tmp_path / 'metrics.jsonl').read_text().splitlines()]
+    assert [(line['operation'], line['status'], line['page'], line['retries']) for line in lines] == \
+        [('findUsers', 200, 2, 0), ('findUsers', 200, 3, 0)]
+    assert all(line['bytes'] == len(b'[{"id": 1}, {"id": 2}]') and line['latency'] >= 0 for line in lines)
+
+    prometheus = prometheus_path.read_text()
+    assert 'elicit_client_request_duration_seconds_bucket{operation="findUsers",le="+Inf"} 2' in prometheus
+    assert 'elicit_client_request_duration_seconds_count{operation="findUsers"} 2' in prometheus
+    assert 'elicit_client_errors_total{operation="findUsers"} 0' in prometheus
+
+    summary = metrics.summary()
+    assert 'findUsers' in summary.splitlines()[2]
+
+
+def test_unauthorized_retry_counted(tmp_path):
+    metrics = Metrics()
+    app, client = make_client(tmp_path, [401, 200], metrics)
+    client.on_unauthorized = lambda: 'Bearer fresh'
+
+    resp = client.request(app.op['findUsers'](authorization='Bearer stale'))
+
+    assert resp.status == 200
+    stats = metrics.histogram.operations['findUsers']
+    assert (stats.count, stats.retries, stats.errors) == (1, 1, 0)
+
+
+def test_transport_retries_counted_from_response_hook():
+    client = ElicitClient(metrics=Metrics())
+    client.last_response.retries = 0
+    retried = SimpleNamespace(raw=SimpleNamespace(retries=SimpleNamespace(history=('503', '503'))))
+
+    client.remember_response(retried)
+
+    assert client.last_response.retries == 2
+
+
+def test_histogram_quantiles():
+    metrics = Metrics()
+    for latency in [0.001] * 90 + [0.3] * 10:
+        metrics.record('findDataPoints', 200, latency, 100)
+    metrics.record('findDataPoints', 503, 2.0, 0)
+
+    stats = metrics.histogram.operations['findDataPoints']
+    assert stats.quantile(0.5) == 0.005
+    assert stats.quantile(0.95) == 0.5
+    assert stats.quantile(1.0) == 2.0
+    assert (stats.count, stats.errors, stats.bytes) == (101, 1, 10000)
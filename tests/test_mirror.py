@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def server_options():
+    return dict(num_data_points=120, num_time_series=5)
+
+
+@pytest.fixture
+def elicit_options(tmp_path):
+    return dict(mirror_dir=str(tmp_path / 'mirror'))
+
+
+def find_requests(server, operation):
+    return sum(1 for requested, _ in server.requests if requested == operation)
+
+
+def test_find_reads_from_mirror(server, make_elicit):
+    elicit = make_elicit(server)
+    assert elicit.mirror_results(study_definition_id=3) == dict(findDataPoints=120)
+    requests = find_requests(server, 'findDataPoints')
+
+    data_points = elicit.find_data_points(study_definition_id=3, decode='dict')
+    assert [data_point['id'] for data_point in data_points] == list(range(1, 121))
+    assert data_points[0]['datetime'] == '2024-01-01T00:00:00.000Z'
+
+    # other arguments are looked up in the indexes
+    by_component = elicit.find_data_points(study_definition_id=3, component_id=4, decode='record')
+    assert [data_point.id for data_point in by_component] == list(range(4, 121, 10))
+
+    models = elicit.find_data_points(study_definition_id=3, component_id=4, id=14)
+    assert [(model.id, model.study_definition_id) for model in models] == [(14, 3)]
+
+    assert find_requests(server, 'findDataPoints') == requests
+
+
+def test_uncovered_and_stale_queries_go_to_the_server(server, make_elicit):
+    elicit = make_elicit(server)
+    elicit.mirror().update('findDataPoints', study_definition_id=3)
+    requests = find_requests(server, 'findDataPoints')
+
+    assert len(elicit.find_data_points(study_definition_id=4, decode='dict')) == 120
+    # a single page is for the server to number
+    assert len(elicit.find_data_points(study_definition_id=3, page=2, page_size=50, decode='dict')) == 50
+    assert find_requests(server, 'findDataPoints') > requests
+
+    stale = make_elicit(server, mirror_max_age=0)
+    assert stale.mirror().table('findDataPoints', study_definition_id=3) is None
+
+
+def test_mirror_is_memory_mapped_and_reopened(server, tmp_path, make_elicit):
+    elicit = make_elicit(server)
+    elicit.mirror().update('findTimeSeries', study_result_id=2)
+    elicit.mirror().update('findTimeSeries', study_result_id=2)
+    # only the current listing stays mapped
+    assert [Path(path).name for path in elicit.mirror().tables] == \
+        [path.name for path in (tmp_path / 'mirror' / 'findTimeSeries').glob('*.arrow')]
+
+    # a later session reads the manifest; nested objects round-trip through JSON
+    table = make_elicit(server).mirror().table('findTimeSeries', study_result_id=2)
+    assert table.num_rows == 5
+    assert all(buffer is None or not buffer.is_mutable for buffer in table.column('id').chunk(0).buffers())
+    time_series = make_elicit(server).find_time_series(study_result_id=2, stage_id=1, decode='dict')
+    assert time_series[0]['file'] == dict(url='/time_series/1.tsv')
+    assert len(list((tmp_path / 'mirror' / 'findTimeSeries').glob('*.arrow'))) == 1
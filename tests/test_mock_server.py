@@ -0,0 +1,103 @@
+import time
+
+import pytest
+import requests
+
+from pyelicit.testing import MockElicitServer
+
+
+@pytest.fixture
+def server_options():
+    return dict(num_users=20, num_data_points=95, num_time_series=7)
+
+
+def test_find_data_points_follows_pagination(server, make_elicit):
+    elicit = make_elicit(server, concurrency=4)
+
+    data_points = elicit.find_data_points(study_result_id=7, page_size=10, decode='dict')
+
+    assert [data_point['id'] for data_point in data_points] == list(range(1, 96))
+    assert all(data_point['study_result_id'] == 7 for data_point in data_points)
+    pages = sorted(int(args['page']) for operation, args in server.requests if operation == 'findDataPoints')
+    assert pages == list(range(1, 11))
+
+
+def test_find_time_series_models(server, make_elicit):
+    elicit = make_elicit(server)
+
+    time_series = elicit.find_time_series(study_result_id=1, page_size=5)
+
+    assert len(time_series) == 7
+    assert time_series[0].file.url == '/time_series/1.tsv'
+
+
+def test_find_time_series_records(server, make_elicit):
+    elicit = make_elicit(server, decode='record')
+
+    time_series = elicit.find_time_series(study_result_id=1, page_size=5)
+    users = elicit.find_users(role='admin')
+
+    assert type(time_series[0]).__name__ == 'TimeSeries'
+    assert time_series[0].file.url == '/time_series/1.tsv'
+    assert users and all(user.role == 'admin' for user in users)
+
+
+def test_max_page_size_truncates_pages(make_elicit):
+    with MockElicitServer(num_data_points=30, max_page_size=8) as server:
+        elicit = make_elicit(server)
+        assert len(elicit.find_data_points(page_size=100, decode='dict')) == 30
+
+
+def test_adaptive_page_size_finds_server_cap(make_elicit):
+    with MockElicitServer(num_data_points=1000, max_page_size=250) as server:
+        elicit = make_elicit(server)
+        assert elicit.elicit_api.parameter_maximum('findDataPoints', 'page_size') is None
+
+        listings = []
+        for _ in range(3):
+            requests = len(server.requests)
+            assert len(elicit.find_data_points(decode='dict')) == 1000
+            listings.append([int(args['page_size']) for operation, args in server.requests[requests:]
+                             if operation == 'findDataPoints'])
+
+        # without a declared limit, the size grows from one listing to the next until a page is truncated
+        assert listings == [[100] * 10, [200] * 5, [400, 250, 250, 250]]
+        assert elicit.page_sizer.limit('findDataPoints') == 250
+
+
+def test_ensure_users_creates_missing_users(server, make_elicit):
+    elicit = make_elicit(server, concurrency=4)
+
+    participants = elicit.ensure_users(num_registered=8, num_anonymous=3)
+
+    # 20 users cycle through four roles, so 5 registered exist and 3 must be created; 5 anonymous exist
+    assert sum(user.role == 'registered_user' for user in participants) == 8
+    assert sum(user.role == 'anonymous_user' for user in participants) == 3
+    assert len(server.created['addUser']) == 3
+
+
+def test_add_objects_get_ids_from_path(server, make_elicit):
+    elicit = make_elicit(server)
+
+    study = elicit.add_study(study=dict(study_definition=dict(title='Study', description='Mock')))
+    protocol = elicit.add_protocol_definition(
+        protocol_definition=dict(protocol_definition=dict(name='Protocol', study_definition_id=study.id)),
+        study_definition_id=study.id)
+
+    assert protocol.study_definition_id == study.id
+    assert server.created['addStudy'][0]['title'] == 'Study'
+
+
+def test_requests_need_a_token(server):
+    status, _, _ = server.handle('GET', '/api/v1/users', {}, {}, None)
+    assert status == 401
+
+
+def test_timeout_of_a_dict_configuration(server, make_elicit):
+    elicit = make_elicit(server, timeout=0.05, max_retries=0)
+
+    server.latency = 0.2
+    with pytest.raises(requests.exceptions.RequestException):
+        elicit.find_data_points(page_size=10, decode='dict')
+    # let the abandoned request finish before the server stops
+    time.sleep(server.latency)
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from pyswagger import App
+
+from pyelicit.api.operations import compile_operations
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {'title': 'Elicit', 'version': 'v1'},
+    'host': 'test.com',
+    'basePath': '/api/v1',
+    'paths': {
+        '/study_definitions/{study_definition_id}/data_points': {
+            'get': {
+                'operationId': 'findDataPoints',
+                'parameters': [
+                    {'name': 'authorization', 'in': 'header', 'type': 'string', 'required': True},
+                    {'name': 'study_definition_id', 'in': 'path', 'type': 'integer', 'required': True},
+                    {'name': 'page', 'in': 'query', 'type': 'integer', 'default': 1},
+                    {'name': 'page_size', 'in': 'query', 'type': 'integer', 'maximum': 1000},
+                    {'name': 'kind', 'in': 'query', 'type': 'string', 'enum': ['a', 'b']},
+                    {'name': 'email', 'in': 'query', 'type': 'string'},
+                ],
+                'responses': {'200': {'description': 'data points'}}},
+            'post': {
+                'operationId': 'addDataPoint',
+                'parameters': [
+                    {'name': 'study_definition_id', 'in': 'path', 'type': 'integer', 'required': True},
+                    {'name': 'data_point', 'in': 'body', 'required': True,
+                     'schema': {'type': 'object', 'properties': {'value': {'type': 'string'}}}},
+                ],
+                'responses': {'201': {'description': 'created'}}},
+        },
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('swagger') / 'swagger.json'
+    path.write_text(json.dumps(SWAGGER))
+    return App.create(path.as_uri())
+
+
+@pytest.mark.parametrize('operation, args', [
+    ('findDataPoints', dict(authorization='Bearer x', study_definition_id=3, page_size='50', email=7)),
+    ('findDataPoints', dict(authorization='Bearer x', study_definition_id='3', page=2, kind='a', email='a@b.c')),
+    ('addDataPoint', dict(study_definition_id=3, data_point=dict(value='v'))),
+])
+def test_compiled_operations_match_pyswagger(app, operation, args):
+    req, _ = compile_operations(app)[operation](**args)
+    expected, _ = app.op[operation](**args)
+
+    assert req._p == expected._p
+    assert req._Request__op is expected._Request__op
+
+
+@pytest.mark.parametrize('args', [
+    dict(study_definition_id=3),                                        # missing authorization
+    dict(authorization='x', study_definition_id=3, page_size=5000),     # above maximum
+    dict(authorization='x', study_definition_id=3, kind='c'),           # not in enum
+    dict(authorization='x', study_definition_id='three'),
+    dict(authorization='x', study_definition_id=3, size=10),            # unknown
+])
+def test_compiled_operations_reject_what_pyswagger_rejects(app, args):
+    with pytest.raises(Exception):
+        app.op['findDataPoints'](**args)
+    with pytest.raises(Exception):
+        compile_operations(app)['findDataPoints'](**args)
+
+
+def test_operations_are_compiled_once_per_app(app):
+    assert compile_operations(app) is compile_operations(app)
+    assert compile_operations(app)['findDataPoints'].auth_parameter == 'authorization'
+    assert compile_operations(app)['addDataPoint'].auth_parameter is None
@@ -0,0 +1,83 @@
+import pytest
+
+
+@pytest.fixture
+def server_options():
+    # 400 users cycling through four roles: 100 of each
+    return dict(num_users=400)
+
+
+def user_pages(server):
+    return [args for operation, args in server.requests if operation == 'findUsers']
+
+
+def test_find_users_filters_on_the_server(server, make_elicit):
+    server.users[3]['email'] = 'worker@mturk.com'
+    elicit = make_elicit(server)
+
+    users = elicit.find_users(role=server.users[3]['role'], email='mturk', decode='dict')
+
+    assert [user['id'] for user in users] == [server.users[3]['id']]
+    assert user_pages(server) == [dict(role=server.users[3]['role'], email='mturk', page='1', page_size='100')]
+
+
+def test_picking_participants_takes_a_request_per_role(server, make_elicit):
+    elicit = make_elicit(server)
+    anonymous = [user for user in server.users if user['role'] == 'anonymous_user']
+    anonymous[0]['email'] = 'worker@mturk.com'
+
+    participants = elicit.ensure_users(num_registered=20, num_anonymous=99)
+    again = elicit.ensure_users(num_registered=20, num_anonymous=99)
+
+    assert [user.id for user in participants] == [user.id for user in again]
+    assert anonymous[0]['id'] not in [user.id for user in participants]
+    assert sorted(args['role'] for args in user_pages(server)) == ['anonymous_user', 'registered_user']
+    assert server.created['addUser'] == []
+
+
+def test_index_is_saved_and_refreshed(server, tmp_path, make_elicit):
+    index_path = tmp_path / 'participants.json'
+    elicit = make_elicit(server, participant_index=str(index_path))
+    elicit.ensure_users(num_registered=100, num_anonymous=0)
+
+    # created through the index: no new lookup needed to pick them
+    created = elicit.ensure_users(num_registered=102, num_anonymous=0)[100:]
+    assert len(server.created['addUser']) == 2 and len(user_pages(server)) == 1
+
+    later = make_elicit(server, participant_index=str(index_path))
+    assert len(later.participant_index()) == 102
+    server.users.append(server.make_user(10000, 'registered_user'))
+
+    assert later.participant_index().refresh('registered_user') == 1
+    assert later.participant_index().pick('registered_user', 103)[-1].id == 10000
+    assert [user.id for user in later.participant_index().pick('registered_user', 102)[100:]] == \
+        [user.id for user in created]
+
+
+def test_index_saves_users_with_dates(server, tmp_path, make_elicit):
+    index_path = tmp_path / 'participants.json'
+    # models with Datetime fields, both from findUsers and from addUser
+    elicit = make_elicit(server, participant_index=str(index_path))
+    elicit.ensure_users(num_registered=101, num_anonymous=0)
+    index = elicit.participant_index()
+    index.save()
+
+    later = make_elicit(server, participant_index=str(index_path)).participant_index()
+    assert len(later) == len(index) == 101
+    users = later.pick('registered_user', 101)
+    assert {user.created_at for user in users} == {'2024-01-01T00:00:00.000Z', '2024-01-01T00:00:00+00:00'}
+    assert later.pools == index.pools
+
+
+@pytest.mark.parametrize('decode', [None, 'dict', 'record'])
+def test_existing_and_created_users_come_back_alike(server, make_elicit, decode):
+    elicit = make_elicit(server, decode=decode)
+
+    participants = elicit.ensure_users(num_registered=102, num_anonymous=0)
+
+    assert len({type(user) for user in participants}) == 1
+    found = elicit.find_users(page_size=1)[0]
+    assert type(participants[0]) is type(found)
+    created_at = [user['created_at'] if decode == 'dict' else user.created_at for user in (participants[0],
+                                                                                           participants[-1])]
+    assert type(created_at[0]) is type(created_at[1])
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyelicit.pool import ElicitPool
+from pyelicit.testing import MockElicitServer
+
+
+@pytest.fixture
+def server():
+    with MockElicitServer(num_users=10, num_data_points=40, latency=0.02) as server:
+        yield server
+
+
+def make_pool(server, tmp_path, **overrides):
+    return ElicitPool(server.configuration(spec_cache_dir=str(tmp_path / 'swagger'), **overrides), max_sessions=2)
+
+
+def logins(server):
+    return sum(operation == 'getAuthToken' for operation, _ in server.requests)
+
+
+def test_sessions_share_the_backend(server, tmp_path):
+    with make_pool(server, tmp_path) as pool:
+        admin = pool.session()
+        other = pool.session('other@elicit.com', 'secret')
+
+        assert pool.session() is admin
+        assert other is not admin and other.creds.user == 'other@elicit.com'
+        assert other.elicit_api.app is admin.elicit_api.app
+        url = server.url + '/api/v1/users'
+        assert other.client.session.get_adapter(url) is admin.client.session.get_adapter(url)
+
+        admin.find_data_points(page_size=20, decode='dict')
+        other.find_data_points(page_size=20, decode='dict')
+        assert pool.metrics_summary().count('findDataPoints') == 1
+
+
+def test_new_sessions_reuse_tokens(server, tmp_path):
+    with make_pool(server, tmp_path) as pool:
+        first = pool.session('a@elicit.com', 'a')
+        pool.session('b@elicit.com', 'b')
+        pool.session('c@elicit.com', 'c')
+        assert len(pool) == 2 and logins(server) == 3
+
+        # evicted, recreated from the cached token
+        again = pool.session('a@elicit.com', 'a')
+        assert again is not first and logins(server) == 3
+        assert again.auth_header() == first.auth_header()
+
+        # but not for a caller with another password
+        assert pool.session('a@elicit.com', 'guess').auth_header() != first.auth_header()
+
+
+def test_requests_in_flight_are_capped(server, tmp_path):
+    with make_pool(server, tmp_path, max_in_flight=2) as pool:
+        sessions = [pool.session('user%d@elicit.com' % index, 'password') for index in range(2)]
+        server.peak_in_flight = 0
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda page: sessions[page % 2].find_data_points(page=page, page_size=5,
+                                                                                         decode='dict'),
+                                        range(1, 9)))
+
+        assert all(len(result) == 5 for result in results)
+        assert server.peak_in_flight == 2
+
+
+def test_sessions_do_not_print_secrets(tmp_path, capsys):
+    with MockElicitServer(num_users=4) as server:
+        pool = ElicitPool(server.configuration(spec_cache_dir=str(tmp_path)))
+        pool.session('tenant@elicit.com', 'tenant-password')
+
+    output = capsys.readouterr().out
+    assert 'tenant@elicit.com' in output
+    assert 'tenant-password' not in output
+    assert "'secret'" not in output and ' secret' not in output
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from pyelicit.elicit import Elicit, encode_definition_data
+from pyelicit.prepared import Slot
+from pyelicit.testing import MockElicitServer
+
+
+@pytest.fixture
+def elicit(tmp_path):
+    with MockElicitServer(num_users=4) as server:
+        elicit = Elicit(server.configuration(spec_cache_dir=str(tmp_path / 'swagger')))
+        elicit.server = server
+        yield elicit
+
+
+def test_encode_definition_data_copies():
+    definition_data = dict(Instruments=[1, 2])
+    args = dict(component=dict(component=dict(name='c', definition_data=definition_data)), trial_definition_id=3)
+
+    encoded = encode_definition_data(args)
+
+    assert json.loads(encoded['component']['component']['definition_data']) == definition_data
+    assert args['component']['component']['definition_data'] is definition_data
+
+
+def test_stamp_fills_slots_at_any_depth(elicit):
+    payload = elicit.prepare('addComponent',
+                             component=dict(component=dict(name=Slot('name'), trial_definition_id=Slot('trial'),
+                                                           definition_data=dict(TrialId=Slot('trial'),
+                                                                                Label=Slot('name')))))
+
+    body = json.loads(payload.stamp(name='Say "hi"', trial=7))['component']
+
+    assert body['name'] == 'Say "hi"' and body['trial_definition_id'] == 7
+    assert json.loads(body['definition_data']) == dict(TrialId=7, Label='Say "hi"')
+    with pytest.raises(ValueError):
+        payload.stamp(name='x')
+
+
+def test_add_prepared_reuses_the_payload(elicit):
+    path_ids = dict(study_definition_id=1, protocol_definition_id=2, phase_definition_id=3)
+    payload = elicit.prepare('addComponent',
+                             component=dict(component=dict(name='Question',
+                                                           definition_data=dict(Instruments=['Q'],
+                                                                                TrialId=Slot('trial')))),
+                             **path_ids)
+
+    components = [elicit.add_prepared(payload, values=dict(trial=trial_id), trial_definition_id=trial_id)
+                  for trial_id in (10, 11, 12)]
+
+    assert [component.trial_definition_id for component in components] == [10, 11, 12]
+    assert [json.loads(created['definition_data'])['TrialId'] for created in elicit.server.created['addComponent']] \
+        == [10, 11, 12]
+    assert all(created['phase_definition_id'] == 3 for created in elicit.server.created['addComponent'])
+
+
+def test_prepared_parameters_are_validated(elicit):
+    payload = elicit.prepare('addTrialDefinition', trial_definition=dict(trial_definition=dict(name='Trial')))
+
+    with pytest.raises(ValueError):
+        elicit.add_prepared(payload, study_definition_id=1, protocol_definition_id=2, phase_definition_id='three')
+    with pytest.raises(ValueError):
+        elicit.add_prepared(payload, study_definition_id=1, protocol_definition_id=2, phase_definition_id=3,
+                            trial_definition=dict())
+    assert elicit.server.created['addTrialDefinition'] == []
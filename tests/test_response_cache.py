@@ -0,0 +1,96 @@
+import pytest
+
+from pyelicit.api import ResponseCache, MemoryBackend, DiskBackend, CacheEntry
+from pyelicit.elicit import find_objects
+
+
+@pytest.fixture
+def server_options():
+    return dict(num_users=12)
+
+
+def find_users(elicit, **args):
+    return find_objects(elicit.client, elicit.elicit_api, 'findUsers', None, **args)
+
+
+def find_users_requests(server):
+    return sum(operation == 'findUsers' for operation, _ in server.requests)
+
+
+def test_repeated_find_served_from_cache(server, make_elicit):
+    elicit = make_elicit(server, cache_ttl=60)
+
+    first = find_users(elicit, page_size=5, decode='dict')
+    second = find_users(elicit, page_size=5, decode='dict')
+
+    assert first == second
+    assert find_users_requests(server) == 3
+    assert elicit.client.response_cache.stats['hits'] == 3
+
+
+def test_stale_entries_revalidated_with_etag(server, make_elicit):
+    elicit = make_elicit(server, cache_ttl=0)
+
+    first = find_users(elicit, page_size=5)
+    second = find_users(elicit, page_size=5)
+
+    assert [user.id for user in second] == [user.id for user in first]
+    assert find_users_requests(server) == 6
+    assert elicit.client.response_cache.stats['revalidated'] == 3
+
+
+def test_add_invalidates_resource(server, make_elicit):
+    elicit = make_elicit(server, cache_ttl=60)
+
+    assert len(find_users(elicit, page_size=100)) == 12
+    elicit.add_user(user=dict(user=dict(username='new', email='new@elicit.com', role='registered_user')))
+
+    assert len(find_users(elicit, page_size=100)) == 13
+    assert find_users_requests(server) == 2
+
+
+def test_per_operation_ttl_disables_caching(server, make_elicit):
+    elicit = make_elicit(server, cache_ttl=60, cache_ttls=dict(findUsers=None))
+
+    find_users(elicit, page_size=100)
+    find_users(elicit, page_size=100)
+
+    assert find_users_requests(server) == 2
+
+
+def test_disk_cache_shared_between_sessions(server, tmp_path, make_elicit):
+    for session in range(2):
+        elicit = make_elicit(server, cache_ttl=60, cache_dir=str(tmp_path / 'responses'))
+        users = find_users(elicit, page_size=100)
+
+    assert len(users) == 12
+    assert find_users_requests(server) == 1
+
+
+@pytest.mark.parametrize('make_backend', [lambda tmp_path: MemoryBackend(max_entries=2),
+                                          lambda tmp_path: DiskBackend(tmp_path, max_entries=2)])
+def test_backends_evict_least_recently_used(tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+    for key in 'abc':
+        if key == 'c':
+            backend.get('a')
+        backend.put(key, CacheEntry('findComponents', 200, [('ETag', '"%s"' % key)], b'[]', None, 0.0))
+
+    assert backend.get('b') is None
+    assert backend.get('a').headers == [('ETag', '"a"')]
+    assert len(backend) == 2
+
+    ResponseCache(backend).invalidate('addComponent')
+    assert len(backend) == 0
+
+
+def test_invalidate_matches_whole_resource_names():
+    backend = MemoryBackend()
+    for key, operation in enumerate(['findUsers', 'getUser', 'findProtocolUsers', 'findStudyUsers', 'findStudies']):
+        backend.put(str(key), CacheEntry(operation, 200, [], b'[]', None, 0.0))
+
+    ResponseCache(backend).invalidate('addUser')
+    assert [backend.get(str(key)) is None for key in range(5)] == [True, True, False, False, False]
+
+    ResponseCache(backend).invalidate('addStudy')
+    assert backend.get('4') is None
@@ -0,0 +1,91 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from pyelicit.api import RequestScheduler
+from pyelicit.elicit import Elicit
+from pyelicit.testing import MockElicitServer
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_token_bucket_limits_rate():
+    scheduler = RequestScheduler(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        with scheduler:
+            pass
+
+    assert time.monotonic() - start >= 0.18
+    assert scheduler.stats()['requests'] == 11
+
+
+def test_jobs_take_turns():
+    scheduler = RequestScheduler(max_in_flight=1)
+    started = []
+
+    def request(job):
+        with scheduler.job(job), scheduler:
+            started.append(job)
+
+    # hold the only slot while job a queues five requests, then job b two
+    scheduler.acquire()
+    threads = []
+    for job, count in (('a', 5), ('b', 2)):
+        for _ in range(count):
+            threads.append(threading.Thread(target=request, args=(job,)))
+            threads[-1].start()
+        wait_until(lambda: scheduler.stats()['queued'] == len(threads))
+    assert scheduler.stats()['queued_by_job'] == dict(a=5, b=2)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+
+    assert started == ['a', 'b', 'a', 'b', 'a', 'a', 'a']
+    assert scheduler.stats()['peak_queued'] == 7
+
+
+def test_throttled_responses_pause_every_job():
+    scheduler = RequestScheduler()
+    throttled = SimpleNamespace(status=429, header={'Retry-After': ['0.2']})
+    assert scheduler.throttled(throttled)
+
+    start = time.monotonic()
+    with scheduler.job('other'), scheduler:
+        pass
+    assert time.monotonic() - start >= 0.15
+    assert scheduler.stats()['throttled'] == 1
+
+    used_up = SimpleNamespace(status=200, header={'x-ratelimit-remaining': ['0'], 'X-RateLimit-Reset': ['0.1']})
+    assert not scheduler.throttled(used_up)
+    assert scheduler.stats()['paused_for'] > 0
+
+
+def test_elicit_retries_429_responses(tmp_path):
+    with MockElicitServer(num_data_points=30) as server:
+        elicit = Elicit(server.configuration(spec_cache_dir=str(tmp_path), rate_limit=1000, max_in_flight=2,
+                                           concurrency=2))
+        server.throttle = 2
+
+        with elicit.job('study 1'):
+            data_points = elicit.find_data_points(study_result_id=1, page_size=10, decode='dict')
+
+        assert len(data_points) == 30
+        stats = elicit.scheduler_stats()
+        assert stats['throttled'] == 2
+        assert stats['in_flight'] == 0
+        assert server.peak_in_flight <= 2
+
+
+def test_429_is_retried_without_a_scheduler(tmp_path):
+    with MockElicitServer(num_data_points=5) as server:
+        elicit = Elicit(server.configuration(spec_cache_dir=str(tmp_path)))
+        server.throttle = 1
+
+        assert len(elicit.find_data_points(page_size=10, decode='dict')) == 5
+        assert elicit.scheduler_stats() is None
@@ -0,0 +1,75 @@
+import json
+import pytest
+
+from unittest.mock import MagicMock, patch
+from pyelicit.api.spec_cache import SpecCache
+
+SWAGGER_URL = 'https://test.com/apidocs/v1/swagger.json'
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {'title': 'Elicit', 'version': 'v1'},
+    'host': 'test.com',
+    'basePath': '/api/v1',
+    'schemes': ['https'],
+    'paths': {
+        '/users': {
+            'get': {
+                'operationId': 'findUsers',
+                'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'}],
+                'responses': {'200': {'description': 'users',
+                                      'schema': {'type': 'array', 'items': {'$ref': '#/definitions/User'}}}}
+            }
+        }
+    },
+    'definitions': {'User': {'type': 'object', 'properties': {'id': {'type': 'integer'}, 'role': {'type': 'string'}}}}
+}
+
+
+def swagger_response(status_code=200, etag='"v1"'):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = json.dumps(SWAGGER).encode('utf-8')
+    response.headers = {'ETag': etag}
+    return response
+
+
+def test_cold_start_downloads_and_snapshots(tmp_path):
+    cache = SpecCache(cache_dir=tmp_path)
+
+    with patch('pyelicit.api.spec_cache.requests.get', return_value=swagger_response()) as mock_get:
+        app = cache.load_app(SWAGGER_URL)
+
+    mock_get.assert_called_once_with(SWAGGER_URL, headers={})
+    assert 'findUsers' in app.op
+    entry = cache.entry_dir(SWAGGER_URL)
+    assert (entry / SpecCache.SPEC_FILE).is_file()
+    assert (entry / SpecCache.SNAPSHOT_FILE).is_file()
+
+
+def test_warm_start_revalidates_and_skips_resolution(tmp_path):
+    cache = SpecCache(cache_dir=tmp_path)
+    with patch('pyelicit.api.spec_cache.requests.get', return_value=swagger_response()):
+        cache.load_app(SWAGGER_URL)
+
+    with patch('pyelicit.api.spec_cache.requests.get', return_value=swagger_response(304)) as mock_get, \
+            patch('pyelicit.api.spec_cache.App.create') as mock_create:
+        app = cache.load_app(SWAGGER_URL)
+
+    assert mock_get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+    mock_create.assert_not_called()
+    assert 'findUsers' in app.op
+
+
+def test_offline_mode(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SpecCache(cache_dir=tmp_path, offline=True).load_app(SWAGGER_URL)
+
+    with patch('pyelicit.api.spec_cache.requests.get', return_value=swagger_response()):
+        SpecCache(cache_dir=tmp_path).load_app(SWAGGER_URL)
+
+    with patch('pyelicit.api.spec_cache.requests.get') as mock_get:
+        app = SpecCache(cache_dir=tmp_path, offline=True).load_app(SWAGGER_URL)
+
+    mock_get.assert_not_called()
+    assert 'findUsers' in app.op
@@ -0,0 +1,108 @@
+import itertools
+import json
+import threading
+
+from http import HTTPStatus
+from types import SimpleNamespace
+from pyelicit.elicit import _pp
+from pyelicit.study_builder import StudyBuilder
+
+
+class StudyServer:
+    """Creates objects with increasing ids, recording each create; fails operations listed in `fail`"""
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.ids = itertools.count(1)
+        self.created = []
+        self.lock = threading.Lock()
+
+    def __getitem__(self, op):
+        return lambda **args: (op, args)
+
+    def request(self, op_args):
+        op, args = op_args
+        if op in self.fail:
+            return SimpleNamespace(status=HTTPStatus.UNPROCESSABLE_ENTITY, data=None)
+        with self.lock:
+            object_id = next(self.ids)
+            self.created.append((op, object_id, args))
+        return SimpleNamespace(status=HTTPStatus.CREATED, data=SimpleNamespace(id=object_id))
+
+
+def study_tree(num_trials=3, num_components=4):
+    trials = [[dict(Instruments=[dict(Instrument=dict(Header='trial %d component %d' % (t, c)))])
+               for c in range(num_components)] for t in range(num_trials)]
+    return dict(study_definition=dict(title='Study'),
+                protocols=[dict(protocol_definition=dict(name='Protocol'),
+                                phases=[dict(phase_definition=dict(definition_data=dict(x=1)), trials=trials)])])
+
+
+def make_builder(server, pp=None):
+    elicit = SimpleNamespace(client=server, elicit_api=server, concurrency=lambda: 4, pp=lambda: pp)
+    return StudyBuilder(elicit)
+
+
+def test_build_study_creates_the_whole_tree():
+    server = StudyServer()
+    summary = make_builder(server).run(study_tree())
+
+    assert summary.ok()
+    assert summary.created == {'addStudy': 1, 'addProtocolDefinition': 1, 'addPhaseDefinition': 1,
+                               'addTrialDefinition': 3, 'addComponent': 12, 'addTrialOrder': 1, 'addPhaseOrder': 1}
+
+    trial_ids = [summary.object('study', 'protocol', 0, 'phase', 0, 'trial', t).id for t in range(3)]
+    _, _, trial_order_args = next(c for c in server.created if c[0] == 'addTrialOrder')
+    assert trial_order_args['trial_order']['trial_order']['sequence_data'] == ','.join(map(str, trial_ids))
+
+    _, _, component_args = next(c for c in server.created if c[0] == 'addComponent')
+    component = component_args['component']['component']
+    assert isinstance(component['definition_data'], str)
+    assert json.loads(component['definition_data'])['Instruments']
+    assert component['trial_definition_id'] == component_args['trial_definition_id']
+
+
+def test_build_study_respects_dependencies():
+    server = StudyServer()
+    make_builder(server).run(study_tree())
+
+    order = {object_id: index for index, (op, object_id, args) in enumerate(server.created)}
+    for op, object_id, args in server.created:
+        for id_name in ['study_definition_id', 'protocol_definition_id', 'phase_definition_id', 'trial_definition_id']:
+            if id_name in args:
+                assert order[args[id_name]] < order[object_id]
+
+
+def test_build_study_skips_children_of_failures():
+    server = StudyServer(fail=('addTrialDefinition',))
+    summary = make_builder(server).run(study_tree())
+
+    assert not summary.ok()
+    assert len(summary.failures) == 3
+    # all components and the trial order depend on failed trials
+    assert len(summary.skipped) == 13
+    assert 'addComponent' not in summary.created
+
+
+def test_build_study_encodes_definition_data_of_every_node():
+    tree = study_tree(num_trials=1, num_components=1)
+    tree['study_definition']['definition_data'] = dict(study=1)
+    tree['protocols'][0]['protocol_definition']['definition_data'] = dict(protocol=1)
+    server = StudyServer()
+    make_builder(server).run(tree)
+
+    _, _, study_args = next(c for c in server.created if c[0] == 'addStudy')
+    assert json.loads(study_args['study']['study_definition']['definition_data']) == dict(study=1)
+    _, _, protocol_args = next(c for c in server.created if c[0] == 'addProtocolDefinition')
+    protocol_definition = protocol_args['protocol_definition']['protocol_definition']
+    assert json.loads(protocol_definition['definition_data']) == dict(protocol=1)
+    # the caller's tree is left as it is
+    assert tree['study_definition']['definition_data'] == dict(study=1)
+
+
+def test_build_study_prints_the_summary_only_when_debugging(capsys):
+    make_builder(StudyServer()).run(study_tree())
+    assert capsys.readouterr().out == ''
+
+    summary = make_builder(StudyServer(), pp=_pp).run(study_tree())
+    assert capsys.readouterr().out == str(summary) + '\n'
@@ -0,0 +1,91 @@
+import json
+import pytest
+
+from http import HTTPStatus
+from types import SimpleNamespace
+from pyelicit.sync import StudySync
+
+OPERATION = 'findTrialResults'
+
+
+class TrialResultsServer:
+    """Serves trial results in id order, optionally filtered by updated_since, and can fail a given page once"""
+
+    def __init__(self, parameters=()):
+        self.parameters = parameters
+        self.trial_results = []
+        self.requests = []
+        self.fail_page = None
+
+    def add(self, count, updated_at='2024-01-01T00:00:00Z'):
+        start = len(self.trial_results)
+        self.trial_results += [dict(id=i, updated_at=updated_at, value=i) for i in range(start, start + count)]
+
+    def __getitem__(self, op):
+        assert op == OPERATION
+        return lambda **args: (args, SimpleNamespace(raw_body_only=False))
+
+    def has_parameter(self, op, name):
+        return name in self.parameters
+
+    def request(self, req_and_resp):
+        args, resp = req_and_resp
+        self.requests.append(args)
+        if args['page'] == self.fail_page:
+            self.fail_page = None
+            raise ConnectionError('interrupted')
+        results = [r for r in self.trial_results if r['updated_at'] >= args.get('updated_since', '')]
+        page, page_size = args['page'], args['page_size']
+        return SimpleNamespace(status=HTTPStatus.OK, header={},
+                               raw=json.dumps(results[(page - 1) * page_size:page * page_size]).encode('utf-8'))
+
+
+def make_sync(tmp_path, server):
+    elicit = SimpleNamespace(client=server, elicit_api=server, pp=lambda: None)
+    return StudySync(elicit, tmp_path / 'checkpoints.sqlite', page_size=10)
+
+
+def test_sync_pages_past_last_seen_records(tmp_path):
+    server = TrialResultsServer()
+    server.add(25)
+    study_sync = make_sync(tmp_path, server)
+
+    first = study_sync.sync(OPERATION, 1, study_result_id=1)
+    server.add(10)
+    server.requests.clear()
+    second = study_sync.sync(OPERATION, 1, study_result_id=1)
+
+    assert (first.inserted, second.inserted, second.updated) == (25, 10, 0)
+    # the second pass starts at the partial third page
+    assert [args['page'] for args in server.requests] == [3, 4]
+    assert [r['id'] for r in study_sync.records(OPERATION, 1)] == list(range(35))
+
+
+def test_sync_uses_updated_since_watermark(tmp_path):
+    server = TrialResultsServer(parameters=('updated_since',))
+    server.add(15)
+    study_sync = make_sync(tmp_path, server)
+    study_sync.sync(OPERATION, 1)
+
+    server.trial_results[3] = dict(id=3, updated_at='2024-02-01T00:00:00Z', value='changed')
+    server.requests.clear()
+    result = study_sync.sync(OPERATION, 1)
+
+    assert server.requests[0]['updated_since'] == '2024-01-01T00:00:00Z'
+    assert result.updated == 1
+    assert study_sync.records(OPERATION, 1)[3]['value'] == 'changed'
+
+
+def test_sync_resumes_after_interruption(tmp_path):
+    server = TrialResultsServer()
+    server.add(45)
+    server.fail_page = 3
+    with pytest.raises(ConnectionError):
+        make_sync(tmp_path, server).sync(OPERATION, 1)
+
+    server.requests.clear()
+    result = make_sync(tmp_path, server).sync(OPERATION, 1)
+
+    assert [args['page'] for args in server.requests] == [3, 4, 5]
+    assert result.inserted == 25
+    assert len(make_sync(tmp_path, server).records(OPERATION, 1)) == 45
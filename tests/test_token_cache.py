@@ -0,0 +1,143 @@
+import json
+import time
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from unittest.mock import MagicMock
+from pyswagger import App
+from requests.models import Response
+from pyelicit.api import ElicitApi, ElicitCreds, TokenCache, Token
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {'title': 'Elicit', 'version': 'v1'},
+    'host': 'test.com',
+    'basePath': '/api/v1',
+    'schemes': ['https'],
+    'paths': {
+        '/oauth/token': {
+            'post': {
+                'operationId': 'getAuthToken',
+                'parameters': [{'name': 'auth_request', 'in': 'body', 'schema': {'type': 'object'}}],
+                'responses': {'200': {'description': 'token', 'schema': {'$ref': '#/definitions/Token'}}}
+            }
+        },
+        '/users/current': {
+            'get': {
+                'operationId': 'getCurrentUser',
+                'parameters': [{'name': 'authorization', 'in': 'header', 'type': 'string'}],
+                'responses': {'200': {'description': 'user', 'schema': {'$ref': '#/definitions/User'}},
+                              '401': {'description': 'unauthorized'}}
+            }
+        }
+    },
+    'definitions': {
+        'Token': {'type': 'object', 'properties': {'access_token': {'type': 'string'},
+                                                   'refresh_token': {'type': 'string'},
+                                                   'expires_in': {'type': 'integer'},
+                                                   'created_at': {'type': 'integer'}}},
+        'User': {'type': 'object', 'properties': {'id': {'type': 'integer'}, 'role': {'type': 'string'}}}
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    TokenCache._memory.clear()
+    yield
+    TokenCache._memory.clear()
+
+
+class FakeServer:
+    """Issues numbered tokens and only accepts the most recently issued one"""
+
+    def __init__(self, expires_in=7200):
+        self.expires_in = expires_in
+        self.issued = 0
+        self.grants = []
+
+    def send(self, request, **kwargs):
+        response = Response()
+        response.headers['Content-Type'] = 'application/json'
+        if request.path_url.startswith('/api/v1/oauth/token'):
+            self.grants.append(json.loads(request.body)['grant_type'])
+            self.issued += 1
+            body = dict(access_token='token%d' % self.issued, refresh_token='refresh%d' % self.issued,
+                        expires_in=self.expires_in, created_at=int(time.time()))
+            response.status_code = 200
+        elif request.headers['Authorization'] == 'Bearer token%d' % self.issued:
+            body = dict(id=1, role='admin')
+            response.status_code = 200
+        else:
+            body = dict(error='invalid token')
+            response.status_code = 401
+        response._content = json.dumps(body).encode('utf-8')
+        return response
+
+
+def make_api(tmp_path, server, token_cache):
+    (tmp_path / 'swagger.json').write_text(json.dumps(SWAGGER))
+    spec_cache = MagicMock()
+    spec_cache.load_app.return_value = App.create((tmp_path / 'swagger.json').as_uri())
+    elicit_api = ElicitApi(ElicitCreds(), 'https://test.com', dict(verify=True), spec_cache, token_cache=token_cache)
+    elicit_api.client.session.send = server.send
+    return elicit_api
+
+
+def test_token_reused_across_instances(tmp_path):
+    server = FakeServer()
+    token_cache = TokenCache(cache_dir=tmp_path / 'tokens')
+
+    make_api(tmp_path, server, token_cache).login()
+    TokenCache._memory.clear()
+    elicit_api = make_api(tmp_path, server, TokenCache(cache_dir=tmp_path / 'tokens'))
+    elicit_api.login()
+
+    assert server.grants == ['password']
+    assert elicit_api.auth_header == 'Bearer token1'
+
+
+def test_expiring_token_is_refreshed(tmp_path):
+    server = FakeServer(expires_in=30)
+    elicit_api = make_api(tmp_path, server, TokenCache())
+    elicit_api.login()
+
+    assert elicit_api.auth_header == 'Bearer token2'
+    assert server.grants == ['password', 'refresh_token']
+
+
+def test_retry_once_on_unauthorized(tmp_path):
+    server = FakeServer()
+    elicit_api = make_api(tmp_path, server, TokenCache())
+    client = elicit_api.login()
+    # the server revokes the token behind our back
+    server.issued += 1
+
+    resp = client.request(elicit_api['getCurrentUser']())
+
+    assert resp.status == 200
+    assert server.grants == ['password', 'password']
+
+
+def test_token_expiry():
+    assert Token.from_response(dict(access_token='a', expires_in=10)).expires_within(60)
+    assert not Token.from_response(dict(access_token='a', expires_in=3600)).expires_within(60)
+    assert not Token.from_response(dict(access_token='a')).expires_within(60)
+
+
+def test_concurrent_puts_leave_a_whole_token(tmp_path):
+    token_cache = TokenCache(cache_dir=tmp_path / 'tokens')
+    key = TokenCache.key('https://test.com', 'admin', 'client')
+
+    def put(index):
+        for _ in range(20):
+            token_cache.put(key, Token('token%d' % index, expires_at=time.time() + 3600))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(put, range(8)))
+
+    TokenCache._memory.clear()
+    assert token_cache.get(key).access_token.startswith('token')
+    token_path, = (tmp_path / 'tokens').iterdir()
+    assert token_path.stat().st_mode & 0o777 == 0o600